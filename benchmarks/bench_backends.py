@@ -0,0 +1,58 @@
+'''Compares the built-in StringDoc backend with yattag's Doc. The document is
+   parsed once and then rendered with both backends, so that only the time
+   spent writing HTML is measured, then whole conversions are timed too.
+
+   Usage: python benchmarks/bench_backends.py [--copies 200] [--repeat 5]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+
+CS_PAML = (Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+           / 'cs.paml')
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=200,
+                        help="How many times cs.paml is repeated")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="How many times every measurement is repeated,"
+                        + " the best time is shown")
+    args = parser.parse_args()
+
+    with open(CS_PAML, encoding='utf-8') as p:
+        paml_text = p.read() * args.copies
+    document = paml2html.parse_from_text(paml_text)
+
+    outputs = {}
+    print(f"{'backend':>8} {'render (s)':>11} {'convert (s)':>12}")
+    for backend in paml2html.BACKENDS:
+        outputs[backend] = paml2html.render_document(
+            document, paml2html.Converter(backend))
+        render = best_time(lambda: paml2html.render_document(
+            document, paml2html.Converter(backend)), args.repeat)
+        convert = best_time(lambda: paml2html.Converter(backend)
+                            .convert_text(paml_text), args.repeat)
+        print(f"{backend:>8} {render:>11.3f} {convert:>12.3f}")
+
+    print(f"\nsource: {len(paml_text) / 1024:.0f} KB, same HTML from every"
+          + f" backend: {len(set(outputs.values())) == 1}")
+
+
+if __name__ == '__main__':
+    main()
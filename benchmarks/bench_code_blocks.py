@@ -0,0 +1,70 @@
+'''Measures the time and the memory used to convert a document with a single
+   big code block (like an embedded log or config file), as a multiple of the
+   size of the document. The peak is measured with tracemalloc, on top of the
+   memory the document itself and its lines take. --escape-share is the
+   share of the lines with a character that has to be escaped (<, > or &).
+
+   Usage: python benchmarks/bench_code_blocks.py [--size 16M]
+          [--escape-share 0.1] [--repeat 3]'''
+
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from bench_mmap import parse_size  # noqa: E402
+
+
+def make_document(size: int, escape_share: float, seed=0) -> str:
+    rng = random.Random(seed)
+    lines = ['```Log /* a big code block */\n']
+    length = 0
+    while length < size:
+        line = ' '.join(f'{rng.randrange(16 ** 6):06x}'
+                        for _ in range(rng.randint(2, 12)))
+        if rng.random() < escape_share:
+            line += ' <tag attr="a & b">'
+        lines.append(line + '\n')
+        length += len(line) + 1
+    lines.append('```\n')
+    return ''.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default='16M',
+                        help="Size of the code block, like 64M")
+    parser.add_argument("--escape-share", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times the time is measured, the best"
+                        + " time is shown")
+    args = parser.parse_args()
+
+    paml_text = make_document(parse_size(args.size), args.escape_share)
+    paml_lines = paml_text.splitlines(True)
+
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        paml2html.Converter().convert_lines(list(paml_lines))
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    html = paml2html.Converter().convert_lines(list(paml_lines))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = len(paml_text)
+    print(f"source: {size / 1024 ** 2:.1f} MB, HTML:"
+          + f" {len(html) / 1024 ** 2:.1f} MB")
+    print(f"time: {min(times):.3f} s, peak memory while converting:"
+          + f" {peak / 1024 ** 2:.1f} MB ({peak / size:.2f} x source)")
+
+
+if __name__ == '__main__':
+    main()
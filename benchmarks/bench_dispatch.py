@@ -0,0 +1,180 @@
+'''Compares parse_element's first-character lookup in ELEMENT_PARSERS with
+   the chain of ifs (and the header parser trying all 6 levels) it replaced.
+   Dispatching alone is timed on every line of a document, then the whole
+   document is parsed with both versions of parse_element.
+
+   Usage: python benchmarks/bench_dispatch.py [--copies 200] [--repeat 5]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+
+CS_PAML = (Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+           / 'cs.paml')
+
+# every kind of element, for a document that isn't mostly commands and code
+# lines like cs.paml
+MIXED_PAML = '''# Header
+### Smaller header
+>l➤ Collapsible
+    /Command /* comment */
+    ```/* Code line */
+    code
+    ```
+{
+A paragraph with **bold** text
+}
+![alt](image.png)
+- list item
+- another item
+1. ordered item
+2. another item
+| Cell | Another cell |
+| --- | --- |
+| Cell | Another cell |
+<
+<div>raw</div>
+>
+'''
+
+
+def parse_element_if_chain(paml_lines: list, i: int) -> tuple:
+    '''parse_element as it was before ELEMENT_PARSERS'''
+
+    paml_line = paml_lines[i].strip()
+
+    if paml_line == '':
+        return None, i + 1
+    elif paml_line.startswith('#'):
+        return parse_header_levels(paml_lines, i)
+    elif paml_line.startswith('>'):
+        return paml2html.parse_collapsible_box(paml_lines, i)
+    elif paml_line.startswith('/'):
+        return paml2html.parse_command(paml_lines, i)
+    elif paml_line.startswith('```'):
+        return paml2html.parse_code(paml_lines, i)
+    elif paml_line.startswith('!['):
+        return paml2html.parse_image(paml_lines, i)
+    elif paml_line.startswith('{'):
+        return paml2html.parse_paragraph(paml_lines, i)
+    elif paml_line.startswith('-'):
+        return paml2html.parse_unordered_list(paml_lines, i)
+    elif paml_line[0] in '0123456789':
+        return paml2html.parse_ordered_list(paml_lines, i)
+    elif paml_line.startswith('|'):
+        return paml2html.parse_table(paml_lines, i)
+    elif paml_line.startswith('<'):
+        return paml2html.parse_raw_html(paml_lines, i)
+    else:
+        print('Unsupported line, skipping: ', paml_lines[i])
+        return None, i + 1
+
+
+def parse_header_levels(paml_lines: list, i: int) -> tuple:
+    for level in range(1, 7):
+        if paml_lines[i].rstrip().startswith('#' * level + ' '):
+            return (paml2html.Header(level, paml2html.parse_inline(
+                        paml_lines[i][level + 1:-1])),
+                    i + 1)
+    return None, i
+
+
+def dispatch_if_chain(paml_line: str):
+    if paml_line == '':
+        return None
+    elif paml_line.startswith('#'):
+        return parse_header_levels
+    elif paml_line.startswith('>'):
+        return paml2html.parse_collapsible_box
+    elif paml_line.startswith('/'):
+        return paml2html.parse_command
+    elif paml_line.startswith('```'):
+        return paml2html.parse_code
+    elif paml_line.startswith('!['):
+        return paml2html.parse_image
+    elif paml_line.startswith('{'):
+        return paml2html.parse_paragraph
+    elif paml_line.startswith('-'):
+        return paml2html.parse_unordered_list
+    elif paml_line[0] in '0123456789':
+        return paml2html.parse_ordered_list
+    elif paml_line.startswith('|'):
+        return paml2html.parse_table
+    elif paml_line.startswith('<'):
+        return paml2html.parse_raw_html
+    return None
+
+
+def dispatch_table(paml_line: str):
+    if paml_line == '':
+        return None
+    try:
+        identifier, parse = paml2html.ELEMENT_PARSERS[paml_line[0]]
+    except KeyError:
+        return None
+    if identifier is None or paml_line.startswith(identifier):
+        return parse
+    return None
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def parse_with(parse_element, paml_text: str):
+    original = paml2html.parse_element
+    # parse_lines and parse_collapsible look parse_element up every time
+    paml2html.parse_element = parse_element
+    try:
+        return paml2html.parse_from_text(paml_text)
+    finally:
+        paml2html.parse_element = original
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=200,
+                        help="How many times every document is repeated")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="How many times every measurement is repeated,"
+                        + " the best time is shown")
+    args = parser.parse_args()
+
+    with open(CS_PAML, encoding='utf-8') as p:
+        documents = {'cs.paml': p.read(), 'mixed': MIXED_PAML}
+
+    print(f"{'document':>9} {'step':>9} {'if chain (s)':>13}"
+          + f" {'table (s)':>10} {'speedup':>8}")
+    for name, paml_text in documents.items():
+        paml_text *= args.copies
+        lines = [line.strip() for line in paml_text.splitlines(True)]
+        assert (parse_with(parse_element_if_chain, paml_text)
+                == parse_with(paml2html.parse_element, paml_text))
+
+        results = {
+            'dispatch': [
+                best_time(lambda: [dispatch(line) for line in lines],
+                          args.repeat)
+                for dispatch in (dispatch_if_chain, dispatch_table)],
+            'parse': [
+                best_time(lambda: parse_with(parse_element, paml_text),
+                          args.repeat)
+                for parse_element in (parse_element_if_chain,
+                                      paml2html.parse_element)]}
+        for step, (chain, table) in results.items():
+            print(f"{name:>9} {step:>9} {chain:>13.4f} {table:>10.4f}"
+                  + f" {chain / table:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
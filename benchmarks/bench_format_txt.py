@@ -0,0 +1,45 @@
+'''Times format_txt on a single paragraph of growing size. The time per MB
+   should stay roughly the same for every size if the inline formatter works
+   in linear time.
+
+   Usage: python benchmarks/bench_format_txt.py [--max-mb 8]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+
+SENTENCE = ('Some **bold** text, some __italics__ and ~~strikethrough~~, '
+            + '``inline <code>`` and a [link](https://pokerfacowaty.com) '
+            + 'with plain words after it. ')
+
+
+def make_paragraph(size: int) -> str:
+    return (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-mb", type=float, default=8,
+                        help="Size of the biggest paragraph in MB")
+    args = parser.parse_args()
+
+    size = 256 * 1024
+    print(f"{'size (MB)':>10} {'time (s)':>10} {'MB/s':>8} {'s per MB':>9}")
+    while size <= args.max_mb * 1024 * 1024:
+        paragraph = make_paragraph(size)
+        start = time.perf_counter()
+        paml2html.format_txt(paragraph)
+        elapsed = time.perf_counter() - start
+        mb = size / (1024 * 1024)
+        print(f"{mb:>10.2f} {elapsed:>10.3f} {mb / elapsed:>8.2f}"
+              + f" {elapsed / mb:>9.3f}")
+        size *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''Compares the peak memory (RSS) and the time of converting a big generated
+   file read into a list of lines, the current way, with the same file
+   memory-mapped (mapped=True). Every way is measured in a new process, since
+   the peak of a process never goes down; the RSS of a process that only
+   imported the converter is subtracted. Both whole conversions
+   (convert_from_file) and streamed ones (iter_convert, writing nowhere)
+   are measured.
+
+   Usage: python benchmarks/bench_mmap.py [--size 64M] [--seed 0]'''
+
+from pathlib import Path
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.generate import generate_paml  # noqa: E402
+
+WAYS = {'convert_from_file': lambda path: paml2html.convert_from_file(path),
+        'convert_from_file mapped': lambda path: paml2html.convert_from_file(
+            path, mapped=True),
+        'iter_convert': lambda path: sum(
+            len(html) for html in paml2html.iter_convert(path)),
+        'iter_convert mapped': lambda path: sum(
+            len(html) for html in paml2html.iter_convert(path, mapped=True))}
+
+
+def parse_size(size: str) -> int:
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    size = size.strip().upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def peak_rss() -> int:
+    '''Returns the peak RSS of this process in bytes'''
+
+    try:
+        # unlike ru_maxrss, doesn't include the parent's memory from before
+        # the process was started
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(way: str, path: str):
+    '''Converts the file in one way and prints the time and peak RSS as JSON,
+       used in a new process'''
+
+    start = time.perf_counter()
+    if way != 'import':
+        WAYS[way](path)
+    print(json.dumps({'time': time.perf_counter() - start,
+                      'peak': peak_rss()}))
+
+
+def measure_in_process(way: str, path: Path) -> dict:
+    output = subprocess.run([sys.executable, __file__, '--measure', way,
+                             str(path)], capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default='64M',
+                        help="Size of the generated document, like 256M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--measure", nargs=2, metavar=('WAY', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure is not None:
+        measure(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'big.paml'
+        path.write_text(generate_paml(parse_size(args.size), args.seed),
+                        encoding='utf-8')
+        size = path.stat().st_size
+        base = measure_in_process('import', path)['peak']
+        print(f"source: {size / 1024 ** 2:.1f} MB, RSS after importing:"
+              + f" {base / 1024 ** 2:.1f} MB\n")
+        print(f"{'way':>25} {'time (s)':>9} {'peak RSS (MB)':>14}"
+              + f" {'x source':>9}")
+        for way in WAYS:
+            result = measure_in_process(way, path)
+            peak = result['peak'] - base
+            print(f"{way:>25} {result['time']:>9.2f}"
+                  + f" {peak / 1024 ** 2:>14.1f} {peak / size:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
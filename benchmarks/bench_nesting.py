@@ -0,0 +1,251 @@
+'''Compares the stack-based parsing and rendering of nested collapsibles and
+   lists with the recursive functions they replaced. Documents with the same
+   amount of levels in total are nested to a different depth; the time per
+   level shows the cost of nesting, and the recursive version fails once the
+   depth reaches the recursion limit.
+
+   Usage: python benchmarks/bench_nesting.py [--levels 20000] [--repeat 5]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.paml2html import (Collapsible, Entry, List,  # noqa: E402
+                                 ListItem)
+
+DEPTHS = [1, 10, 100, 200, 2000]
+
+
+def nested_collapsibles(depth: int) -> str:
+    # every level is a space deeper, so that indentation stays small
+    return (''.join(' ' * level + f'>l➤ Level {level}\n'
+                    for level in range(depth))
+            + ' ' * depth + '/Ctrl + E /* command */\n')
+
+
+def nested_lists(depth: int) -> str:
+    return ''.join(' ' * level + ('1.' if level % 2 else '-')
+                   + f' Level {level}\n' for level in range(depth)) + '\n'
+
+
+# The recursive functions, as they were before the stack-based ones
+
+
+def parse_collapsible_recursive(paml_lines: list, i: int, offset=0) -> tuple:
+    children = []
+    while i < len(paml_lines):
+        spaces = 0
+        for char in paml_lines[i]:
+            if char == ' ':
+                spaces += 1
+            else:
+                break
+
+        if spaces == 0:
+            break
+        elif spaces > offset:
+            offset = spaces
+        elif spaces < offset:
+            break
+
+        if paml_lines[i].lstrip()[0] == ">":
+            collapsible, i = paml2html.parse_collapsible_node(paml_lines, i,
+                                                              offset)
+            children.append(collapsible)
+        else:
+            child, i = paml2html.parse_element(paml_lines, i)
+            children.append(Entry(child))
+    return children, i
+
+
+def parse_unordered_list_recursive(paml_lines: list, i: int,
+                                   offset=None) -> tuple:
+    if offset is None:
+        offset = 0
+        for char in paml_lines[i]:
+            if char == ' ':
+                offset += 1
+            else:
+                break
+
+    unordered_list = List(False, [])
+    while i < len(paml_lines):
+        if paml_lines[i].strip() == '':
+            break
+        elif (paml_lines[i].lstrip()[0] != '-'
+              and not paml_lines[i].lstrip()[0].isnumeric()):
+            break
+
+        spaces = 0
+        for char in paml_lines[i]:
+            if char == ' ':
+                spaces += 1
+            else:
+                break
+        if offset > 0 and spaces < offset:
+            offset = spaces
+            break
+        elif paml_lines[i][offset] == '-':
+            unordered_list.items.append(ListItem(
+                paml2html.parse_inline(paml_lines[i][offset + 2:-1])))
+            i += 1
+            continue
+        elif paml_lines[i][offset].isnumeric():
+            nested_list, i = parse_ordered_list_recursive(paml_lines, i)
+        elif paml_lines[i][spaces] == '-':
+            nested_list, i = parse_unordered_list_recursive(paml_lines, i,
+                                                            spaces)
+        elif paml_lines[i][spaces].isnumeric():
+            nested_list, i = parse_ordered_list_recursive(paml_lines, i,
+                                                          spaces)
+        else:
+            continue
+        unordered_list.items.append(nested_list)
+    return unordered_list, i
+
+
+def parse_ordered_list_recursive(paml_lines: list, i: int,
+                                 offset=None) -> tuple:
+    numbers = '0123456789'
+
+    if offset is None:
+        offset = 0
+        for char in paml_lines[i]:
+            if char == ' ':
+                offset += 1
+            else:
+                break
+
+    ordered_list = List(True, [])
+    while i < len(paml_lines):
+        if paml_lines[i].strip() == '':
+            break
+        elif (paml_lines[i].lstrip()[0] not in numbers
+              and paml_lines[i].lstrip()[0] != '-'):
+            break
+
+        spaces = 0
+        for char in paml_lines[i]:
+            if char == ' ':
+                spaces += 1
+            else:
+                break
+
+        if offset > 0 and spaces < offset:
+            offset = spaces
+            break
+        elif paml_lines[i][offset] in numbers:
+            ordered_list.items.append(ListItem(
+                paml2html.parse_inline(paml_lines[i][offset + 2:-1])))
+            i += 1
+            continue
+        elif paml_lines[i][offset] == '-':
+            nested_list, i = parse_unordered_list_recursive(paml_lines, i)
+        elif paml_lines[i][spaces] in numbers:
+            nested_list, i = parse_ordered_list_recursive(paml_lines, i,
+                                                          spaces)
+        elif paml_lines[i][spaces] == '-':
+            nested_list, i = parse_unordered_list_recursive(paml_lines, i,
+                                                            spaces)
+        else:
+            continue
+        ordered_list.items.append(nested_list)
+    return ordered_list, i
+
+
+def render_children_recursive(children: list, conv):
+    for child in children:
+        if type(child) is Collapsible:
+            paml2html.render_node(child, conv)
+        else:
+            with conv.tag('div', klass='entry'):
+                if child.child is not None:
+                    paml2html.render_node(child.child, conv)
+
+
+def render_list_recursive(paml_list: List, conv):
+    with conv.tag('ol' if paml_list.ordered else 'ul'):
+        for item in paml_list.items:
+            if type(item) is ListItem:
+                with conv.tag('li'):
+                    conv.doc.asis(paml2html.render_inline(item.content))
+            else:
+                render_list_recursive(item, conv)
+
+
+RECURSIVE = {'parse_collapsible': parse_collapsible_recursive,
+             'parse_unordered_list': parse_unordered_list_recursive,
+             'parse_ordered_list': parse_ordered_list_recursive,
+             'render_children': render_children_recursive,
+             'render_list': render_list_recursive}
+
+
+def convert_with(functions: dict, paml_text: str) -> str:
+    '''Converts with the given functions put in place of paml2html's'''
+
+    originals = {name: getattr(paml2html, name) for name in functions}
+    parsers = dict(paml2html.ELEMENT_PARSERS)
+    renderers = dict(paml2html.RENDERERS)
+    for name, function in functions.items():
+        setattr(paml2html, name, function)
+    # the lookup tables hold the list functions themselves
+    paml2html.ELEMENT_PARSERS['-'] = (None, paml2html.parse_unordered_list)
+    for digit in '0123456789':
+        paml2html.ELEMENT_PARSERS[digit] = (None,
+                                            paml2html.parse_ordered_list)
+    paml2html.RENDERERS[List] = paml2html.render_list
+    try:
+        return paml2html.convert_from_text(paml_text)
+    finally:
+        for name, function in originals.items():
+            setattr(paml2html, name, function)
+        paml2html.ELEMENT_PARSERS.update(parsers)
+        paml2html.RENDERERS.update(renderers)
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", type=int, default=20000,
+                        help="How many levels every document has in total")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="How many times every measurement is repeated,"
+                        + " the best time is shown")
+    args = parser.parse_args()
+
+    print(f"{'element':>12} {'depth':>6} {'recursive (us)':>15}"
+          + f" {'stack (us)':>11} {'speedup':>8}")
+    for name, make_paml in (('collapsible', nested_collapsibles),
+                            ('list', nested_lists)):
+        for depth in DEPTHS:
+            paml_text = make_paml(depth) * max(1, args.levels // depth)
+            levels = max(1, args.levels // depth) * depth
+            stack = best_time(lambda: convert_with({}, paml_text),
+                              args.repeat) / levels * 1e6
+            try:
+                assert (convert_with(RECURSIVE, paml_text)
+                        == convert_with({}, paml_text))
+            except RecursionError:
+                print(f"{name:>12} {depth:>6} {'RecursionError':>15}"
+                      + f" {stack:>11.2f}")
+                continue
+            recursive = best_time(lambda: convert_with(RECURSIVE, paml_text),
+                                  args.repeat) / levels * 1e6
+            print(f"{name:>12} {depth:>6} {recursive:>15.2f} {stack:>11.2f}"
+                  + f" {recursive / stack:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
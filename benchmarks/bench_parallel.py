@@ -0,0 +1,70 @@
+'''Times converting a single generated document in one process and with
+   convert_parallel (--workers processes, one per CPU by default) for
+   documents of growing size, to show from which size on the processes pay
+   for themselves. convert_parallel only uses them from PARALLEL_MIN_SIZE
+   characters on, here it's given min_size=0 so that every size is converted
+   in processes. Starting the processes and sending them the document is
+   what makes small documents slower, so the time of a nearly empty document
+   converted in processes is shown too.
+
+   Usage: python benchmarks/bench_parallel.py [--sizes 256K,1M,4M,16M]
+          [--workers 4] [--repeat 3]'''
+
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html, parallel  # noqa: E402
+from paml2html.generate import generate_paml  # noqa: E402
+from bench_mmap import parse_size  # noqa: E402
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="256K,1M,4M,16M",
+                        help="Sizes of the generated documents, like 64K,1M")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times every time is measured, the"
+                        + " best time is shown")
+    args = parser.parse_args()
+
+    def in_processes(paml_text):
+        return parallel.convert_parallel(paml_text, workers=args.workers,
+                                         min_size=0)
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} processes,"
+          + f" PARALLEL_MIN_SIZE: {parallel.PARALLEL_MIN_SIZE / 1024 ** 2:g}"
+          + " MB")
+    overhead = best_time(lambda: in_processes('# a\n\n# b\n'), args.repeat)
+    print("converting a nearly empty document in processes:"
+          + f" {overhead * 1000:.1f} ms\n")
+    print(f"{'size (MB)':>10} {'serial (s)':>11} {'parallel (s)':>13}"
+          + f" {'speedup':>8} {'same HTML':>10}")
+    for size in args.sizes.split(','):
+        paml_text = generate_paml(parse_size(size), seed=0)
+        same = (in_processes(paml_text)
+                == paml2html.convert_from_text(paml_text))
+        serial = best_time(lambda: paml2html.convert_from_text(paml_text),
+                           args.repeat)
+        processes = best_time(lambda: in_processes(paml_text), args.repeat)
+        print(f"{len(paml_text) / 1024 ** 2:>10.2f} {serial:>11.3f}"
+              + f" {processes:>13.3f} {serial / processes:>7.2f}x"
+              + f" {str(same):>10}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''Shows how conversion scales along every knob of paml2html.generate: one
+   knob is raised at a time while the others keep their defaults. Documents
+   are about the same size, so the time per MB should stay roughly flat; one
+   that keeps growing with a knob points at the handler that doesn't scale.
+
+   Usage: python benchmarks/bench_scaling.py [--size 1M] [--seed 0]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.generate import generate_paml  # noqa: E402
+
+KNOBS = {
+    'collapsible_depth': [1, 2, 4, 8, 16],
+    'list_depth': [1, 2, 4, 8, 16],
+    'table_rows': [1, 10, 100, 1000],
+    'table_columns': [1, 4, 16, 64],
+    'code_block_lines': [2, 10, 100, 1000],
+    'markup_density': [0, 0.25, 0.5, 1],
+    'links': [0, 1, 4, 16],
+}
+
+
+def parse_size(size: str) -> int:
+    units = {'K': 1024, 'M': 1024 ** 2}
+    size = size.strip().upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default="1M",
+                        help="Size of every generated document, like 256K")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    size = parse_size(args.size)
+
+    print(f"{'knob':>18} {'value':>6} {'size (MB)':>10} {'time (s)':>9}"
+          + f" {'s per MB':>9}")
+    for knob, values in KNOBS.items():
+        for value in values:
+            paml_text = generate_paml(size, args.seed, **{knob: value})
+            start = time.perf_counter()
+            paml2html.convert_from_text(paml_text)
+            elapsed = time.perf_counter() - start
+            mb = len(paml_text.encode('utf-8')) / 1024 ** 2
+            print(f"{knob:>18} {value:>6} {mb:>10.2f} {elapsed:>9.3f}"
+                  + f" {elapsed / mb:>9.3f}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''Times converting a typical cheat sheet (tests/fixtures/cs.paml) the way
+   tools converting one document per command do: starting paml2html.py for
+   every document, starting the thin client (client.py) for every document
+   while a server (server.py) is running, and sending every document over a
+   single connection to the server.
+
+   Usage: python benchmarks/bench_server.py [--documents 20]'''
+
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from paml2html import client  # noqa: E402
+
+SOURCE = ROOT / 'tests' / 'fixtures' / 'cs.paml'
+SCRIPTS = ROOT / 'src' / 'paml2html'
+
+
+def time_commands(commands: list) -> float:
+    '''Returns how long it took to run the commands one after another'''
+
+    start = time.perf_counter()
+    for command in commands:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=20,
+                        help="How many documents are converted every way")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = Path(tmp) / 'paml2html.sock'
+        destinations = [Path(tmp) / f'{n}.html'
+                        for n in range(args.documents)]
+        times = {'paml2html.py': time_commands(
+            [[sys.executable, SCRIPTS / 'paml2html.py', SOURCE, destination]
+             for destination in destinations])}
+
+        server = subprocess.Popen([sys.executable, SCRIPTS / 'server.py',
+                                   '--socket', socket_path])
+        try:
+            while not socket_path.exists():
+                time.sleep(0.01)
+            times['client.py'] = time_commands(
+                [[sys.executable, SCRIPTS / 'client.py', SOURCE, destination,
+                  '--socket', socket_path] for destination in destinations])
+            with client.Client(socket_path) as connection:
+                start = time.perf_counter()
+                for destination in destinations:
+                    connection.request(source=str(SOURCE),
+                                       destination=str(destination))
+                times['one connection'] = time.perf_counter() - start
+                connection.request(command='stop')
+        finally:
+            server.wait()
+
+    print(f"{args.documents} x {SOURCE.name}"
+          + f" ({SOURCE.stat().st_size / 1024:.1f} KB)\n")
+    print(f"{'way':>16} {'ms per document':>16}")
+    for way, seconds in times.items():
+        print(f"{way:>16} {seconds / args.documents * 1000:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
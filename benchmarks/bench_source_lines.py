@@ -0,0 +1,100 @@
+'''Compares the two ways a whole document can be held while it's converted:
+   a string for every line (ScannedLines of splitlines, which
+   Converter.convert_lines still uses) and the document itself with where
+   every line starts (SourceLines, used by convert_text and convert_file for
+   documents of at least SOURCE_LINES_MIN_SIZE characters).
+   The document is made of millions of short lines, where a string for every
+   line costs the most. The memory of the lines alone and the peak while
+   converting are measured with tracemalloc, on top of the document itself;
+   times are measured without it.
+
+   Usage: python benchmarks/bench_source_lines.py [--lines 2000000]
+          [--repeat 3]'''
+
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+
+
+def make_document(lines: int, seed=0) -> str:
+    '''Returns lists of short items, with a header every 1000 lines'''
+
+    rng = random.Random(seed)
+    paml_lines = []
+    for i in range(lines):
+        if i % 1000 == 0:
+            paml_lines.append(f'# Part {i // 1000}\n')
+        else:
+            paml_lines.append(f'- item {rng.randrange(1000)}\n')
+    return ''.join(paml_lines)
+
+
+def scanned_lines(paml_text: str):
+    paml_lines = paml_text.splitlines(True)
+    paml2html.add_last_line(paml_lines)
+    return paml2html.ScannedLines(paml_lines)
+
+
+WAYS = {'ScannedLines': (scanned_lines, lambda paml_text: paml2html
+                         .Converter().convert_lines(
+                             paml_text.splitlines(True))),
+        'SourceLines': (paml2html.SourceLines, lambda paml_text: paml2html
+                        .Converter().convert_scanned(
+                            paml2html.SourceLines(paml_text)))}
+
+
+def traced(function, *args) -> tuple:
+    '''Returns what function returned and the peak memory it took'''
+
+    tracemalloc.start()
+    result = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+def best_time(function, repeat: int, *args) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times every time is measured, the"
+                        + " best time is shown")
+    args = parser.parse_args()
+
+    paml_text = make_document(args.lines)
+    print(f"source: {len(paml_text) / 1024 ** 2:.1f} MB, {args.lines} lines\n")
+    print(f"{'lines':>13} {'lines MB':>9} {'B/line':>7} {'scan (s)':>9}"
+          + f" {'convert (s)':>12} {'peak MB':>8}")
+    outputs = []
+    for name, (make_lines, convert) in WAYS.items():
+        paml_lines, lines_size = traced(make_lines, paml_text)
+        del paml_lines
+        html, peak = traced(convert, paml_text)
+        outputs.append(html)
+        del html
+        scan_time = best_time(make_lines, args.repeat, paml_text)
+        convert_time = best_time(convert, args.repeat, paml_text)
+        print(f"{name:>13} {lines_size / 1024 ** 2:>9.1f}"
+              + f" {lines_size / args.lines:>7.1f} {scan_time:>9.3f}"
+              + f" {convert_time:>12.3f} {peak / 1024 ** 2:>8.1f}")
+    print(f"\nsame HTML both ways: {len(set(outputs)) == 1}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''Checks that splitting parsing from rendering didn't make conversion
+   slower: convert_from_text (and parse_from_text + render_document) of the
+   current converter is timed against convert_from_text of the converter as
+   it was before the split, taken from the git history (--baseline, the
+   commit right before nodes were added), on generated documents. Exits
+   with 1 if convert_from_text is more than --threshold percent slower than
+   the baseline on any of them.
+
+   The baseline writes HTML with yattag, so yattag has to be installed.
+
+   Usage: python benchmarks/bench_split.py [--sizes 256K,4M] [--repeat 3]
+          [--baseline b83cb7f] [--threshold 10]'''
+
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+import time
+import types
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.generate import generate_paml  # noqa: E402
+
+
+def parse_size(size: str) -> int:
+    units = {'K': 1024, 'M': 1024 ** 2}
+    size = size.strip().upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def load_baseline(revision: str) -> types.ModuleType:
+    '''Returns paml2html.py as it was at revision, as a module of its own'''
+
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:src/paml2html/paml2html.py'],
+        cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    module = types.ModuleType('paml2html_baseline')
+    exec(compile(source, f'{revision}:paml2html.py', 'exec'),
+         module.__dict__)
+    return module
+
+
+def best_time(function, repeat: int, *args) -> tuple:
+    '''Returns the best time of function and what it returned'''
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def parse_and_render(paml_text: str) -> str:
+    return paml2html.render_document(paml2html.parse_from_text(paml_text))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="256K,4M",
+                        help="Sizes of the generated documents, like 256K,4M")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times every time is measured, the"
+                        + " best time is shown")
+    parser.add_argument("--baseline", default="b83cb7f",
+                        help="The git revision compared with, the last one"
+                        + " converting without a tree of nodes by default")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="How many percent slower than the baseline"
+                        + " convert_from_text can be")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline)
+
+    print(f"{'size (MB)':>10} {'baseline (s)':>13} {'convert (s)':>12}"
+          + f" {'ratio':>6} {'parse+render (s)':>17} {'same HTML':>10}")
+    slower = False
+    for size in map(parse_size, args.sizes.split(',')):
+        paml_text = generate_paml(size, seed=1)
+        # no line of a generated document is skipped, nothing is printed
+        with redirect_stdout(StringIO()):
+            baseline_time, expected = best_time(baseline.convert_from_text,
+                                                args.repeat, paml_text)
+            convert_time, html = best_time(paml2html.convert_from_text,
+                                           args.repeat, paml_text)
+            split_time, split_html = best_time(parse_and_render,
+                                               args.repeat, paml_text)
+        ratio = convert_time / baseline_time
+        slower |= ratio > 1 + args.threshold / 100
+        print(f"{len(paml_text) / 1024 ** 2:>10.2f} {baseline_time:>13.3f}"
+              + f" {convert_time:>12.3f} {ratio:>6.2f} {split_time:>17.3f}"
+              + f" {str(html == expected == split_html):>10}")
+    sys.exit(1 if slower else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''Times converting a single big table (1M cells by default). Tables are
+   written by write_table straight from their lines, rows_at_once rows at a
+   time, while parsing them into Table nodes and rendering those is how every
+   table used to be converted (and still is by parse_from_text and
+   render_document). The same table is converted with a share of the cells
+   decorated by --markup-density, cells without any markup skip the inline
+   formatter. For iter_convert, how long it takes until the first rows come
+   out is shown too.
+
+   Usage: python benchmarks/bench_tables.py [--rows 100000] [--columns 10]
+          [--markup-density 0.1] [--repeat 3]'''
+
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.generate import PamlGenerator  # noqa: E402
+
+
+def make_table(rows: int, columns: int, markup_density: float,
+               seed=0) -> str:
+    generator = PamlGenerator(seed, markup_density=markup_density, links=0)
+    lines = [generator.table_row(columns), '|' + ' --- |' * columns + '\n']
+    lines.extend(generator.table_row(columns) for _ in range(rows))
+    return ''.join(lines)
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def first_chunk_time(paml_text: str, repeat: int) -> float:
+    def first_chunk():
+        chunks = paml2html.iter_convert(paml_text.splitlines(True))
+        next(chunks)
+        chunks.close()
+    return best_time(first_chunk, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--markup-density", type=float, default=0.1,
+                        help="Share of the words that are decorated")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times every measurement is repeated,"
+                        + " the best time is shown")
+    args = parser.parse_args()
+
+    paml_text = make_table(args.rows, args.columns, args.markup_density)
+    expected = paml2html.convert_from_text(paml_text)
+    ways = {
+        'Table nodes': lambda: paml2html.render_document(
+            paml2html.parse_from_text(paml_text)),
+        'convert_from_text': lambda: paml2html.convert_from_text(paml_text),
+        'iter_convert': lambda: ''.join(paml2html.iter_convert(
+            paml_text.splitlines(True))),
+    }
+    cells = (args.rows + 1) * args.columns
+    print(f"source: {len(paml_text) / 1024 ** 2:.1f} MB, {cells} cells,"
+          + " same HTML every way: "
+          + f"{all(way() == expected for way in ways.values())}\n")
+    print(f"{'way':>18} {'time (s)':>9} {'cells/s':>11}")
+    for name, way in ways.items():
+        seconds = best_time(way, args.repeat)
+        print(f"{name:>18} {seconds:>9.3f} {cells / seconds:>11.0f}")
+    print("\nfirst rows from iter_convert after"
+          + f" {first_chunk_time(paml_text, args.repeat) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
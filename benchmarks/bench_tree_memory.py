@@ -0,0 +1,64 @@
+'''Measures the memory used by a parsed document tree: the amount of nodes of
+   every type, the size of a single node (sys.getsizeof) and the total memory
+   allocated while parsing (tracemalloc).
+
+   Usage: python benchmarks/bench_tree_memory.py [--copies 100]'''
+
+from collections import Counter
+from pathlib import Path
+import argparse
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+
+CS_PAML = (Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+           / 'cs.paml')
+
+
+def walk(value):
+    '''Yields every node inside a node or a list of nodes'''
+
+    if isinstance(value, list):
+        for item in value:
+            yield from walk(item)
+    elif isinstance(value, paml2html.Node):
+        yield value
+        for name in value.__slots__:
+            yield from walk(getattr(value, name))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=100,
+                        help="How many times cs.paml is repeated")
+    args = parser.parse_args()
+
+    with open(CS_PAML, encoding='utf-8') as p:
+        paml_text = p.read() * args.copies
+
+    tracemalloc.start()
+    document = paml2html.parse_from_text(paml_text)
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = Counter()
+    sizes = {}
+    for node in walk(document):
+        nodes[type(node).__name__] += 1
+        sizes[type(node).__name__] = sys.getsizeof(node)
+
+    print(f"{'node':>15} {'count':>9} {'bytes each':>11}")
+    for name, count in nodes.most_common():
+        print(f"{name:>15} {count:>9} {sizes[name]:>11}")
+    total = sum(nodes.values())
+    print(f"\nsource: {len(paml_text) / 1024:.0f} KB, {total} nodes")
+    print(f"tree (with strings and lists): {allocated / 1024:.0f} KB,"
+          + f" {allocated / total:.0f} bytes per node,"
+          + f" parsing peak {peak / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
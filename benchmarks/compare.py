@@ -0,0 +1,55 @@
+'''Compares two runs of benchmarks/suite.py saved with --save. For every
+   benchmark and size found in both runs, shows the old and new time and how
+   much faster or slower the new run is. Exits with 1 if anything got slower
+   by more than the threshold, so it can be used to stop a slow release.
+
+   Usage: python benchmarks/compare.py old.json new.json [--threshold 10]'''
+
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        run = json.load(f)
+    return {(result['benchmark'], result['size']): result
+            for result in run['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old", help="JSON results of the older run")
+    parser.add_argument("new", help="JSON results of the newer run")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="How many percent slower counts as a"
+                        + " regression")
+    args = parser.parse_args()
+
+    old = load_results(args.old)
+    new = load_results(args.new)
+
+    regressions = 0
+    print(f"{'benchmark':>18} {'size (MB)':>10} {'old (s)':>9} {'new (s)':>9}"
+          + f" {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        old_seconds = old[key]['seconds']
+        new_seconds = new[key]['seconds']
+        change = (new_seconds / old_seconds - 1) * 100
+        slower = change > args.threshold
+        regressions += slower
+        print(f"{key[0]:>18} {new[key]['bytes'] / 1024 ** 2:>10.2f}"
+              + f" {old_seconds:>9.4f} {new_seconds:>9.4f} {change:>+7.1f}%"
+              + (' slower' if slower else ''))
+
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f'Only in {"old" if key in old else "new"} run: {key[0]}'
+              + f' ({key[1]} bytes)')
+    if regressions:
+        print(f'{regressions} benchmarks are more than {args.threshold}%'
+              + ' slower')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+'''Times whole conversions (convert_from_text, convert_from_file and the
+   command line) and the most important parts of the converter (format_txt,
+   decorate_txt, find_links, add_table and add_collapsible) on inputs of every
+   given size, reporting MB/s and lines/s. Results can be saved as JSON and
+   two saved runs compared with benchmarks/compare.py.
+
+   Documents are copies of cs.paml or, with --corpus generated, made by
+   paml2html.generate with the default knobs and seed.
+
+   Usage: python benchmarks/suite.py [--sizes 64K,1M,8M] [--repeat 3]
+                                     [--corpus cs]
+                                     [--only convert_from_text,format_txt]
+                                     [--save results.json]'''
+
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from paml2html import paml2html  # noqa: E402
+from paml2html.generate import generate_paml  # noqa: E402
+
+CLI = ROOT / 'src' / 'paml2html' / 'paml2html.py'
+CS_PAML = ROOT / 'tests' / 'fixtures' / 'cs.paml'
+
+SENTENCE = ('Some **bold** text, some __italics__ and ~~strikethrough~~ '
+            + 'and a [link](https://pokerfacowaty.com) with plain words '
+            + 'after it. ')
+TABLE_ROW = '| **Bold** cell | [Link](https://pokerfacowaty.com) | Plain |\n'
+COLLAPSIBLE_ENTRIES = ('    /Ctrl + A /* Line beginning */\n'
+                       + '    ```/* Create an alias */\n'
+                       + '    alias {short}="{full}"\n'
+                       + '    ```\n'
+                       + '    >➤ Nested\n'
+                       + '        /Ctrl + E /* **EOTL** */\n')
+
+
+def repeat_to_size(paml_text: str, size: int) -> str:
+    '''Repeats whole copies of paml_text, so that no element is cut in half,
+       until there are at least size characters'''
+
+    return paml_text * max(1, -(-size // len(paml_text)))
+
+
+def parse_size(size: str) -> int:
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    size = size.strip().upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+class Input:
+    '''Text given to a benchmark; its size and lines are what the throughput
+       is calculated from'''
+
+    def __init__(self, text: str):
+        self.text = text
+        self.bytes = len(text.encode('utf-8'))
+        self.lines = text.count('\n') or 1
+
+
+def document_input(size: int) -> Input:
+    with open(CS_PAML, encoding='utf-8') as p:
+        return Input(repeat_to_size(p.read(), size))
+
+
+def generated_input(size: int) -> Input:
+    return Input(generate_paml(size))
+
+
+def paragraph_input(size: int) -> Input:
+    return Input(repeat_to_size(SENTENCE, size))
+
+
+def table_input(size: int) -> Input:
+    return Input('| Header | Link | Text |\n| --- | --- | --- |\n'
+                 + repeat_to_size(TABLE_ROW, size))
+
+
+def collapsible_input(size: int) -> Input:
+    return Input(repeat_to_size(COLLAPSIBLE_ENTRIES, size))
+
+
+def prepare_lines(function):
+    '''Returns a benchmark calling an add_* function on the first line of
+       the input, the lines are split before timing'''
+
+    def prepare(paml_input: Input, size: int):
+        paml_lines = paml_input.text.splitlines(True)
+        paml2html.add_last_line(paml_lines)
+        conv = paml2html.Converter()
+        return lambda: function(paml_lines, 0, conv)
+    return prepare
+
+
+def benchmarks(tmp: Path, corpus='cs') -> dict:
+    '''Every benchmark as a function making its input for a size and a
+       function preparing what's timed, called again for every repetition'''
+
+    document = generated_input if corpus == 'generated' else document_input
+
+    def source_file(size: int) -> Path:
+        source = tmp / f'{size}.paml'
+        if not source.exists():
+            source.write_text(document(size).text, encoding='utf-8')
+        return source
+
+    def prepare_cli(paml_input: Input, size: int):
+        source = source_file(size)
+        destination = tmp / 'cli.html'
+        # removed before every run, so that the CLI really writes it instead
+        # of finding the same HTML there and skipping the write
+        destination.unlink(missing_ok=True)
+        return lambda: subprocess.run([sys.executable, str(CLI), str(source),
+                                       str(destination)], check=True)
+
+    def prepare_file(paml_input: Input, size: int):
+        source = source_file(size)
+        return lambda: paml2html.convert_from_file(source)
+
+    return {
+        'convert_from_text': (document, lambda paml_input, size:
+                              lambda: paml2html.convert_from_text(
+                                  paml_input.text)),
+        'convert_from_file': (document, prepare_file),
+        'cli': (document, prepare_cli),
+        'format_txt': (paragraph_input, lambda paml_input, size:
+                       lambda: paml2html.format_txt(paml_input.text)),
+        'decorate_txt': (paragraph_input, lambda paml_input, size:
+                         lambda: paml2html.decorate_txt(paml_input.text)),
+        'find_links': (paragraph_input, lambda paml_input, size:
+                       lambda: paml2html.find_links(paml_input.text)),
+        'add_table': (table_input, prepare_lines(paml2html.add_table)),
+        'add_collapsible': (collapsible_input,
+                            prepare_lines(paml2html.add_collapsible)),
+    }
+
+
+def best_time(prepare, paml_input: Input, size: int, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        function = prepare(paml_input, size)
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_suite(sizes: list, repeat: int, only=None, corpus='cs') -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (make_input, prepare) in benchmarks(Path(tmp),
+                                                      corpus).items():
+            if only and name not in only:
+                continue
+            for size in sizes:
+                paml_input = make_input(size)
+                seconds = best_time(prepare, paml_input, size, repeat)
+                result = {'benchmark': name, 'size': size,
+                          'bytes': paml_input.bytes,
+                          'lines': paml_input.lines, 'seconds': seconds,
+                          'mb_per_s': paml_input.bytes / (1024 ** 2)
+                          / seconds,
+                          'lines_per_s': paml_input.lines / seconds}
+                print_result(result)
+                results.append(result)
+    return results
+
+
+def print_result(result: dict):
+    print(f"{result['benchmark']:>18} {result['bytes'] / 1024 ** 2:>10.2f}"
+          + f" {result['seconds']:>10.4f} {result['mb_per_s']:>9.2f}"
+          + f" {result['lines_per_s']:>12.0f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="64K,1M,8M",
+                        help="Comma separated input sizes, like 64K,1M,256M")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How many times every benchmark is repeated,"
+                        + " the best time is saved")
+    parser.add_argument("--corpus", choices=["cs", "generated"],
+                        default="cs",
+                        help="Convert copies of cs.paml or generated"
+                        + " documents")
+    parser.add_argument("--only", default=None,
+                        help="Comma separated names of benchmarks to run")
+    parser.add_argument("--save", default=None,
+                        help="Save the results to a JSON file")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    print(f"{'benchmark':>18} {'size (MB)':>10} {'time (s)':>10}"
+          + f" {'MB/s':>9} {'lines/s':>12}")
+    results = run_suite(sizes, args.repeat, only, args.corpus)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.now(timezone.utc).isoformat(),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'repeat': args.repeat, 'corpus': args.corpus,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
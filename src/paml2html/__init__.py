@@ -1,3 +1,42 @@
-from .paml2html import convert_from_file, convert_from_text
+from importlib import import_module
 
-__all__ = ["convert_from_file", "convert_from_text"]
\ No newline at end of file
+# The module every name is imported from. Modules are only imported when one
+# of their names is used, so that importing a single module (like the thin
+# client) doesn't also import the converter, asyncio and multiprocessing.
+_MODULES = {
+    "AsyncConverter": "aio", "aconvert": "aio", "aiter_convert": "aio",
+    "convert_tree": "batch",
+    "DiskCache": "cache",
+    "Client": "client",
+    "convert_parallel": "parallel", "iter_convert_parallel": "parallel",
+    "ConversionSession": "paml2html", "ConversionStats": "paml2html",
+    "Converter": "paml2html", "InlineCache": "paml2html",
+    "convert_from_file": "paml2html", "convert_from_text": "paml2html",
+    "iter_convert": "paml2html", "parse_from_file": "paml2html",
+    "parse_from_text": "paml2html", "render_document": "paml2html",
+    "ConversionServer": "server",
+}
+
+__all__ = ["AsyncConverter", "Client", "ConversionServer",
+           "ConversionSession", "ConversionStats", "Converter", "DiskCache",
+           "InlineCache", "aconvert",
+           "aiter_convert", "convert_from_file", "convert_from_text",
+           "convert_parallel", "convert_tree", "iter_convert",
+           "iter_convert_parallel", "parse_from_file", "parse_from_text",
+           "render_document"]
+
+
+def __getattr__(name: str):
+    try:
+        module = _MODULES[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute'
+                             + f' {name!r}') from None
+    value = getattr(import_module(f'.{module}', __name__), name)
+    # found without __getattr__ from now on
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
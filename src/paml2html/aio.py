@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+try:
+    from .paml2html import Converter
+except ImportError:
+    # paml2html.py started directly as a script
+    from paml2html import Converter
+
+
+class AsyncConverter:
+    '''Converts documents from asyncio code without blocking the event loop.
+       The conversions run in a thread pool owned by the AsyncConverter, so at
+       most max_concurrency of them use the CPU at the same time (one per CPU
+       by default) and the rest wait for their turn.
+
+       aconvert returns the whole HTML like convert_from_text, aiter_convert
+       yields it in pieces of at least chunk_size characters as top-level
+       elements are finished, so that a response can be sent before the whole
+       document is converted.
+
+       Cancelling a conversion that is still waiting for a thread removes it
+       from the queue. A running aconvert can't be interrupted and finishes in
+       the background, while aiter_convert stops after the piece it's working
+       on. close() (or leaving `async with`) shuts the threads down.'''
+
+    def __init__(self, max_concurrency=None, backend='native',
+                 chunk_size=4096):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.executor = ThreadPoolExecutor(self.max_concurrency,
+                                           thread_name_prefix='paml2html')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''Stops the threads once the running conversions are done, the
+           waiting ones are cancelled'''
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aconvert(self, paml_text: str, stats=None) -> str:
+        '''Returns the HTML of paml_text (like convert_from_text)'''
+
+        converter = Converter(self.backend, stats)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, converter.convert_text, paml_text)
+
+    async def aiter_convert(self, paml_text: str, stats=None):
+        '''Yields the HTML of paml_text in pieces, joined together it's the
+           same as the one returned by aconvert'''
+
+        loop = asyncio.get_running_loop()
+        paml_lines = paml_text.splitlines(True)
+        # the lines are all there already, nothing is read lazily
+        chunks = Converter(self.backend, stats).iter_convert(paml_lines,
+                                                             len(paml_lines))
+        while True:
+            html = await loop.run_in_executor(self.executor, join_chunks,
+                                              chunks, self.chunk_size)
+            if not html:
+                return
+            yield html
+
+
+def join_chunks(chunks, chunk_size: int) -> str:
+    '''Runs in a thread of AsyncConverter, returns the next chunks of HTML
+       joined until there are at least chunk_size characters (or '' once the
+       document is done)'''
+
+    html = []
+    size = 0
+    for chunk in chunks:
+        html.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            break
+    return ''.join(html)
+
+
+default_converter = None
+
+
+def get_default_converter() -> AsyncConverter:
+    '''Returns the AsyncConverter used by aconvert and aiter_convert, made
+       when it's first needed'''
+
+    global default_converter
+    if default_converter is None:
+        default_converter = AsyncConverter()
+    return default_converter
+
+
+async def aconvert(paml_text: str, stats=None) -> str:
+    '''Used from asyncio code, returns a string containing HTML. Runs in
+       the threads of a shared AsyncConverter.'''
+
+    return await get_default_converter().aconvert(paml_text, stats)
+
+
+async def aiter_convert(paml_text: str, stats=None):
+    '''Used from asyncio code, yields strings containing HTML as top-level
+       elements are finished. Runs in the threads of a shared
+       AsyncConverter.'''
+
+    async for html in get_default_converter().aiter_convert(paml_text, stats):
+        yield html
@@ -0,0 +1,117 @@
+from multiprocessing import Pool
+from pathlib import Path
+import os
+
+try:
+    from .paml2html import ConversionStats, iter_convert, write_if_changed
+except ImportError:
+    # paml2html.py started directly as a script
+    from paml2html import ConversionStats, iter_convert, write_if_changed
+
+
+# The InlineCache used by convert_task, every process has its own copy
+worker_inline_cache = None
+
+
+def convert_tree(source_dir, destination_dir, indentation=None, workers=None,
+                 max_tasks_per_worker=100, cache=None, stats=None,
+                 inline_cache=None) -> dict:
+    '''Converts every .paml file in source_dir and its subdirectories into an
+       .html file at the same place in destination_dir. Files are converted
+       in a pool of processes, one per CPU by default, biggest files first so
+       that no process is left with a big file at the very end. A process is
+       replaced with a new one after max_tasks_per_worker files.
+
+       Returns a dict with every source file and None if it was converted or
+       the error message if it wasn't. A file that fails doesn't stop the
+       others from being converted.
+
+       With a cache (a paml2html.cache.DiskCache) files that didn't change
+       since they were last converted are taken from it, and the cache is
+       pruned to its maximum size at the end. With stats (a ConversionStats)
+       the stats of every file converted are added to it.
+
+       With inline_cache (an InlineCache) formatted text is remembered
+       across all the files a process converts. Every process starts with a
+       copy of it, only its hits and misses are added up in inline_cache.'''
+
+    source_dir = Path(source_dir)
+    destination_dir = Path(destination_dir)
+    sources = sorted(source_dir.rglob('*.paml'),
+                     key=lambda p: p.stat().st_size, reverse=True)
+    tasks = [(source,
+              destination_dir / source.relative_to(source_dir)
+              .with_suffix('.html'),
+              indentation, cache, stats is not None)
+             for source in sources]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    results = {}
+    if workers <= 1:
+        use_inline_cache(inline_cache)
+        try:
+            # counted in inline_cache already
+            add_results(map(convert_task, tasks), results, stats, None)
+        finally:
+            use_inline_cache(None)
+    else:
+        with Pool(workers, maxtasksperchild=max_tasks_per_worker,
+                  initializer=use_inline_cache,
+                  initargs=(inline_cache,)) as pool:
+            add_results(pool.imap_unordered(convert_task, tasks, chunksize=1),
+                        results, stats, inline_cache)
+    if cache is not None:
+        cache.prune()
+    return results
+
+
+def add_results(converted, results: dict, stats, inline_cache):
+    for source, error, task_stats, inline_counts in converted:
+        results[source] = error
+        if task_stats is not None:
+            stats.merge(task_stats)
+        if inline_cache is not None and inline_counts is not None:
+            inline_cache.hits += inline_counts[0]
+            inline_cache.misses += inline_counts[1]
+
+
+def use_inline_cache(inline_cache):
+    '''Sets the InlineCache used by convert_task in this process'''
+
+    global worker_inline_cache
+    worker_inline_cache = inline_cache
+
+
+def convert_task(task: tuple) -> tuple:
+    '''Converts a single file inside a worker process, errors are returned
+       instead of raised so that they can be reported for every file. Stats
+       are returned too when they're collected, and so are the hits and
+       misses of the process' InlineCache while converting the file.'''
+
+    source, destination, indentation, cache, collect_stats = task
+    stats = ConversionStats() if collect_stats else None
+    inline_cache = worker_inline_cache
+    if inline_cache is not None:
+        hits, misses = inline_cache.hits, inline_cache.misses
+    try:
+        if cache is not None:
+            html = [cache.convert_file(source, indentation=indentation,
+                                       stats=stats,
+                                       inline_cache=inline_cache)]
+        else:
+            html = iter_convert(source, stats=stats, indentation=indentation,
+                                inline_cache=inline_cache)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        # files that didn't change keep their modification time
+        write_if_changed(destination, html)
+        error = None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    inline_counts = None
+    if inline_cache is not None:
+        inline_counts = (inline_cache.hits - hits,
+                         inline_cache.misses - misses)
+    return source, error, stats, inline_counts
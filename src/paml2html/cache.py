@@ -0,0 +1,191 @@
+from hashlib import sha256
+from pathlib import Path
+import argparse
+import io
+import os
+import pickle
+import tempfile
+
+try:
+    from . import paml2html
+except ImportError:
+    # paml2html.py started directly as a script
+    import paml2html
+
+# Changes every time the converter changes, so that nothing made by an older
+# version is ever taken from the cache
+CONVERTER_VERSION = sha256(Path(paml2html.__file__).read_bytes()).hexdigest()
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    if cache_home:
+        return Path(cache_home) / 'paml2html'
+    return Path.home() / '.cache' / 'paml2html'
+
+
+class DiskCache:
+    '''Keeps converted HTML and parsed documents in a local directory, so
+       that files that didn't change since the last build don't need to be
+       converted again. Entries are keyed by a hash of the source file, the
+       version of the converter and the render options (like indentation).
+
+       Entries are pickled, so the directory should only be writable by
+       whoever uses it. When it takes more than max_bytes, prune() removes the
+       entries that were used the longest time ago.'''
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.directory = Path(directory or default_cache_dir())
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: bytes, kind: str, **options) -> str:
+        key = sha256(source)
+        key.update(f'\0{CONVERTER_VERSION}\0{kind}'.encode())
+        for name, value in sorted(options.items()):
+            key.update(f'\0{name}={value!r}'.encode())
+        return key.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}.pickle'
+
+    def load(self, key: str):
+        '''Returns the cached value or None if there isn't one'''
+
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        # the modification time is used to know which entries were used most
+        # recently when pruning
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def store(self, key: str, value):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # writing to a temporary file first, so that a conversion running at
+        # the same time never reads half of an entry
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def convert_file(self, filepath, indentation=None, stats=None,
+                     inline_cache=None) -> str:
+        '''Does the same as convert_from_file, taking the HTML from the cache
+           when possible. stats and inline_cache are only used when the file
+           has to be converted.'''
+
+        source = Path(filepath).read_bytes()
+        key = self.key(source, 'html', indentation=indentation)
+        html = self.load(key)
+        if html is None:
+            html = paml2html.Converter(
+                stats=stats, indentation=indentation,
+                inline_cache=inline_cache).convert_lines(read_lines(source))
+            self.store(key, html)
+        return html
+
+    def parse_file(self, filepath) -> 'paml2html.Document':
+        '''Does the same as parse_from_file, taking the parsed document from
+           the cache when possible'''
+
+        source = Path(filepath).read_bytes()
+        key = self.key(source, 'tree')
+        document = self.load(key)
+        if document is None:
+            document = paml2html.parse_lines(read_lines(source))
+            try:
+                self.store(key, document)
+            except RecursionError:
+                # pickle recurses into every level of nesting, documents
+                # nested deeper than the recursion limit aren't cached
+                pass
+        return document
+
+    def entries(self) -> list:
+        '''Returns (modification time, size, path) of every entry'''
+
+        entries = []
+        for path in self.directory.glob('*/*.pickle'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def stats(self) -> dict:
+        entries = self.entries()
+        return {'directory': str(self.directory), 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes}
+
+    def prune(self, max_bytes=None) -> int:
+        '''Removes the least recently used entries until the cache takes at
+           most max_bytes (self.max_bytes by default), returns the amount of
+           removed entries'''
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+def read_lines(source: bytes) -> list:
+    '''Splits a file's content into lines exactly like reading the file in
+       convert_from_file does'''
+
+    with io.TextIOWrapper(io.BytesIO(source), encoding='utf-8') as p:
+        return p.readlines()
+
+
+def main():
+    '''Shows how much the cache takes or prunes it down to a maximum size'''
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["stats", "prune"],
+                        help="stats shows the size of the cache, prune"
+                        + " removes the least recently used entries")
+    parser.add_argument("--cache-dir",
+                        help="Provide the cache directory. Defaults to"
+                        + " $XDG_CACHE_HOME/paml2html or ~/.cache/paml2html",
+                        default=None)
+    parser.add_argument("--max-size",
+                        help="Provide the maximum size of the cache in MB",
+                        type=float, default=256)
+    args = parser.parse_args()
+
+    cache = DiskCache(args.cache_dir,
+                      max_bytes=int(args.max_size * 1024 * 1024))
+    if args.command == 'prune':
+        print(f'Removed {cache.prune()} entries')
+    stats = cache.stats()
+    print(f"{stats['directory']}: {stats['entries']} entries,"
+          + f" {stats['bytes'] / (1024 * 1024):.1f} of"
+          + f" {stats['max_bytes'] / (1024 * 1024):.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
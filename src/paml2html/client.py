@@ -0,0 +1,135 @@
+'''A thin client for a running paml2html server (see server.py), for tools
+   converting one document per command. Only the standard library modules
+   it needs are imported, the converter itself is imported only when no
+   server is running and the document has to be converted right here.
+
+   Usage: python client.py source_file destination_file [--indent INDENT]
+          [--socket SOCKET]
+          python client.py --stop [--socket SOCKET]'''
+
+import json
+import os
+import socket
+import sys
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'paml2html.sock')
+    return f'/tmp/paml2html-{os.getuid()}.sock'
+
+
+class Client:
+    '''A connection to a server listening on a Unix domain socket, any
+       number of requests can be sent over it one after another. Raises
+       FileNotFoundError or ConnectionRefusedError if no server is
+       running.'''
+
+    def __init__(self, socket_path=None):
+        if socket_path is None:
+            socket_path = default_socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(os.fspath(socket_path))
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile('rwb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def request(self, **request) -> dict:
+        '''Sends a request (see ConversionServer.handle) and returns the
+           response'''
+
+        self.file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self.file.flush()
+        response = self.file.readline()
+        if not response:
+            raise ConnectionError('The server closed the connection')
+        return json.loads(response)
+
+    def convert_text(self, paml_text: str, indentation=None) -> str:
+        '''Returns the same HTML as convert_from_text, raises RuntimeError
+           with the server's error message if the text can't be converted'''
+
+        response = self.request(text=paml_text, indentation=indentation)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['html']
+
+
+def parse_args(args: list) -> dict:
+    '''Parses the few arguments of the client by hand, since importing
+       argparse would take a good part of the time the client takes'''
+
+    options = {'--indent': None, '--socket': None, '--stop': False}
+    paths = []
+    args = iter(args)
+    for arg in args:
+        if arg == '--stop':
+            options[arg] = True
+        elif arg in options:
+            options[arg] = next(args, None)
+            if options[arg] is None:
+                sys.exit(f'{arg} needs a value')
+        elif arg in ('-h', '--help'):
+            sys.exit(__doc__)
+        else:
+            paths.append(arg)
+    if len(paths) != (0 if options['--stop'] else 2):
+        sys.exit(__doc__)
+    options['paths'] = paths
+    return options
+
+
+def main():
+    '''Converts the source file into the destination file through a running
+       server, or like paml2html.py would if none is running'''
+
+    options = parse_args(sys.argv[1:])
+    indentation = None
+    if options['--indent'] is not None:
+        indentation = ' ' * int(options['--indent'])
+    try:
+        client = Client(options['--socket'])
+    except (FileNotFoundError, ConnectionRefusedError):
+        if options['--stop']:
+            sys.exit('No server is running')
+        convert_here(*options['paths'], indentation)
+        return
+
+    with client:
+        if options['--stop']:
+            client.request(command='stop')
+            return
+        source, destination = map(os.path.abspath, options['paths'])
+        response = client.request(source=source, destination=destination,
+                                  indentation=indentation)
+    # the lines that were skipped, like paml2html.py prints them
+    sys.stdout.write(response.get('printed', ''))
+    if 'error' in response:
+        sys.exit(f'Failed to convert {source}: {response["error"]}')
+
+
+def convert_here(source, destination, indentation):
+    try:
+        from .paml2html import convert_from_file, write_if_changed
+    except ImportError:
+        # client.py started directly as a script
+        from paml2html import convert_from_file, write_if_changed
+    write_if_changed(destination, [convert_from_file(
+        source, indentation=indentation)])
+
+
+if __name__ == '__main__':
+    main()
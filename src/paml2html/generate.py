@@ -0,0 +1,237 @@
+from pathlib import Path
+import argparse
+import random
+import sys
+
+WORDS = ('shell', 'session', 'window', 'pane', 'command', 'container',
+         'network', 'branch', 'cursor', 'line', 'screen', 'search', 'mode',
+         'file', 'video', 'volume', 'output', 'input', 'Q&A', '<tag>',
+         '"quoted"', 'a', 'the', 'to', 'and', 'with', 'for', 'every', 'new')
+CODE = ('tmux new -s {name}', 'git switch -c {new} {old}',
+        'ffmpeg -i {input} -c:v copy {output}', 'if a < b && c > d:',
+        '    print("{name}")', 'docker ps -q | xargs -n 1 docker inspect',
+        'x = [i * 2 for i in range(10)]', '# comment & more')
+DECORATIONS = ('**', '__', '~~')
+POSITIONS = 'lrf'
+ICONS = '➤▶•'
+
+
+class PamlGenerator:
+    '''Makes random but valid PaML documents, always the same for the same
+       seed. Every element parses and converts without errors (and without
+       running into any of the converter's quirks), so any size of document
+       can be used for benchmarks and stress tests.
+
+       The knobs decide how deeply collapsibles and lists are nested, the size
+       of tables and code blocks, how much of the text is decorated (or inline
+       code) and how many links there are in every piece of text.'''
+
+    def __init__(self, seed=0, collapsible_depth=2, collapsible_children=6,
+                 list_depth=2, list_items=4, table_rows=5, table_columns=3,
+                 code_block_lines=5, markup_density=0.2, links=1):
+        self.rng = random.Random(seed)
+        self.collapsible_depth = collapsible_depth
+        self.collapsible_children = collapsible_children
+        self.list_depth = list_depth
+        self.list_items = list_items
+        self.table_rows = table_rows
+        self.table_columns = table_columns
+        self.code_block_lines = code_block_lines
+        self.markup_density = markup_density
+        self.links = links
+
+    def generate(self, size: int) -> str:
+        '''Returns a document of top-level elements separated by empty lines,
+           with at least size characters'''
+
+        elements = []
+        length = 0
+        while length < size:
+            element = self.element()
+            elements.append(element)
+            length += len(element) + 1
+        return '\n'.join(elements)
+
+    def element(self) -> str:
+        '''Returns a random top-level element (ending in \\n)'''
+
+        return self.rng.choice([self.header, self.collapsible_box,
+                                self.paragraph, self.image,
+                                self.unordered_list, self.ordered_list,
+                                self.table, self.raw_html])()
+
+    def words(self, low=1, high=8) -> list:
+        return self.rng.choices(WORDS, k=self.rng.randint(low, high))
+
+    def inline(self, low=1, high=8) -> str:
+        '''Returns text with decorations, inline code and links'''
+
+        words = []
+        for word in self.words(low, high):
+            if self.rng.random() < self.markup_density:
+                if self.rng.random() < 0.75:
+                    decoration = self.rng.choice(DECORATIONS)
+                    word = f'{decoration}{word}{decoration}'
+                else:
+                    word = f'``{word}``'
+            words.append(word)
+        for _ in range(self.links):
+            words.insert(self.rng.randint(0, len(words)), self.link())
+        return ' '.join(words)
+
+    def link(self) -> str:
+        return (f'[{" ".join(self.words(1, 3))}]'
+                + f'(https://example.com/page-{self.rng.randint(1, 999)})')
+
+    def header(self) -> str:
+        return f'{"#" * self.rng.randint(1, 6)} {self.inline()}\n'
+
+    def collapsible_box(self) -> str:
+        position = self.rng.choice(POSITIONS)
+        return ''.join(self.collapsible(position, 0)
+                       for _ in range(self.rng.randint(1, 3)))
+
+    def collapsible(self, position: str, depth: int) -> str:
+        indentation = ' ' * 4 * depth
+        icon = self.rng.choice(ICONS + ' ')
+        lines = [f'{indentation}>{position}{icon}'
+                 + f' {" ".join(self.words(1, 3))}\n']
+        for _ in range(self.rng.randint(1, self.collapsible_children)):
+            if (depth + 1 < self.collapsible_depth
+               and self.rng.random() < 0.2):
+                lines.append(self.collapsible(position, depth + 1))
+            else:
+                lines.append(self.collapsible_entry(indentation + '    '))
+        return ''.join(lines)
+
+    def collapsible_entry(self, indentation: str) -> str:
+        entry = self.rng.choice([self.command, self.command, self.code_line,
+                                 self.code_block, self.table,
+                                 self.unordered_list, self.raw_html])()
+        return ''.join(indentation + line if line.strip() else line
+                       for line in entry.splitlines(True))
+
+    def comments(self) -> str:
+        comments = ''
+        if self.rng.random() < 0.8:
+            comments += f' /* {self.inline()} */'
+        if self.rng.random() < 0.3:
+            comments += f' /** {self.inline()} **/'
+        return comments
+
+    def command(self) -> str:
+        # a command starts with a plain word, so that it can't start with /**
+        return (f'/{self.rng.choice(WORDS)} {self.inline(0, 3)}'
+                + f'{self.comments()}\n')
+
+    def code_line(self) -> str:
+        return f'```{self.comments()}\n{self.rng.choice(CODE)}\n```\n'
+
+    def code_block(self) -> str:
+        if self.code_block_lines < 2:
+            # a single line of code is a code line
+            return self.code_line()
+        code = self.rng.choices(CODE, k=self.rng.randint(
+            2, self.code_block_lines))
+        return f'```{self.comments()}\n' + ''.join(line + '\n'
+                                                   for line in code) + '```\n'
+
+    def paragraph(self) -> str:
+        image = ''
+        if self.rng.random() < 0.2:
+            image = self.image(self.rng.choice(['!', '!l', '!r'])).rstrip()
+        lines = [self.inline(3, 12) + '\n'
+                 for _ in range(self.rng.randint(1, 4))]
+        return f'{{{image}\n{"".join(lines)}}}\n'
+
+    def image(self, identifier='!') -> str:
+        # images placed in paragraphs can also be !l or !r
+        return (f'{identifier}[{" ".join(self.words(1, 3))}]'
+                + f'(image-{self.rng.randint(1, 99)}.png)\n')
+
+    def unordered_list(self, depth=0) -> str:
+        return self.list_of_items(False, depth)
+
+    def ordered_list(self, depth=0) -> str:
+        return self.list_of_items(True, depth)
+
+    def list_of_items(self, ordered: bool, depth: int) -> str:
+        indentation = ' ' * 2 * depth
+        lines = []
+        for n in range(self.rng.randint(1, self.list_items)):
+            # only a single digit is understood as the number of an item
+            marker = f'{n % 9 + 1}.' if ordered else '-'
+            lines.append(f'{indentation}{marker} {self.inline()}\n')
+            if depth + 1 < self.list_depth and self.rng.random() < 0.3:
+                nested = self.rng.choice([self.unordered_list,
+                                          self.ordered_list])
+                lines.append(nested(depth + 1))
+        return ''.join(lines)
+
+    def table(self) -> str:
+        columns = self.rng.randint(1, self.table_columns)
+        lines = []
+        rows = self.rng.randint(1, self.table_rows)
+        if self.rng.random() < 0.7:
+            lines.append(self.table_row(columns))
+            lines.append('|' + ' --- |' * columns + '\n')
+        else:
+            # without a second row the first one would be taken as a header
+            # (skipping the line after the table)
+            rows = max(rows, 2)
+        for _ in range(rows):
+            lines.append(self.table_row(columns))
+        return ''.join(lines)
+
+    def table_row(self, columns: int) -> str:
+        return ('| ' + ' | '.join(self.inline(1, 4) for _ in range(columns))
+                + ' |\n')
+
+    def raw_html(self) -> str:
+        return (f'<\n<div class="raw">{" ".join(self.words())}</div>\n'
+                + '>\n')
+
+
+def generate_paml(size=64 * 1024, seed=0, **knobs) -> str:
+    '''Returns a document of at least size characters made by PamlGenerator
+       with the given seed and knobs'''
+
+    return PamlGenerator(seed, **knobs).generate(size)
+
+
+def main():
+    '''Writes a generated document to a file or the standard output'''
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("destination_file", nargs='?', default=None,
+                        help="Provide a .paml destination file. The document"
+                        + " is printed if it's not given")
+    parser.add_argument("--size", type=int, default=64 * 1024,
+                        help="Provide the minimal size of the document in"
+                        + " characters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--collapsible-depth", type=int, default=2)
+    parser.add_argument("--collapsible-children", type=int, default=6)
+    parser.add_argument("--list-depth", type=int, default=2)
+    parser.add_argument("--list-items", type=int, default=4)
+    parser.add_argument("--table-rows", type=int, default=5)
+    parser.add_argument("--table-columns", type=int, default=3)
+    parser.add_argument("--code-block-lines", type=int, default=5)
+    parser.add_argument("--markup-density", type=float, default=0.2,
+                        help="Provide the part of words (0-1) that are"
+                        + " decorated or inline code")
+    parser.add_argument("--links", type=int, default=1,
+                        help="Provide the amount of links in every piece of"
+                        + " text")
+    args = vars(parser.parse_args())
+
+    destination_file = args.pop('destination_file')
+    paml_text = generate_paml(**args)
+    if destination_file is None:
+        sys.stdout.write(paml_text)
+    else:
+        Path(destination_file).write_text(paml_text, encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
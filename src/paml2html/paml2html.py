@@ -1,154 +1,1767 @@
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import heappop, heappush
 from html import escape
+from importlib import import_module
+from itertools import accumulate, islice
+from os import PathLike, fstat
 from pathlib import Path
-from yattag import Doc, indent
+from time import perf_counter
 import argparse
+import mmap
+import os
+import re
+import shutil
+import sys
+
+try:
+    from yattag import Doc
+except ImportError:
+    # yattag is only needed for its Doc backend
+    Doc = None
+
+
+class StringTag:
+    '''What StringDoc.tag returns, writes the opening and closing tag that
+       are made only once for every tag name and class'''
+
+    __slots__ = ('append', 'opening', 'closing')
+
+    def __init__(self, append, opening: str, closing: str):
+        self.append = append
+        self.opening = opening
+        self.closing = closing
+
+    def __enter__(self):
+        self.append(self.opening)
+
+    def __exit__(self, tpe, value, traceback):
+        # like yattag, a tag isn't closed when there's an exception inside
+        if value is None:
+            self.append(self.closing)
+
+
+class StringDoc:
+    '''A lightweight replacement for the parts of yattag's Doc used by the
+       converter (tag, text, asis, stag and getvalue), making the exact same
+       HTML. Strings are appended to a list and joined only in getvalue.'''
+
+    def __init__(self):
+        self.result = []
+        self.append = self.result.append
+        self.tags = {}
+
+    def tag(self, name: str, klass=None) -> StringTag:
+        try:
+            return self.tags[name, klass]
+        except KeyError:
+            pass
+        if klass is None:
+            opening = f'<{name}>'
+        else:
+            opening = f'<{name} class="{attr_escape(klass)}">'
+        tag = self.tags[name, klass] = StringTag(self.append, opening,
+                                                 f'</{name}>')
+        return tag
+
+    def text(self, txt: str):
+        self.append(escape(txt, quote=False))
+
+    def asis(self, html: str):
+        self.append(html)
+
+    def stag(self, name: str, **attrs):
+        attrs = ' '.join(f'{"class" if key == "klass" else key}'
+                         + f'="{attr_escape(value)}"'
+                         for key, value in attrs.items())
+        self.append(f'<{name} {attrs} />' if attrs else f'<{name} />')
+
+    def getvalue(self) -> str:
+        return ''.join(self.result)
+
+
+TEXT, OPEN, CLOSE, OTHER = range(4)
+
+# The tokens of yattag's indent, found without its named groups for every
+# kind of token. Anything it can't parse (like a lone <) is taken as text.
+HTML_TOKEN = re.compile(r'''
+    (?P<text>[^<>]+)
+  | (?P<other><!--.*?-->
+      | <!\[CDATA\[.*?\]\]>
+      | <![^<>]*>
+      | <\?.*?\?>
+      | <\s*script\b[^>]*>.*?<\s*/\s*script\s*>
+      | <\s*style\b[^>]*>.*?<\s*/\s*style\s*>)
+  | <\s*(?P<close>/)?(?P<name>[^?/><"\s]+)
+      (?:[^<>"'/]|/(?!\s*>)|"[^"]*"|'[^']*')*
+      (?P<self>/\s*)?>
+  | [<>]''', re.I | re.S | re.X)
+# Most HTML (like the one made by render_inline) is only text and tags, which
+# can be split apart without going through every kind of token
+HTML_TAG = re.compile(r'(<[^<>]*>)')
+NAMED_TAG = re.compile(r'''<\s*(/)?([^?/><"\s]+)
+                           (?:[^<>"'/]|/(?!\s*>)|"[^"]*"|'[^']*')*(/\s*)?>$''',
+                       re.X)
+SPECIAL_HTML = re.compile(r'<[!?]|<\s*(script|style)', re.I)
+# Tags that are never closed (like the <br> between the lines of paragraphs),
+# taken as tokens of their own instead of opening tags
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                           'input', 'link', 'meta', 'source', 'track', 'wbr'])
+
+
+def html_tokens(html: str) -> list:
+    '''Splits HTML into (kind, content, tag name) tokens'''
+
+    if SPECIAL_HTML.search(html):
+        return parse_html_tokens(html)
+    tokens = []
+    append = tokens.append
+    parts = HTML_TAG.split(html)
+    for i in range(1, len(parts), 2):
+        text, part = parts[i - 1], parts[i]
+        match = NAMED_TAG.match(part)
+        if match is None or '<' in text or '>' in text:
+            # like a < or > inside quotes
+            return parse_html_tokens(html)
+        if text:
+            append((TEXT, text, None))
+        closing, name, self_closing = match.groups()
+        if self_closing is not None or (not closing
+                                        and name.lower() in VOID_ELEMENTS):
+            append((OTHER, part, name))
+        else:
+            append((CLOSE if closing else OPEN, part, name))
+    if '<' in parts[-1] or '>' in parts[-1]:
+        return parse_html_tokens(html)
+    if parts[-1]:
+        append((TEXT, parts[-1], None))
+    return tokens
+
+
+def parse_html_tokens(html: str) -> list:
+    '''html_tokens for any kind of HTML'''
+
+    tokens = []
+    for match in HTML_TOKEN.finditer(html):
+        name = match.group('name')
+        if name is not None:
+            if (match.group('self') is not None
+               or (not match.group('close')
+                   and name.lower() in VOID_ELEMENTS)):
+                kind = OTHER
+            else:
+                kind = CLOSE if match.group('close') else OPEN
+        elif match.group('other') is not None:
+            kind = OTHER
+        else:
+            kind = TEXT
+        tokens.append((kind, match.group(), name))
+    return tokens
+
+
+class HtmlIndenter:
+    '''Indents HTML the same way as yattag's indent (with its default
+       options) while it's being written, instead of parsing the finished
+       HTML again. The pieces of a StringDoc are used as they are: its tags
+       are known without being parsed and only the HTML added with asis and
+       stag is split into tokens.
+
+       HTML can be indented a part at a time (like the parts flushed by
+       Converter.iter_convert), the indentation goes on where the last part
+       ended. Since yattag matches every closing tag with the last opening
+       tag of the same name in the whole document, a part with an opening
+       tag that isn't closed yet is held back and indented together with
+       the next parts once it is. Void elements like <br> are never
+       closed, so they are left unmatched right away (unlike yattag, which
+       would still match them with a stray </br>).'''
+
+    def __init__(self, indentation: str, newline='\n'):
+        self.indentation = indentation
+        self.newline = newline
+        self.tokens = []
+        # where yattag's indent would be after the HTML indented so far
+        self.level = 0
+        self.sameline = 0
+        self.tag_appeared = False
+        # the opening tags of the tokens held back that aren't closed yet
+        # and which of those tokens are matched, see indent_tokens
+        self.unmatched = {}
+        self.matched = bytearray()
+
+    def indent(self, doc, final=False) -> str:
+        '''Returns the indented HTML written to doc (a StringDoc or yattag's
+           Doc), or '' if it's held back. With final=True nothing is held
+           back.'''
+
+        tokens = self.add_tokens(doc)
+        held = []
+        if not final and tokens and tokens[-1][0] == TEXT:
+            # the next part might start with more of the same text
+            held.append(tokens.pop())
+
+        # a tag with text right inside it keeps everything on one line, so
+        # the tag it's in has to be known for every text. Tokens held back
+        # for tags that aren't closed yet are left to indent_tokens.
+        text_parents = {}
+        opened = []
+        for i, (kind, content, name) in enumerate(
+                () if self.matched else tokens):
+            if kind == OPEN:
+                opened.append(i)
+            elif kind == CLOSE:
+                if not opened or tokens[opened[-1]][2] != name:
+                    break
+                start = opened.pop()
+                if start in text_parents:
+                    text_parents[start] = i
+            elif kind == TEXT and opened and content.strip():
+                text_parents[opened[-1]] = None
+        else:
+            if not opened and not self.sameline and not self.matched:
+                html = self.indent_nested(tokens, text_parents)
+                self.tokens = held
+                return html
+
+        html = self.indent_tokens(tokens, final)
+        if html is None:
+            tokens.extend(held)
+            return ''
+        self.tokens = held
+        return html
+
+    def add_tokens(self, doc) -> list:
+        '''Adds the tokens of the HTML written to doc to the ones held back
+           and returns them. Text next to other text is joined, like when
+           yattag finds it in the finished HTML.'''
+
+        known = {}
+        for (name, _), tag in getattr(doc, 'tags', {}).items():
+            known[tag.opening] = (OPEN, tag.opening, name)
+            known[tag.closing] = (CLOSE, tag.closing, name)
+
+        tokens = self.tokens
+        append = tokens.append
+        for piece in doc.result:
+            token = known.get(piece)
+            if token is not None:
+                append(token)
+                continue
+            elif '<' in piece or '>' in piece:
+                new_tokens = html_tokens(piece)
+            elif piece:
+                new_tokens = [(TEXT, piece, None)]
+            else:
+                continue
+            if (new_tokens[0][0] == TEXT and tokens
+               and tokens[-1][0] == TEXT):
+                tokens[-1] = (TEXT, tokens[-1][1] + new_tokens[0][1], None)
+                del new_tokens[0]
+            tokens.extend(new_tokens)
+        return tokens
+
+    def indent_nested(self, tokens: list, text_parents: dict) -> str:
+        '''Indents the tokens when every tag is closed in the order it was
+           opened. Every tag with text right inside it is written with
+           everything in it at once, leaving out text of only whitespace like
+           yattag.'''
+
+        result = []
+        append = result.append
+        indentation, newline = self.indentation, self.newline
+        level = self.level
+        tag_appeared = self.tag_appeared
+        was_just_opened = False
+        i = 0
+        while i < len(tokens):
+            kind, content, _ = tokens[i]
+            if kind == CLOSE:
+                level -= 1
+                if not was_just_opened:
+                    append(newline)
+                    append(indentation * level)
+                append(content)
+                was_just_opened = False
+            elif kind == TEXT and not content.strip():
+                pass
+            else:
+                if tag_appeared:
+                    append(newline)
+                append(indentation * level)
+                if kind != OPEN:
+                    append(content)
+                    was_just_opened = False
+                    tag_appeared = tag_appeared or kind == OTHER
+                elif i in text_parents:
+                    end = text_parents[i] + 1
+                    append(''.join([content for kind, content, _
+                                    in tokens[i:end]
+                                    if kind != TEXT or content.strip()]))
+                    was_just_opened = False
+                    tag_appeared = True
+                    i = end
+                    continue
+                else:
+                    append(content)
+                    level += 1
+                    was_just_opened = True
+                    tag_appeared = True
+            i += 1
+
+        self.level = level
+        self.tag_appeared = tag_appeared
+        return ''.join(result)
+
+    def indent_tokens(self, tokens: list, final: bool):
+        '''Indents the tokens with the same steps as yattag's indent, for
+           any HTML. Returns None if they have to be held back.'''
+
+        # every closing tag is matched with the last unmatched opening tag
+        # of the same name, wherever it is. Tokens held back were matched
+        # already, only the new ones are looked at.
+        unmatched, matched = self.unmatched, self.matched
+        for i in range(len(matched), len(tokens)):
+            kind, _, name = tokens[i]
+            matched.append(0)
+            if kind == OPEN:
+                unmatched.setdefault(name, []).append(i)
+            elif kind == CLOSE and unmatched.get(name):
+                matched[unmatched[name].pop()] = matched[i] = 1
+        if not final and any(unmatched.values()):
+            return None
+        self.unmatched, self.matched = {}, bytearray()
+
+        text_parents = set()
+        current = []
+        for i, (kind, content, _) in enumerate(tokens):
+            if kind == TEXT:
+                if current and content.strip():
+                    text_parents.add(current[-1])
+            elif matched[i]:
+                if kind == OPEN:
+                    current.append(i)
+                else:
+                    current.pop()
+
+        result = []
+        append = result.append
+        indentation, newline = self.indentation, self.newline
+        level, sameline = self.level, self.sameline
+        tag_appeared = self.tag_appeared
+        was_just_opened = False
+        for i, (kind, content, _) in enumerate(tokens):
+            if kind == TEXT:
+                if not content.strip():
+                    continue
+                if not sameline:
+                    if tag_appeared:
+                        append(newline)
+                    append(indentation * level)
+                append(content)
+                was_just_opened = False
+            elif kind == OPEN and matched[i]:
+                was_just_opened = True
+                if sameline:
+                    sameline += 1
+                else:
+                    if tag_appeared:
+                        append(newline)
+                    append(indentation * level)
+                if i in text_parents:
+                    sameline = sameline or 1
+                append(content)
+                level += 1
+                tag_appeared = True
+            elif kind == CLOSE and matched[i]:
+                level -= 1
+                tag_appeared = True
+                if sameline:
+                    sameline -= 1
+                elif not was_just_opened:
+                    append(newline)
+                    append(indentation * level)
+                append(content)
+                was_just_opened = False
+            else:
+                if not sameline:
+                    if tag_appeared:
+                        append(newline)
+                    append(indentation * level)
+                append(content)
+                was_just_opened = False
+                tag_appeared = True
+
+        self.level, self.sameline = level, sameline
+        self.tag_appeared = tag_appeared
+        return ''.join(result)
+
+
+def attr_escape(value: str) -> str:
+    '''Escapes an attribute's value the same way yattag does'''
+
+    return (value.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;'))
+
+
+BACKENDS = {'native': StringDoc}
+if Doc is not None:
+    BACKENDS['yattag'] = Doc
+
+# The ConversionStats of the conversion running in the current thread (or
+# asyncio task), None when they aren't collected. A context variable, because
+# parsing is done without a Converter.
+STATS = ContextVar('paml2html_stats', default=None)
+# The InlineCache of the conversion running in the current thread, if any
+INLINE_CACHE = ContextVar('paml2html_inline_cache', default=None)
+# True while a Converter is converting in the current thread, inline text is
+# then made into HTML right away instead of nodes that are rendered right
+# after being made
+CONVERTING = ContextVar('paml2html_converting', default=False)
+
+
+class HandlerStats:
+    '''Numbers collected for a single handler. Times are in seconds and
+       include elements nested inside (like commands in a collapsible box),
+       sizes are in characters.'''
+
+    __slots__ = ('calls', 'parse_time', 'render_time', 'max_parse_time',
+                 'max_render_time', 'input_chars', 'output_chars')
+
+    def __init__(self):
+        self.calls = 0
+        self.parse_time = 0.0
+        self.render_time = 0.0
+        self.max_parse_time = 0.0
+        self.max_render_time = 0.0
+        self.input_chars = 0
+        self.output_chars = 0
+
+    @property
+    def total_time(self) -> float:
+        return self.parse_time + self.render_time
+
+    def as_dict(self) -> dict:
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats['total_time'] = self.total_time
+        return stats
+
+
+class ConversionStats:
+    '''Counts, times and sizes of every handler (add_header, add_command,
+       add_table, format_txt...) used in conversions, collected when it's
+       given to a Converter (or convert_from_file, convert_from_text,
+       iter_convert). The same stats can be given to any number of
+       conversions to add them all up.'''
+
+    def __init__(self):
+        self.handlers = {}
+
+    def __getitem__(self, handler: str) -> HandlerStats:
+        return self.handlers[handler]
+
+    def handler(self, name: str) -> HandlerStats:
+        try:
+            return self.handlers[name]
+        except KeyError:
+            stats = self.handlers[name] = HandlerStats()
+            return stats
+
+    def parsed(self, name: str, start: float, input_chars: int):
+        '''Adds a parsed element that started being parsed at start'''
+
+        seconds = perf_counter() - start
+        stats = self.handler(name)
+        stats.calls += 1
+        stats.parse_time += seconds
+        stats.max_parse_time = max(stats.max_parse_time, seconds)
+        stats.input_chars += input_chars
+
+    def rendered(self, name: str, start: float, output_chars: int):
+        '''Adds a rendered element that started being rendered at start'''
+
+        seconds = perf_counter() - start
+        stats = self.handler(name)
+        stats.render_time += seconds
+        stats.max_render_time = max(stats.max_render_time, seconds)
+        stats.output_chars += output_chars
+
+    def merge(self, other: 'ConversionStats'):
+        for name, other_stats in other.handlers.items():
+            stats = self.handler(name)
+            stats.calls += other_stats.calls
+            stats.parse_time += other_stats.parse_time
+            stats.render_time += other_stats.render_time
+            stats.max_parse_time = max(stats.max_parse_time,
+                                       other_stats.max_parse_time)
+            stats.max_render_time = max(stats.max_render_time,
+                                        other_stats.max_render_time)
+            stats.input_chars += other_stats.input_chars
+            stats.output_chars += other_stats.output_chars
+
+    def as_dict(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.handlers.items()}
+
+    def format(self) -> str:
+        '''Returns a table of all handlers, the slowest ones first'''
+
+        lines = [f"{'handler':>20} {'calls':>8} {'total ms':>9}"
+                 + f" {'parse ms':>9} {'render ms':>10} {'max ms':>7}"
+                 + f" {'in KB':>8} {'out KB':>8}"]
+        for name, stats in sorted(self.handlers.items(),
+                                  key=lambda item: -item[1].total_time):
+            max_time = max(stats.max_parse_time, stats.max_render_time)
+            lines.append(f"{name:>20} {stats.calls:>8}"
+                         + f" {stats.total_time * 1000:>9.2f}"
+                         + f" {stats.parse_time * 1000:>9.2f}"
+                         + f" {stats.render_time * 1000:>10.2f}"
+                         + f" {max_time * 1000:>7.2f}"
+                         + f" {stats.input_chars / 1024:>8.1f}"
+                         + f" {stats.output_chars / 1024:>8.1f}")
+        return '\n'.join(lines)
+
+
+class Converter:
+    '''Holds everything a single conversion writes to, so that any number of
+       conversions can run at the same time (e.g. in threads) without
+       overwriting each other's output. The Converter is passed along to
+       identify_element and all of the add_* functions.
+
+       HTML is made with the backend's Doc, the built-in StringDoc by default
+       or yattag's Doc with backend='yattag'. Both make the same HTML. With
+       stats (a ConversionStats) every handler is timed. With indentation
+       (like '  ') the HTML is indented by an HtmlIndenter the same way as
+       yattag's indent would. With inline_cache (an InlineCache) text that was
+       already formatted is taken from it.'''
+
+    def __init__(self, backend='native', stats=None, indentation=None,
+                 inline_cache=None):
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend {backend!r}, available'
+                             + f' backends: {", ".join(BACKENDS)}')
+        self.doc_class = BACKENDS[backend]
+        self.stats = stats
+        self.inline_cache = inline_cache
+        self.indentation = indentation
+        self.indenter = None
+        if indentation is not None:
+            self.indenter = HtmlIndenter(indentation)
+        self.doc = self.doc_class()
+        self.tag, self.text = self.doc.tag, self.doc.text
+
+    def getvalue(self) -> str:
+        if self.indentation is None:
+            return self.doc.getvalue()
+        # indented as if it was the whole document
+        return HtmlIndenter(self.indentation).indent(self.doc, final=True)
+
+    def convert_lines(self, paml_lines: list) -> str:
+        '''Converts a list of lines (ending in \\n, as returned by readlines)
+           and returns a string containing HTML'''
+
+        if not paml_lines:
+            return ''
+        add_last_line(paml_lines)
+        return self.convert_scanned(ScannedLines(paml_lines))
+
+    def convert_scanned(self, paml_lines: 'ScannedLines') -> str:
+        '''Converts ScannedLines (or SourceLines) and returns a string
+           containing HTML'''
+
+        i = 0
+        while i < len(paml_lines):
+            i = identify_element(paml_lines, i, self)
+
+        return self.getvalue()
 
-doc, tag, text, line = Doc().ttl()
+    def convert_file(self, filepath) -> str:
+        with open(filepath, 'r', encoding='utf-8') as p:
+            paml_text = p.read()
+        if not paml_text:
+            return ''
+        return self.convert_scanned(source_lines(paml_text,
+                                                 newlines_only=True))
+
+    def convert_mapped_file(self, filepath) -> str:
+        '''Converts a file read with read_mapped_lines, so that only the lines
+           of the element being converted are held as strings'''
+
+        return ''.join(self.iter_convert(read_mapped_lines(filepath),
+                                         MAPPED_LINES_AT_ONCE))
+
+    def convert_text(self, paml_text: str) -> str:
+        if not paml_text:
+            return ''
+        return self.convert_scanned(source_lines(paml_text))
+
+    @contextmanager
+    def collecting_stats(self):
+        '''Makes handlers add to this Converter's stats (or nothing if it
+           doesn't have any) and use its InlineCache, and makes inline text
+           into HTML right away (see parse_inline)'''
+
+        token = STATS.set(self.stats)
+        cache_token = INLINE_CACHE.set(self.inline_cache)
+        converting_token = CONVERTING.set(True)
+        try:
+            yield
+        finally:
+            CONVERTING.reset(converting_token)
+            INLINE_CACHE.reset(cache_token)
+            STATS.reset(token)
+
+    def flush(self, final=False) -> str:
+        '''Returns the HTML written since the last flush and starts over with
+           an empty Doc. With indentation, HTML is held back while some of its
+           tags aren't closed yet (see HtmlIndenter), unless final is True.'''
+
+        if self.indenter is None:
+            value = self.doc.getvalue()
+        else:
+            value = self.indenter.indent(self.doc, final)
+        self.doc = self.doc_class()
+        self.tag, self.text = self.doc.tag, self.doc.text
+        return value
+
+    def iter_convert(self, lines, lines_at_once=1):
+        '''Converts lines coming from any iterable (like an open file) and
+           yields HTML every time an element at the top of the document (a
+           header, a collapsible box, a table etc.) is finished, and every
+           TABLE_ROWS_AT_ONCE rows of a table. Lines are only read when needed
+           (lines_at_once at a time) and forgotten once their element is
+           done, so the memory used depends on the biggest element (other
+           than tables) instead of the whole document.'''
+
+        paml_lines = LazyLines(lines, lines_at_once)
+        i = 0
+        while i < len(paml_lines):
+            parts = element_parts(paml_lines, i, self)
+            while True:
+                # collected only while converting, the code using the yielded
+                # HTML might be running other conversions
+                with self.collecting_stats():
+                    end = next(parts, None)
+                if end is None:
+                    break
+                i = end
+                paml_lines.forget_before(i)
+                html = self.flush()
+                if html:
+                    yield html
+        html = self.flush(final=True)
+        if html:
+            yield html
+
+
+class ConversionSession:
+    '''Used for converting the same document over and over while it's being
+       edited. Every element at the top of the document is remembered together
+       with the lines its add_* function looked at (including the line that
+       told it to stop) and the HTML it made. When converting again, elements
+       starting with the same lines are taken from the cache instead, so
+       usually only the element that was edited is converted again. The
+       result is always the same as converting the whole document.
+
+       The least recently used elements are forgotten once the cache takes
+       more than max_cache_bytes (characters of PaML and HTML together). With
+       inline_cache (an InlineCache) the text of elements that are converted
+       is taken from it when it was already formatted.'''
+
+    def __init__(self, max_cache_bytes=32 * 1024 * 1024, inline_cache=None):
+        self.max_cache_bytes = max_cache_bytes
+        self.inline_cache = inline_cache
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # lines looked at: (HTML, amount of lines the element takes)
+        self.cache = OrderedDict()
+        # first line: {amount of lines looked at: amount of cache entries}
+        self.spans = {}
+
+    def convert_text(self, paml_text: str) -> str:
+        return self.convert_lines(paml_text.splitlines(True))
+
+    def convert_lines(self, paml_lines: list) -> str:
+        if not paml_lines:
+            return ''
+        add_last_line(paml_lines)
+        paml_lines = ScannedLines(paml_lines)
+
+        result = []
+        conv = Converter(inline_cache=self.inline_cache)
+        i = 0
+        while i < len(paml_lines):
+            html, taken = self.cached_element(paml_lines, i)
+            if html is None:
+                html, taken = self.convert_element(paml_lines, i, conv)
+            result.append(html)
+            i += taken
+        return ''.join(result)
+
+    def cached_element(self, paml_lines: list, i: int):
+        for span in self.spans.get(paml_lines[i], ()):
+            key = tuple(paml_lines[i:i + span])
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None, 0
+
+    def convert_element(self, paml_lines: list, i: int, conv: Converter):
+        self.misses += 1
+        tracked_lines = TrackedLines(paml_lines)
+        end = identify_element(tracked_lines, i, conv)
+        html = conv.flush()
+
+        key = tuple(paml_lines[i:max(tracked_lines.furthest + 1, end)])
+        size = len(html) + sum(map(len, key))
+        if key not in self.cache and size <= self.max_cache_bytes:
+            self.cache[key] = (html, end - i)
+            spans = self.spans.setdefault(key[0], {})
+            spans[len(key)] = spans.get(len(key), 0) + 1
+            self.cache_bytes += size
+            self.evict()
+        return html, end - i
+
+    def evict(self):
+        while self.cache_bytes > self.max_cache_bytes:
+            key, (html, taken) = self.cache.popitem(last=False)
+            self.cache_bytes -= len(html) + sum(map(len, key))
+            spans = self.spans[key[0]]
+            spans[len(key)] -= 1
+            if not spans[len(key)]:
+                del spans[len(key)]
+                if not spans:
+                    del self.spans[key[0]]
+
+
+class ScannedLines(list):
+    '''Lines of a document (ending in \\n, after add_last_line) together with
+       what the add_* functions need to know about every line, found in
+       a single pass instead of stripping lines and counting spaces again and
+       again for every element:
+
+       indents - the amount of spaces at the beginning of the line
+       starts, ends - where the line starts and ends without the whitespace
+                      around it, line.strip() is line[start:end]
+       firsts - the first character that isn't whitespace, or a space for
+                lines of only whitespace
+
+       Every column is indexed the same way as the lines. TrackedLines and
+       LazyLines have the same columns. identify_element, parse_element and
+       the add_* functions scan a list of lines given to them (see
+       scanned_lines), the other parse_* functions need it scanned.'''
+
+    __slots__ = ('indents', 'starts', 'ends', 'firsts')
+
+    def __init__(self, paml_lines=()):
+        super().__init__(paml_lines)
+        self.indents, self.starts, self.ends, firsts = scan(self)
+        self.firsts = ''.join(firsts)
+
+
+# line boundaries of splitlines other than \n
+OTHER_LINE_BOUNDARIES = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+# lines of text ending only at \n
+NEWLINE_LINES = re.compile('[^\n]*\n|[^\n]+')
+# how many characters SourceLines splits into lines at once to scan them
+SOURCE_BLOCK_SIZE = 1 << 20
+
+
+class SourceLines:
+    '''Works like ScannedLines of text.splitlines(True) after add_last_line,
+       but keeps the text as it is together with where every line starts
+       instead of a string for every line. A line is sliced out of the text
+       only when it's asked for and forgotten once it's not needed anymore,
+       so documents of millions of short lines don't take a string object
+       (and a place in a list) for every line. With newlines_only=True
+       lines end only at \n, like the lines of a file opened in text
+       mode.'''
+
+    __slots__ = ('text', 'offsets', 'last', 'indents', 'starts', 'ends',
+                 'firsts')
+
+    def __init__(self, text: str, newlines_only=False):
+        self.text = text
+        self.offsets = array('Q', [0])
+        columns = (array('I'), array('I'), array('I'), [])
+        # the text is split into lines a block at a time, so that only the
+        # lines of one block are strings at once while they're scanned
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + SOURCE_BLOCK_SIZE) + 1 or len(text)
+            block = text[start:end]
+            if newlines_only and OTHER_LINE_BOUNDARIES.search(block):
+                lines = NEWLINE_LINES.findall(block)
+            else:
+                lines = block.splitlines(True)
+            self.offsets.extend(islice(accumulate(map(len, lines),
+                                                  initial=start), 1, None))
+            if end == len(text):
+                add_last_line(lines)
+            scan(lines, columns)
+            start = end
+        # the line \n is added to, followed by an empty line
+        self.last = len(self.offsets) - 2
+        self.indents, self.starts, self.ends, firsts = columns
+        self.firsts = ''.join(firsts)
+
+    def __len__(self) -> int:
+        return self.last + 2
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += self.last + 2
+        if 0 <= i < self.last:
+            return self.text[self.offsets[i]:self.offsets[i + 1]]
+        if i == self.last:
+            return self.text[self.offsets[i]:] + '\n'
+        if i == self.last + 1:
+            return ''
+        raise IndexError('line index out of range')
+
+    def __iter__(self):
+        text, offsets = self.text, self.offsets
+        for i in range(self.last):
+            yield text[offsets[i]:offsets[i + 1]]
+        yield text[offsets[self.last]:] + '\n'
+        yield ''
+
+
+# Documents with fewer characters are held as ScannedLines, slicing every
+# line out of the text whenever it's looked at takes longer than the memory
+# saved by SourceLines is worth (see benchmarks/bench_source_lines.py)
+SOURCE_LINES_MIN_SIZE = 8 * 1024 * 1024
+
+
+def source_lines(paml_text: str, newlines_only=False):
+    '''Returns the lines of a whole document as SourceLines for documents of
+       at least SOURCE_LINES_MIN_SIZE characters, or as ScannedLines of the
+       same lines'''
+
+    if len(paml_text) >= SOURCE_LINES_MIN_SIZE:
+        return SourceLines(paml_text, newlines_only)
+    if newlines_only and OTHER_LINE_BOUNDARIES.search(paml_text):
+        paml_lines = NEWLINE_LINES.findall(paml_text)
+    else:
+        paml_lines = paml_text.splitlines(True)
+    add_last_line(paml_lines)
+    return ScannedLines(paml_lines)
+
+
+def scan(paml_lines, columns=None) -> tuple:
+    '''Returns the columns of ScannedLines (with firsts as a list) for every
+       line, added to the end of the given columns if there are any'''
+
+    if columns is None:
+        columns = (array('I'), array('I'), array('I'), [])
+    indents, starts, ends, firsts = columns
+    for paml_line in paml_lines:
+        length = len(paml_line)
+        stripped = paml_line.lstrip(' ')
+        indent = length - len(stripped)
+        indents.append(indent)
+        first = stripped[:1]
+        if first.isspace() or not first:
+            # other whitespace after the spaces (or nothing at all)
+            stripped = stripped.lstrip()
+            starts.append(length - len(stripped))
+            firsts.append(stripped[:1] or ' ')
+        else:
+            starts.append(indent)
+            firsts.append(first)
+        ends.append(len(paml_line.rstrip()))
+    return columns
+
+
+class LinesColumn:
+    '''A column of ScannedLines (like indents) for TrackedLines and
+       LazyLines, which need to know about every line that is looked at'''
+
+    __slots__ = ('paml_lines', 'values')
+
+    def __init__(self, paml_lines, values):
+        self.paml_lines = paml_lines
+        self.values = values
+
+    def __getitem__(self, i: int):
+        return self.values[self.paml_lines.index(i)]
+
+
+class TrackedLines:
+    '''Used instead of a list of lines by ConversionSession to remember the
+       furthest line an add_* function has looked at'''
+
+    def __init__(self, paml_lines: list):
+        self.paml_lines = scanned_lines(paml_lines)
+        self.furthest = -1
+        self.indents = LinesColumn(self, self.paml_lines.indents)
+        self.starts = LinesColumn(self, self.paml_lines.starts)
+        self.ends = LinesColumn(self, self.paml_lines.ends)
+        self.firsts = LinesColumn(self, self.paml_lines.firsts)
+
+    def __len__(self) -> int:
+        return len(self.paml_lines)
+
+    def __getitem__(self, i: int) -> str:
+        return self.paml_lines[self.index(i)]
+
+    def index(self, i: int) -> int:
+        if i > self.furthest:
+            self.furthest = i
+        return i
+
+
+class LazyLines:
+    '''Used instead of a list of lines by Converter.iter_convert. Lines are
+       read from the source when an add_* function asks for them, with \\n
+       added to the last line and an empty line after it like
+       convert_from_file does.
+
+       Until the source runs out, the length is one more than the amount of
+       lines read, so that `while i < len(paml_lines)` loops keep going and
+       read the next line. Sources that don't need to be read as late as
+       possible (like files) can be read lines_at_once lines at a time, which
+       is faster.'''
+
+    def __init__(self, lines, lines_at_once=1):
+        self.lines_at_once = lines_at_once
+        self.lines = []
+        self.first = 0  # index of self.lines[0] in the whole document
+        self.source = iter(lines)
+        self.next_line = next(self.source, None)
+        self.finished = self.next_line is None
+        self.columns = (array('I'), array('I'), array('I'), [])
+        self.indents, self.starts, self.ends, self.firsts = (
+            LinesColumn(self, values) for values in self.columns)
+
+    def __len__(self) -> int:
+        return self.first + len(self.lines) + (not self.finished)
+
+    def __getitem__(self, i: int) -> str:
+        return self.lines[self.index(i)]
+
+    def index(self, i: int) -> int:
+        '''Returns where line i is in self.lines, reading it if needed'''
+
+        j = i - self.first
+        if 0 <= j < len(self.lines):
+            return j
+        while i >= self.first + len(self.lines) and not self.finished:
+            self.read_line()
+        if i < self.first:
+            raise IndexError('line already converted and forgotten')
+        return i - self.first
+
+    def read_line(self):
+        new_lines = [self.next_line,
+                     *islice(self.source, self.lines_at_once - 1)]
+        self.next_line = next(self.source, None)
+        if self.next_line is None:
+            new_lines[-1] += '\n'
+            new_lines.append('')
+            self.finished = True
+        self.lines.extend(new_lines)
+        scan(new_lines, self.columns)
+
+    def forget_before(self, i: int):
+        for column in (self.lines, *self.columns):
+            del column[:i - self.first]
+        self.first = max(self.first, i)
+
+
+MAPPED_PAGES_KEPT = 16 * 1024 * 1024
+MAPPED_LINES_AT_ONCE = 1024
+
+
+def read_mapped_lines(filepath):
+    '''Yields the lines of a file the same way as a file opened in text mode
+       with encoding='utf-8' (\r\n and \r become \n), but the file is
+       memory-mapped instead of read into a buffer. Line boundaries are found
+       in the raw bytes and only the bytes of a single line are decoded at a
+       time; pages of the file that were already read are given back every
+       MAPPED_PAGES_KEPT bytes where the OS allows it.'''
+
+    with open(filepath, 'rb') as p:
+        if fstat(p.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return
+        with mmap.mmap(p.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            released = 0
+            start = 0
+            size = len(source)
+            while start < size:
+                end = source.find(b'\n', start) + 1 or size
+                paml_line = source[start:end].decode('utf-8')
+                if '\r' in paml_line:
+                    yield from translate_newlines(paml_line)
+                else:
+                    yield paml_line
+                start = end
+                if (hasattr(source, 'madvise')
+                   and start - released >= MAPPED_PAGES_KEPT):
+                    # only whole pages can be given back
+                    until = start - start % mmap.PAGESIZE
+                    source.madvise(mmap.MADV_DONTNEED, released,
+                                   until - released)
+                    released = until
+
+
+def translate_newlines(paml_text: str) -> list:
+    '''Splits text containing \r into lines ending in \n, like universal
+       newlines do (other line boundaries known to splitlines aren't
+       used)'''
+
+    paml_lines = paml_text.replace('\r\n', '\n').replace('\r', '\n').split(
+        '\n')
+    last = paml_lines.pop()
+    paml_lines = [paml_line + '\n' for paml_line in paml_lines]
+    if last:
+        paml_lines.append(last)
+    return paml_lines
 
 
 def main():
     '''Used when calling the converter directly, parses arguments from the
        command line and sends the input filepath to convert_from_file, then
-       writes HTML to the output file'''
+       writes HTML to the output file. With a directory as the source, every
+       .paml file in it is converted into the destination directory.'''
 
     parser = argparse.ArgumentParser()
     parser.add_argument("source_file",
-                        help="Provide a .paml file used for conversion")
+                        help="Provide a .paml file used for conversion or"
+                        + " a directory with .paml files")
     parser.add_argument("destination_file",
                         help="Provide an .html destination file. It will be"
-                        + " appended if it exists and created if it doesn't")
+                        + " replaced if it exists (unless the HTML didn't"
+                        + " change) and created if it doesn't. With a source"
+                        + " directory, provide a destination directory"
+                        + " instead")
+    parser.add_argument("--append", action="store_true",
+                        help="Append the HTML to the destination file instead"
+                        + " of replacing it")
     parser.add_argument("--indent",
                         help="Provide the amount of spaces used for"
                         + " indentation. Indentation is disabled by default",
                         type=int, default=None)
+    parser.add_argument("--jobs",
+                        help="Provide the amount of processes converting a"
+                        + " directory, or a single file of at least 4 MB."
+                        + " Defaults to the amount of CPUs",
+                        type=int, default=None)
+    parser.add_argument("--max-tasks-per-worker",
+                        help="Provide after how many files a process"
+                        + " converting a directory is replaced with a new one",
+                        type=int, default=100)
+    parser.add_argument("--cache-dir",
+                        help="Provide a directory where converted files are"
+                        + " kept, so that unchanged files aren't converted"
+                        + " again. Caching is disabled by default",
+                        default=None)
+    parser.add_argument("--cache-max-size",
+                        help="Provide the size in MB the cache is pruned to"
+                        + " after converting a directory",
+                        type=float, default=256)
+    parser.add_argument("--stats", action="store_true",
+                        help="Print how many times every handler was used,"
+                        + " how long it took and how much it read and wrote."
+                        + " Files taken from the cache aren't counted")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Memory-map the source file instead of reading"
+                        + " it, for very large files. Not used for"
+                        + " directories and with --cache-dir")
+    parser.add_argument("--inline-cache",
+                        help="Provide how many formatted texts are remembered"
+                        + " and used again when the same text comes up."
+                        + " Disabled by default",
+                        type=int, default=None)
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and convert again every file that"
+                        + " changes, replacing its destination file")
+    parser.add_argument("--watch-interval",
+                        help="Provide how often in seconds files are checked"
+                        + " for changes with --watch",
+                        type=float, default=0.5)
     args = parser.parse_args()
     source_file = Path(args.source_file)
     destination_file = Path(args.destination_file)
 
+    indnt = None
     if args.indent is not None:
         indnt = ' ' * args.indent
 
-    convert_from_file(source_file)
+    cache = None
+    if args.cache_dir is not None:
+        cache = import_sibling('cache').DiskCache(
+            args.cache_dir,
+            max_bytes=int(args.cache_max_size * 1024 * 1024))
+
+    stats = ConversionStats() if args.stats else None
+
+    inline_cache = None
+    if args.inline_cache is not None:
+        inline_cache = InlineCache(max_entries=args.inline_cache)
+
+    if args.watch:
+        try:
+            import_sibling('watch').watch(source_file, destination_file,
+                                          indentation=indnt, cache=cache,
+                                          interval=args.watch_interval,
+                                          inline_cache=inline_cache)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if source_file.is_dir():
+        batch = import_sibling('batch')
+        results = batch.convert_tree(source_file, destination_file,
+                                     indentation=indnt, workers=args.jobs,
+                                     max_tasks_per_worker=args
+                                     .max_tasks_per_worker,
+                                     cache=cache, stats=stats,
+                                     inline_cache=inline_cache)
+        failed = {source: error for source, error in results.items()
+                  if error is not None}
+        for source, error in sorted(failed.items()):
+            print(f'Failed to convert {source}: {error}', file=sys.stderr)
+        print(f'Converted {len(results) - len(failed)} of {len(results)}'
+              + ' files')
+        print_stats(stats, inline_cache)
+        sys.exit(1 if failed else 0)
+
+    workers = args.jobs
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cache is not None:
+        html = [cache.convert_file(source_file, indentation=indnt,
+                                   stats=stats, inline_cache=inline_cache)]
+    elif (not args.mmap and workers > 1
+          and source_file.stat().st_size >= PARALLEL_MIN_SIZE):
+        # with a single process the file is streamed below instead
+        with open(source_file, 'r', encoding='utf-8') as p:
+            paml_text = p.read()
+        html = import_sibling('parallel').iter_convert_parallel(
+            paml_text, workers=workers, stats=stats, indentation=indnt,
+            inline_cache=inline_cache, newlines_only=True)
+    else:
+        # HTML (indented or not) can be written as soon as it's made
+        html = iter_convert(source_file, stats=stats, mapped=args.mmap,
+                            indentation=indnt, inline_cache=inline_cache)
+    if args.append:
+        with open(destination_file, 'a+', encoding='utf-8') as f:
+            f.writelines(html)
+    else:
+        write_if_changed(destination_file, html)
+    print_stats(stats, inline_cache)
+
+
+# Source files with fewer characters are converted in a single process,
+# starting the processes and sending them the document takes longer than it
+# saves (see parallel.py and benchmarks/bench_parallel.py)
+PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+
+
+def print_stats(stats, inline_cache):
+    if stats is None:
+        return
+    print(stats.format())
+    if inline_cache is not None:
+        print(f'inline cache: {inline_cache.hits} hits,'
+              + f' {inline_cache.misses} misses')
+
+
+def import_sibling(name: str):
+    '''Imports another module of paml2html, both when paml2html is imported
+       as a package and when this file is started directly'''
+
+    if __package__:
+        return import_module(f'.{name}', __package__)
+    return import_module(name)
+
+
+def write_if_changed(destination, html_chunks) -> bool:
+    '''Replaces destination with the HTML chunks (written like a file opened
+       in text mode with encoding='utf-8') and returns True, or leaves it
+       alone and returns False if it already contains exactly that HTML, so
+       that its modification time doesn't change.
+
+       The chunks are only compared with destination until they differ from
+       it, an unchanged file isn't written at all. From the first difference
+       on they're written to a temporary file next to destination, which
+       then replaces it in one rename: destination is never seen half
+       written, and if the conversion fails it's left as it was.'''
+
+    destination = Path(destination)
+    try:
+        old = open(destination, 'rb')
+    except FileNotFoundError:
+        old = None
+    new = None
+    same = 0
+    try:
+        for chunk in html_chunks:
+            if os.linesep != '\n':
+                chunk = chunk.replace('\n', os.linesep)
+            data = chunk.encode('utf-8')
+            if new is None:
+                if old is not None and old.read(len(data)) == data:
+                    same += len(data)
+                    continue
+                new = open_replacement(destination, old, same)
+            new.write(data)
+        if new is None:
+            if old is not None and not old.read(1):
+                return False
+            new = open_replacement(destination, old, same)
+        new.close()
+        os.replace(new.name, destination)
+    except BaseException:
+        if new is not None:
+            new.close()
+            os.unlink(new.name)
+        raise
+    finally:
+        if old is not None:
+            old.close()
+    return True
+
+
+def open_replacement(destination: Path, old, size: int):
+    '''Opens a new temporary file next to destination with the same
+       permissions, starting with the first size bytes of old'''
+
+    path = destination.with_name(f'.{destination.name}.'
+                                 + f'{os.urandom(4).hex()}.tmp')
+    new = open(path, 'xb')
+    try:
+        if old is not None:
+            shutil.copymode(destination, path)
+            old.seek(0)
+            while size:
+                data = old.read(min(size, 1024 * 1024))
+                new.write(data)
+                size -= len(data)
+    except BaseException:
+        new.close()
+        os.unlink(path)
+        raise
+    return new
+
+
+def convert_from_file(filepath, cache=None, stats=None, mapped=False,
+                      indentation=None, inline_cache=None):
+    '''Used when the converter is imported, returns a string containing HTML.
+       With a cache (a paml2html.cache.DiskCache) unchanged files are taken
+       from it instead of being converted again. With stats (a
+       ConversionStats) every handler used is timed. With mapped=True the
+       file is memory-mapped (see read_mapped_lines) instead of being read
+       into a list of lines, which matters for very large files. With
+       indentation (like '  ') the HTML is indented. With inline_cache (an
+       InlineCache) formatted text is remembered.'''
+
+    if cache is not None:
+        return cache.convert_file(filepath, indentation=indentation,
+                                  stats=stats, inline_cache=inline_cache)
+    converter = Converter(stats=stats, indentation=indentation,
+                          inline_cache=inline_cache)
+    if mapped:
+        return converter.convert_mapped_file(filepath)
+    return converter.convert_file(filepath)
+
+
+def convert_from_text(paml_text, stats=None, indentation=None,
+                      inline_cache=None):
+    '''Used when the converter is imported, returns a string containing HTML'''
 
-    with open(destination_file, 'a+', encoding='utf-8') as f:
-        if args.indent is not None:
-            f.write(indent(doc.getvalue(), indentation=indnt))
-        elif args.indent is None:
-            f.write(doc.getvalue())
+    return Converter(stats=stats, indentation=indentation,
+                     inline_cache=inline_cache).convert_text(paml_text)
+
+
+def iter_convert(file_or_iterable, stats=None, mapped=False,
+                 indentation=None, inline_cache=None):
+    '''Used when the converter is imported, yields strings containing HTML
+       one element at a time. Accepts an open file, any other iterable of lines
+       or a filepath. A filepath is memory-mapped with mapped=True. With
+       indentation the joined HTML is the same as the one returned by
+       convert_from_file.'''
+
+    converter = Converter(stats=stats, indentation=indentation,
+                          inline_cache=inline_cache)
+    if isinstance(file_or_iterable, (str, PathLike)) and mapped:
+        yield from converter.iter_convert(read_mapped_lines(file_or_iterable),
+                                          MAPPED_LINES_AT_ONCE)
+    elif isinstance(file_or_iterable, (str, PathLike)):
+        with open(file_or_iterable, 'r', encoding='utf-8') as p:
+            yield from converter.iter_convert(p)
+    else:
+        yield from converter.iter_convert(file_or_iterable)
 
 
-def convert_from_file(filepath):
-    '''Used when the converter is imported, returns a string containing HTML'''
+def add_last_line(paml_lines: list):
+    '''Adds \\n to the last line and an empty line after it, the add_*
+       functions rely on both when looking for the end of the document'''
 
-    global doc, tag, text, line
-    doc, tag, text, line = Doc().ttl()
+    if paml_lines[-1] != '':
+        paml_lines[-1] += '\n'
+        paml_lines.append('')
 
-    with open(filepath, 'r', encoding='utf-8') as p:
-        paml_lines = p.readlines()
-        if not paml_lines:
-            return ''
-        elif paml_lines[-1] != '':
-            paml_lines[-1] += '\n'
-            paml_lines.append('')
 
-    i = 0
-    while i < len(paml_lines):
-        i = identify_element(paml_lines, i)
+def scanned_lines(paml_lines):
+    '''Returns ScannedLines of a plain list of lines, anything else (like
+       ScannedLines or SourceLines) is scanned already and returned as it
+       is. Used by identify_element, parse_element and the add_* functions,
+       which can be given a list of lines when called directly.'''
 
-    return doc.getvalue()
+    if type(paml_lines) is list:
+        return ScannedLines(paml_lines)
+    return paml_lines
 
 
-def convert_from_text(paml_text):
-    '''Used when the converter is imported, returns a string containing HTML'''
+def identify_element(paml_lines: list, i: int, conv: 'Converter') -> int:
+    '''Parses the element on the current line with parse_element and adds it
+       to the Converter's doc, apart from tables, which add_table writes
+       straight from their lines. Returns the line after the element.
 
-    global doc, tag, text, line
-    doc, tag, text, line = Doc().ttl()
+       The element is counted in the Converter's stats and formatted through
+       its InlineCache (see Converter.collecting_stats). The add_* functions
+       called directly only use those of the conversion they're part of.'''
 
-    paml_lines = paml_text.splitlines(True)
+    paml_lines = scanned_lines(paml_lines)
+    with conv.collecting_stats():
+        if paml_lines.firsts[i] == '|':
+            return add_table(paml_lines, i, conv)
+        return add_node(parse_element(paml_lines, i), conv)
 
-    if not paml_lines:
-        return ''
-    elif paml_lines[-1] != '':
-        paml_lines[-1] += '\n'
-        paml_lines.append('')
 
-    i = 0
-    while i < len(paml_lines):
-        i = identify_element(paml_lines, i)
+def element_parts(paml_lines: list, i: int, conv: 'Converter'):
+    '''Adds the element on the current line like identify_element and yields
+       the line after it, or for tables the line after every
+       TABLE_ROWS_AT_ONCE rows written so far'''
 
-    return doc.getvalue()
+    if paml_lines.firsts[i] == '|':
+        yield from write_table(paml_lines, i, conv)
+    else:
+        yield identify_element(paml_lines, i, conv)
 
 
-def identify_element(paml_lines: list, i: int) -> int:
-    '''Identifies the element on the current line or skips the line. I wanted
-       to switch the ifs into something 'smarter' like a dict of identifiers,
-       but because of different lengths of identifiers, the best solution I
-       could come up with was over 4 times slower. In terms of readability, the
-       ifs are probably fine.'''
+def add_node(parsed: tuple, conv: 'Converter') -> int:
+    '''Renders the node returned by one of the parse_* functions (if there is
+       one) and passes on the line after it'''
 
-    paml_line = paml_lines[i].strip()
+    node, i = parsed
+    if node is not None:
+        render_node(node, conv)
+    return i
 
-    if paml_line == '':
-        # only spaces and \n on the line
-        i += 1
-    elif paml_line.startswith('#'):
-        i = add_header(paml_lines, i)
-    elif paml_line.startswith('>'):
-        # '>' by itself does not necessarily mean a collapsible box, but all
-        # the other cases nested collapsibles are handled by add_collapsible
-        i = add_collapsible_box(paml_lines, i)
-    elif paml_line.startswith('/'):
-        i = add_command(paml_lines, i)
-    elif paml_line.startswith('```'):
-        # inline code is handled as part of format_txt
-        i = add_code(paml_lines, i)
-    elif paml_line.startswith('!['):
-        i = add_image(paml_lines, i)
-    elif paml_line.startswith('{'):
-        i = add_paragraph(paml_lines, i)
-    elif paml_line.startswith('-'):
-        i = add_unordered_list(paml_lines, i)
-    elif paml_line[0] in '0123456789':
-        i = add_ordered_list(paml_lines, i)
-    elif paml_line.startswith('|'):
-        i = add_table(paml_lines, i)
-    elif paml_line.startswith('<'):
-        i = add_raw_html(paml_lines, i)
-    else:
-        print('Unsupported line, skipping: ', paml_lines[i])
-        i += 1  # fail-safe in case something is not recognized
+
+def add_header(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_header(scanned_lines(paml_lines), i), conv)
+
+
+def add_collapsible_box(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_collapsible_box(scanned_lines(paml_lines), i),
+                    conv)
+
+
+def add_collapsible(paml_lines: list, i: int, conv: 'Converter',
+                    offset=0) -> int:
+    children, i = parse_collapsible(scanned_lines(paml_lines), i, offset)
+    render_children(children, conv)
     return i
 
 
-def add_header(paml_lines: list, i: int) -> int:
-    if paml_lines[i].rstrip().startswith('# '):
-        with tag('h1'):
-            doc.asis(format_txt(paml_lines[i][2:-1]))
-        i += 1
-    elif paml_lines[i].rstrip().startswith('## '):
-        with tag('h2'):
-            doc.asis(format_txt(paml_lines[i][3:-1]))
-        i += 1
-    elif paml_lines[i].rstrip().startswith('### '):
-        with tag('h3'):
-            doc.asis(format_txt(paml_lines[i][4:-1]))
-        i += 1
-    elif paml_lines[i].rstrip().startswith('#### '):
-        with tag('h4'):
-            doc.asis(format_txt(paml_lines[i][5:-1]))
-        i += 1
-    elif paml_lines[i].rstrip().startswith('##### '):
-        with tag('h5'):
-            doc.asis(format_txt(paml_lines[i][6:-1]))
-        i += 1
-    elif paml_lines[i].rstrip().startswith('###### '):
-        with tag('h6'):
-            doc.asis(format_txt(paml_lines[i][7:-1]))
-        i += 1
+def add_command(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_command(scanned_lines(paml_lines), i), conv)
+
+
+def add_code(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_code(scanned_lines(paml_lines), i), conv)
+
+
+def add_code_line(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_code_line(scanned_lines(paml_lines), i), conv)
+
+
+def add_code_block(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_code_block(scanned_lines(paml_lines), i), conv)
+
+
+def add_image(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_image(scanned_lines(paml_lines), i), conv)
+
+
+def add_paragraph(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_paragraph(scanned_lines(paml_lines), i), conv)
+
+
+def add_unordered_list(paml_lines: list, i: int, conv: 'Converter',
+                       offset=None) -> int:
+    return add_node(parse_unordered_list(scanned_lines(paml_lines), i, offset),
+                    conv)
+
+
+def add_ordered_list(paml_lines: list, i: int, conv: 'Converter',
+                     offset=None) -> int:
+    return add_node(parse_ordered_list(scanned_lines(paml_lines), i, offset),
+                    conv)
+
+
+def add_table(paml_lines: list, i: int, conv: 'Converter') -> int:
+    for i in write_table(scanned_lines(paml_lines), i, conv):
+        pass
     return i
 
 
-def add_collapsible_box(paml_lines: list, i: int) -> int:
+TABLE_ROWS_AT_ONCE = 1024
+
+
+def write_table(paml_lines: list, i: int, conv: 'Converter',
+                rows_at_once=TABLE_ROWS_AT_ONCE):
+    '''Writes the table on the current line without making Table nodes:
+       every row is turned into a single string right from its line, and the
+       rows are added to the doc rows_at_once at a time. The line after the
+       rows written so far is yielded every time, ending with the line after
+       the table, so that the rows can be passed on before the table is
+       done. Makes the same HTML as rendering parse_table's Table.
+
+       With stats the table is parsed and rendered like the other elements
+       instead, so that every cell is counted.'''
+
+    if STATS.get() is not None:
+        yield add_node(parse_table(paml_lines, i), conv)
+        return
+
+    firsts = paml_lines.firsts
+    rows = ['<table>']
+    if table_has_header(paml_lines[i + 1]):
+        rows.append(row_html(paml_lines[i], '<tr><th>', '</th><th>',
+                             '</th></tr>'))
+        i += 2
+
+    while True:
+        for _ in range(rows_at_once):
+            if i >= len(paml_lines) or firsts[i] != '|':
+                rows.append('</table>')
+                conv.doc.asis(''.join(rows))
+                yield i
+                return
+            rows.append(row_html(paml_lines[i], '<tr><td>', '</td><td>',
+                                 '</td></tr>'))
+            i += 1
+        # the doc is a new one after every flush
+        conv.doc.asis(''.join(rows))
+        rows = []
+        yield i
+
+
+def row_html(paml_line: str, opening: str, between: str, closing: str) -> str:
+    '''Returns the HTML of a table row. Rows without any markup characters
+       don't need the inline formatter, their cells are only stripped. With
+       an InlineCache every cell is formatted through it, like format_txt
+       does.'''
+
+    cells = paml_line.split('|')[1:-1]
+    if not cells:
+        return '<tr></tr>'
+    if INLINE_CACHE.get() is not None:
+        cells = [format_txt(cell.strip()) for cell in cells]
+    elif INLINE_MARKUP.search(paml_line) is None:
+        cells = [cell.strip() for cell in cells]
+    else:
+        cells = [inline_html(cell) for cell in cells]
+    return opening + between.join(cells) + closing
+
+
+def add_raw_html(paml_lines: list, i: int, conv: 'Converter') -> int:
+    return add_node(parse_raw_html(scanned_lines(paml_lines), i), conv)
+
+
+# Nodes of a parsed document
+
+
+class Node:
+    '''Base for every element of a parsed document. Nodes only hold what's
+       needed to render them and use __slots__, so that a parsed document
+       stays small and the memory used by every node is easy to measure
+       (sys.getsizeof, tracemalloc).'''
+
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return (type(self) is type(other)
+                and all(getattr(self, name) == getattr(other, name)
+                        for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        values = ', '.join(repr(getattr(self, name))
+                           for name in self.__slots__)
+        return f'{type(self).__name__}({values})'
+
+
+class Document(Node):
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = children
+
+
+class Header(Node):
+    __slots__ = ('level', 'content')
+
+    def __init__(self, level, content):
+        self.level = level
+        self.content = content
+
+
+class CollapsibleBox(Node):
+    __slots__ = ('klass', 'collapsibles')
+
+    def __init__(self, klass, collapsibles):
+        self.klass = klass
+        self.collapsibles = collapsibles
+
+
+class Collapsible(Node):
+    '''children are nested Collapsibles and Entries'''
+
+    __slots__ = ('icon', 'title', 'children')
+
+    def __init__(self, icon, title, children):
+        self.icon = icon
+        self.title = title
+        self.children = children
+
+
+class Entry(Node):
+    '''Anything else inside a collapsible, child is None for lines that
+       weren't recognized'''
+
+    __slots__ = ('child',)
+
+    def __init__(self, child):
+        self.child = child
+
+
+class Command(Node):
+    __slots__ = ('command', 'comment', 'small_comment')
+
+    def __init__(self, command, comment, small_comment):
+        self.command = command
+        self.comment = comment
+        self.small_comment = small_comment
+
+
+class CodeLine(Node):
+    __slots__ = ('comment', 'small_comment', 'code')
+
+    def __init__(self, comment, small_comment, code):
+        self.comment = comment
+        self.small_comment = small_comment
+        self.code = code
+
+
+class CodeBlock(Node):
+    '''lines are the lines of code as they are in the document (the last one
+       without the whitespace at its end), so that a big block isn't copied
+       into a single string. lines is None when the block never ends.'''
+
+    __slots__ = ('comment', 'small_comment', 'lines')
+
+    def __init__(self, comment, small_comment, lines):
+        self.comment = comment
+        self.small_comment = small_comment
+        self.lines = lines
+
+    @property
+    def code(self):
+        return None if self.lines is None else ''.join(self.lines)
+
+
+class Image(Node):
+    __slots__ = ('alt', 'src', 'klass')
+
+    def __init__(self, alt, src, klass):
+        self.alt = alt
+        self.src = src
+        self.klass = klass
+
+
+class Paragraph(Node):
+    __slots__ = ('image', 'content')
+
+    def __init__(self, image, content):
+        self.image = image
+        self.content = content
+
+
+class List(Node):
+    '''items are ListItems and nested Lists'''
+
+    __slots__ = ('ordered', 'items')
+
+    def __init__(self, ordered, items):
+        self.ordered = ordered
+        self.items = items
+
+
+class ListItem(Node):
+    __slots__ = ('content',)
+
+    def __init__(self, content):
+        self.content = content
+
+
+class Table(Node):
+    '''header is None for tables without headers, every row is a list of
+       cells and every cell is a list of inline nodes'''
+
+    __slots__ = ('header', 'rows')
+
+    def __init__(self, header, rows):
+        self.header = header
+        self.rows = rows
+
+
+class RawHtml(Node):
+    __slots__ = ('lines',)
+
+    def __init__(self, lines):
+        self.lines = lines
+
+
+class Text(Node):
+    '''Inline text, added to HTML as it is (like with doc.asis)'''
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Decoration(Node):
+    '''A single opening or closing tag of **, __ or ~~. These are separate
+       nodes instead of holding the text inside them, since decorations can
+       overlap (**a__b**c__).'''
+
+    __slots__ = ('tag', 'closing')
+
+    def __init__(self, tag, closing):
+        self.tag = tag
+        self.closing = closing
+
+
+class InlineCode(Node):
+    __slots__ = ('code',)
+
+    def __init__(self, code):
+        self.code = code
+
+
+class Link(Node):
+    __slots__ = ('href', 'content')
+
+    def __init__(self, href, content):
+        self.href = href
+        self.content = content
+
+
+# Parsing
+
+
+def parse_from_file(filepath) -> Document:
+    '''Used when the converter is imported, returns a parsed Document that can
+       be rendered any amount of times with render_document'''
+
+    with open(filepath, 'r', encoding='utf-8') as p:
+        paml_text = p.read()
+    if not paml_text:
+        return Document([])
+    return parse_scanned(source_lines(paml_text, newlines_only=True))
+
+
+def parse_from_text(paml_text: str) -> Document:
+    '''Used when the converter is imported, returns a parsed Document that can
+       be rendered any amount of times with render_document'''
+
+    if not paml_text:
+        return Document([])
+    return parse_scanned(source_lines(paml_text))
+
+
+def parse_lines(paml_lines: list) -> Document:
+    if not paml_lines:
+        return Document([])
+    add_last_line(paml_lines)
+    return parse_scanned(ScannedLines(paml_lines))
+
+
+def parse_scanned(paml_lines: ScannedLines) -> Document:
+    document = Document([])
+    i = 0
+    while i < len(paml_lines):
+        node, i = parse_element(paml_lines, i)
+        if node is not None:
+            document.children.append(node)
+    return document
+
+
+def parse_element(paml_lines: list, i: int) -> tuple:
+    '''Identifies the element on the current line or skips the line. The
+       parser is found in ELEMENT_PARSERS by the first character of the line,
+       which only leaves a single startswith for identifiers longer than one
+       character (``` and ![). This beats the chain of ifs it replaced, which
+       tried every identifier one by one (see benchmarks/bench_dispatch.py).
+
+       Like all of the parse_* functions, returns the parsed node (None for
+       skipped lines) and the line after it. The other parse_* functions
+       need lines scanned already (like ScannedLines), parse_element scans
+       a plain list of lines itself.'''
+
+    paml_lines = scanned_lines(paml_lines)
+    first = paml_lines.firsts[i]
+
+    if first == ' ':
+        # only spaces and \n on the line
+        return None, i + 1
+    try:
+        identifier, parse = ELEMENT_PARSERS[first]
+    except KeyError:
+        pass
+    else:
+        if (identifier is None
+           or paml_lines[i].startswith(identifier, paml_lines.starts[i])):
+            stats = STATS.get()
+            if stats is None:
+                return parse(paml_lines, i)
+            start = perf_counter()
+            node, end = parse(paml_lines, i)
+            if node is not None:
+                stats.parsed(handler_name(node), start,
+                             lines_size(paml_lines, i, end))
+            return node, end
+    print('Unsupported line, skipping: ', paml_lines[i])
+    return None, i + 1  # fail-safe in case something is not recognized
+
+
+def lines_size(paml_lines: list, start: int, end: int) -> int:
+    '''Returns the amount of characters an element took, elements at the end
+       of the document can return a line after the last one'''
+
+    return sum(len(paml_lines[i])
+               for i in range(start, min(end, len(paml_lines))))
+
+
+def parse_header(paml_lines: list, i: int) -> tuple:
+    paml_line = paml_lines[i]
+    level = len(paml_line) - len(paml_line.lstrip('#'))
+    # the space after the #s can't be trailing whitespace
+    if (1 <= level <= 6 and level < paml_lines.ends[i]
+       and paml_line[level] == ' '):
+        return Header(level, parse_inline(paml_line[level + 1:-1])), i + 1
+    return None, i
+
+
+def parse_collapsible_box(paml_lines: list, i: int) -> tuple:
     '''Makes a div that is a box holding together all collapsibles of a single
        type placed one after another.'''
 
@@ -164,25 +1777,40 @@ def add_collapsible_box(paml_lines: list, i: int) -> int:
         position = "f"
         tag_class = "collapsible-box-full"
 
-    with tag('div', klass=tag_class):
-        while i < len(paml_lines):
-            if (not paml_lines[i].lstrip()
-               or paml_lines[i].lstrip()[0] != '>'
-               or paml_lines[i][0].lstrip() == '>'
-               and paml_lines[i].lstrip()[1] != position):
-                break
-            with tag('details'):
-                with tag('summary', klass='header'):
-                    if paml_lines[i].lstrip()[2] != " ":
-                        with tag('span', klass='icon'):
-                            text(paml_lines[i].lstrip()[2])
-                    text(paml_lines[i].lstrip()[3:].rstrip())
-                    i += 1
-                i = add_collapsible(paml_lines, i)
-    return i
+    firsts, starts = paml_lines.firsts, paml_lines.starts
+    box = CollapsibleBox(tag_class, [])
+    while i < len(paml_lines):
+        if (firsts[i] != '>'
+           or starts[i] == 0 and paml_lines[i][1] != position):
+            break
+        collapsible, i = parse_collapsible_node(paml_lines, i)
+        box.collapsibles.append(collapsible)
+    return box, i
+
+
+def parse_collapsible_node(paml_lines: list, i: int, offset=0) -> tuple:
+    '''Parses a collapsible with its summary on the current line'''
 
+    stats = STATS.get()
+    if stats is not None:
+        start = perf_counter()
+    collapsible = parse_summary(paml_lines[i], paml_lines.starts[i])
+    collapsible.children, end = parse_collapsible(paml_lines, i + 1, offset)
+    if stats is not None:
+        stats.parsed('add_collapsible', start, lines_size(paml_lines, i, end))
+    return collapsible, end
 
-def add_collapsible(paml_lines: list, i: int, offset=0) -> int:
+
+def parse_summary(paml_line: str, start: int) -> Collapsible:
+    '''Makes a collapsible out of a line starting with > after start'''
+
+    icon = None
+    if paml_line[start + 2] != " ":
+        icon = paml_line[start + 2]
+    return Collapsible(icon, paml_line[start + 3:].rstrip(), [])
+
+
+def parse_collapsible(paml_lines: list, i: int, offset=0) -> tuple:
     '''Starts a loop to add all elements to a collapsible. The amount of
        spaces at the beginning of every line is counted to establish the
        current 'offset' - line's indentation level. With 0 anywhere, the
@@ -192,131 +1820,126 @@ def add_collapsible(paml_lines: list, i: int, offset=0) -> int:
        collapsible.
 
        Afterwards, there is a check for a special case of a nested collapsible
-       (skipping identify_element since that would identify the > as
+       (skipping parse_element since that would identify the > as
        a collapsible box that's useless since the collapsible already is in
-       a box made for the outmost collapsibles). identify_element is instead
-       called for every item that is not a collapsible.'''
-
-    while i < len(paml_lines):
-        spaces = 0
-        for char in paml_lines[i]:
-            if char == ' ':
-                spaces += 1
-            else:
+       a box made for the outmost collapsibles). parse_element is instead
+       called for every item that is not a collapsible.
+
+       Nested collapsibles don't recurse: the ones that aren't finished yet
+       are kept on a stack together with the children and offset of their
+       parent, so the amount of levels isn't limited by the recursion limit
+       and every level costs a tuple instead of two function calls.
+
+       Returns the list of children of the collapsible and the line after
+       it.'''
+
+    indents, starts, firsts = (paml_lines.indents, paml_lines.starts,
+                               paml_lines.firsts)
+    stats = STATS.get()
+    children = []
+    # (collapsible, its first line, when it was started, children of the
+    # parent, offset of the parent)
+    unfinished = []
+    while True:
+        while i < len(paml_lines):
+            spaces = indents[i]
+            if spaces == 0:
+                break
+            elif spaces > offset:
+                offset = spaces
+            elif spaces < offset:
                 break
 
-        if spaces == 0:
-            break
-        elif spaces > offset:
-            offset = spaces
-        elif spaces < offset:
-            return i
-
-        if paml_lines[i].lstrip()[0] == ">":
-            with tag('details'):
-                with tag('summary', klass='header'):
-                    if paml_lines[i].lstrip()[2] != " ":
-                        with tag('span', klass='icon'):
-                            text(paml_lines[i].lstrip()[2])
-                    text(paml_lines[i].lstrip()[3:].rstrip())
-                    i += 1
-                i = add_collapsible(paml_lines, i, offset)
-        else:
-            with tag('div', klass='entry'):
-                i = identify_element(paml_lines, i)
-    return i
-
-
-def add_command(paml_lines: list, i: int) -> int:
-    with tag('div', klass='command-box'):
-        with tag('span', klass='command'):
-            doc.asis(format_txt(paml_lines[i].lstrip()
-                     [1:paml_lines[i].lstrip().find('/*')]).rstrip())
-
-        if ('/*' in paml_lines[i]
-           and paml_lines[i][paml_lines[i].find('/*') + 2] != '*'):
-            # making sure '/**' isn't recognized as '/*' when '/*' is not there
-            with tag('span', klass='same-line-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                                    [paml_lines[i].find('/*') + 2:
-                                    paml_lines[i].find('*/')]))
-        if '/**' in paml_lines[i]:
-            with tag('div', klass='small-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                                    [paml_lines[i].find('/**') + 3:
-                                    paml_lines[i].find('**/')]))
-
-    i += 1
-    return i
-
-
-def add_code(paml_lines: list, i: int) -> int:
-    if paml_lines[i + 2].rstrip().endswith('```'):
+            first = firsts[i]
+            if first == ">":
+                start = perf_counter() if stats is not None else None
+                unfinished.append((parse_summary(paml_lines[i], starts[i]),
+                                   i, start, children, offset))
+                children = []
+                i += 1
+            elif first == ' ':
+                # lines of only whitespace have never been allowed inside
+                # collapsibles
+                raise IndexError(f'Line {i + 1} inside a collapsible has'
+                                 + ' only whitespace')
+            else:
+                child, i = parse_element(paml_lines, i)
+                children.append(Entry(child))
+
+        if not unfinished:
+            return children, i
+        collapsible, first, start, parent_children, offset = unfinished.pop()
+        collapsible.children = children
+        if stats is not None:
+            stats.parsed('add_collapsible', start,
+                         lines_size(paml_lines, first, i))
+        parent_children.append(collapsible)
+        children = parent_children
+
+
+def parse_comments(paml_line: str, strip=False) -> tuple:
+    '''Returns the same line comment (/* */) and the small comment (/** **/)
+       of a line, None for the ones that aren't there'''
+
+    comment = None
+    small_comment = None
+    if ('/*' in paml_line
+       and paml_line[paml_line.find('/*') + 2] != '*'):
+        # making sure '/**' isn't recognized as '/*' when '/*' is not there
+        comment = paml_line[paml_line.find('/*') + 2:paml_line.find('*/')]
+        comment = parse_inline(comment.strip() if strip else comment)
+    if '/**' in paml_line:
+        small_comment = paml_line[paml_line.find('/**') + 3:
+                                  paml_line.find('**/')]
+        small_comment = parse_inline(small_comment.strip() if strip
+                                     else small_comment)
+    return comment, small_comment
+
+
+def parse_command(paml_lines: list, i: int) -> tuple:
+    paml_line = paml_lines[i]
+    start = paml_lines.starts[i]
+    # without a comment, the \n at the end (-1) is left out
+    command = parse_inline(paml_line[start + 1:paml_line.find('/*', start)])
+    comment, small_comment = parse_comments(paml_line)
+    return Command(command, comment, small_comment), i + 1
+
+
+def parse_code(paml_lines: list, i: int) -> tuple:
+    if paml_lines[i + 2].endswith('```', 0, paml_lines.ends[i + 2]):
         # code line
-        i = add_code_line(paml_lines, i)
+        return parse_code_line(paml_lines, i)
     else:
         # code block
-        i = add_code_block(paml_lines, i)
-
-    return i
+        return parse_code_block(paml_lines, i)
 
 
-def add_code_line(paml_lines: list, i: int) -> int:
-    with tag('div', klass='line-code-box'):
-        if ('/*' in paml_lines[i]
-           and paml_lines[i][paml_lines[i].find('/*') + 2] != '*'):
-            # making sure '/**' isn't recognized as '/*' when '/*' is not there
-            with tag('div', klass='line-code-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                         [paml_lines[i].find('/*') + 2:
-                         paml_lines[i].find('*/')].strip()))
-
-        if '/**' in paml_lines[i]:
-            with tag('div', klass='line-code-small-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                         [paml_lines[i].find('/**') + 3:
-                         paml_lines[i].find('**/')].strip()))
-        i += 1
-        with tag('code', klass='line-code'):
-            # Removing trailing whitespaces and the new line at the end of line
-            text(paml_lines[i].strip())
-        i += 2
-    return i
+def parse_code_line(paml_lines: list, i: int) -> tuple:
+    comment, small_comment = parse_comments(paml_lines[i], strip=True)
+    # Removing trailing whitespaces and the new line at the end of line
+    code = paml_lines[i + 1].strip()
+    return CodeLine(comment, small_comment, code), i + 3
 
 
-def add_code_block(paml_lines: list, i: int) -> int:
-    with tag('div', klass='block-code-box'):
-        if ('/*' in paml_lines[i]
-           and paml_lines[i][paml_lines[i].find('/*') + 2] != '*'):
-            # making sure '/**' isn't recognized as '/*' when '/*' is not there
-            with tag('div', klass='block-code-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                         [paml_lines[i].find('/*') + 2:
-                         paml_lines[i].find('*/')].strip()))
-
-        if '/**' in paml_lines[i]:
-            with tag('div', klass='block-code-small-comment'):
-                doc.asis(format_txt(paml_lines[i]
-                         [paml_lines[i].find('/**') + 3:
-                         paml_lines[i].find('**/')].strip()))
-        i += 1
-        code_to_add = []
-        while i < len(paml_lines):
-            if paml_lines[i].strip() == '```':
-                # Removing a useless new line at the end of the last line
-                code_to_add[-1] = code_to_add[-1].rstrip()
-                with tag('code', klass='block-code'):
-                    with tag('pre'):
-                        text(''.join(code_to_add))
-                i += 1
-                break
-            else:
-                code_to_add.append(paml_lines[i])
+def parse_code_block(paml_lines: list, i: int) -> tuple:
+    firsts = paml_lines.firsts
+    code_block = CodeBlock(*parse_comments(paml_lines[i], strip=True), None)
+    i += 1
+    code_to_add = []
+    while i < len(paml_lines):
+        if firsts[i] == '`' and paml_lines[i].strip() == '```':
+            # Removing a useless new line at the end of the last line
+            code_to_add[-1] = code_to_add[-1].rstrip()
+            code_block.lines = code_to_add
             i += 1
-    return i
+            break
+        else:
+            code_to_add.append(paml_lines[i])
+        i += 1
+    return code_block, i
 
 
-def add_image(paml_lines: list, i: int) -> int:
+def parse_image(paml_lines: list, i: int) -> tuple:
     if paml_lines[i][0] == '{':
         line = paml_lines[i][1:]
     else:
@@ -329,235 +1952,720 @@ def add_image(paml_lines: list, i: int) -> int:
     else:
         kls = None
 
-    if kls is not None:
-        doc.stag('img', alt=line[line.find('[') + 1:line.find(']')],
-                 src=line[line.find('(') + 1:line.find(')')], klass=kls)
-    else:
-        doc.stag('img', alt=line[line.find('[') + 1:line.find(']')],
-                 src=line[line.find('(') + 1:line.find(')')])
-    i += 1
-    return i
+    return (Image(line[line.find('[') + 1:line.find(']')],
+                  line[line.find('(') + 1:line.find(')')], kls),
+            i + 1)
 
 
-def add_paragraph(paml_lines: list, i: int) -> int:
-    with tag('div', klass='paragraph'):
-        if (len(paml_lines[i].lstrip()) > 1
-           and paml_lines[i].lstrip()[1] == '!'):
-            i = add_image(paml_lines, i)
+def parse_paragraph(paml_lines: list, i: int) -> tuple:
+    firsts = paml_lines.firsts
+    image = None
+    if paml_lines[i].startswith('!', paml_lines.starts[i] + 1):
+        image, i = parse_image(paml_lines, i)
+    else:
+        i += 1
+
+    text_to_add = []
+    while i < len(paml_lines):
+        if firsts[i] == '}' and paml_lines[i].strip() == "}":
+            break
         else:
-            i += 1
-        with tag('p'):
-            text_to_add = ""
-            while i < len(paml_lines):
-                if paml_lines[i].strip() == "}":
-                    break
-                else:
-                    text_to_add += paml_lines[i]
-                i += 1
-            text_to_add = '<br>'.join([line.lstrip()
-                                       for line in text_to_add.splitlines()])
-            doc.asis(format_txt(text_to_add))
-    i += 1
-    return i
+            text_to_add.append(paml_lines[i])
+        i += 1
+    text_to_add = '<br>'.join([line.lstrip()
+                               for line in ''.join(text_to_add).splitlines()])
+    return Paragraph(image, parse_inline(text_to_add)), i + 1
 
 
-def add_unordered_list(paml_lines: list, i: int, offset=None) -> int:
+def parse_unordered_list(paml_lines: list, i: int, offset=None) -> tuple:
     '''Makes use of an offset to determine nested lists and lists inside
        collapsibles.'''
 
+    return parse_list(paml_lines, i, False, offset)
+
+
+def parse_ordered_list(paml_lines: list, i: int, offset=None) -> tuple:
+    '''Makes use of an offset to determine nested lists and lists inside
+       collapsibles.'''
+
+    return parse_list(paml_lines, i, True, offset)
+
+
+def parse_list(paml_lines: list, i: int, ordered: bool, offset=None) -> tuple:
+    '''Parses a list together with every list nested in it. An item of the
+       other kind at the offset of the list or any item indented deeper
+       starts a nested list, an item indented less ends it.
+
+       Nested lists don't recurse: the ones that aren't finished yet are kept
+       on a stack with their offset, so there can be any amount of levels.'''
+
+    indents, firsts = paml_lines.indents, paml_lines.firsts
     if offset is None:
         # check where the list is positioned if it's not explicitly stated
         # this helps with e.x. lists inside collapsibles
-        offset = 0
-        for char in paml_lines[i]:
-            if char == ' ':
-                offset += 1
-            else:
-                break
+        offset = indents[i]
 
-    with tag('ul'):
+    paml_list = List(ordered, [])
+    # (list, offset) of the lists the current one is nested in
+    unfinished = []
+    while True:
         while i < len(paml_lines):
-            if paml_lines[i].strip() == '':
+            first = firsts[i]
+            if first == ' ':
                 break
-            elif (paml_lines[i].lstrip()[0] != '-'
-                  and not paml_lines[i].lstrip()[0].isnumeric()):
+            elif first != '-' and not is_number(first, ordered):
                 break
 
-            spaces = 0
-            for char in paml_lines[i]:
-                if char == ' ':
-                    spaces += 1
-                else:
-                    break
+            spaces = indents[i]
             if offset > 0 and spaces < offset:
                 # going back
-                offset = spaces
                 break
-            elif paml_lines[i][offset] == '-':
-                # line('li', format_txt(paml_lines[i][offset + 2:-1]))
-                with tag('li'):
-                    doc.asis(format_txt(paml_lines[i][offset + 2:-1]))
+
+            marker = paml_lines[i][offset]
+            if is_number(marker, ordered) if ordered else marker == '-':
+                paml_list.items.append(
+                    ListItem(parse_inline(paml_lines[i][offset + 2:-1])))
                 i += 1
-            elif paml_lines[i][offset].isnumeric():
-                i = add_ordered_list(paml_lines, i)
+                continue
+            elif marker == '-' or is_number(marker, ordered):
+                nested_ordered = not ordered
             elif paml_lines[i][spaces] == '-':
-                i = add_unordered_list(paml_lines, i, spaces)
-            elif paml_lines[i][spaces].isnumeric():
-                i = add_ordered_list(paml_lines, i, spaces)
-    return i
+                nested_ordered = False
+            elif is_number(paml_lines[i][spaces], ordered):
+                nested_ordered = True
+            else:
+                continue
+            unfinished.append((paml_list, offset))
+            paml_list = List(nested_ordered, [])
+            ordered = nested_ordered
+            offset = spaces
 
+        if not unfinished:
+            return paml_list, i
+        nested_list = paml_list
+        paml_list, offset = unfinished.pop()
+        ordered = paml_list.ordered
+        paml_list.items.append(nested_list)
 
-def add_ordered_list(paml_lines: list, i: int, offset=None) -> int:
-    '''Makes use of an offset to determine nested lists and lists inside
-       collapsibles.'''
 
-    numbers = '0123456789'
+def is_number(char: str, ordered: bool) -> bool:
+    # ordered lists only take digits, unordered ones any numeric character
+    return char in '0123456789' if ordered else char.isnumeric()
 
-    if offset is None:
-        # check where the list is positioned if it's not explicitly stated
-        # this helps with e.x. lists inside collapsibles
-        offset = 0
-        for char in paml_lines[i]:
-            if char == ' ':
-                offset += 1
-            else:
-                break
 
-    with tag('ol'):
-        while i < len(paml_lines):
-            if paml_lines[i].strip() == '':
-                break
-            elif (paml_lines[i].lstrip()[0] not in numbers
-                  and paml_lines[i].lstrip()[0] != '-'):
-                break
-
-            spaces = 0
-            for char in paml_lines[i]:
-                if char == ' ':
-                    spaces += 1
-                else:
-                    break
+def parse_table(paml_lines: list, i: int) -> tuple:
+    table = Table(None, [])
+    if table_has_header(paml_lines[i + 1]):
+        # [1:-1] - before first and after last not needed
+        table.header = [parse_inline(x.strip())
+                        for x in paml_lines[i].split('|')[1:-1]]
+        i += 2
 
-            if offset > 0 and spaces < offset:
-                offset = spaces
-                break
-            elif paml_lines[i][offset] in numbers:
-                with tag('li'):
-                    doc.asis(format_txt(paml_lines[i][offset + 2:-1]))
-                i += 1
-            elif paml_lines[i][offset] == '-':
-                i = add_unordered_list(paml_lines, i)
-            elif paml_lines[i][spaces] in numbers:
-                i = add_ordered_list(paml_lines, i, spaces)
-            elif paml_lines[i][spaces] == '-':
-                i = add_unordered_list(paml_lines, i, spaces)
-    return i
+    firsts = paml_lines.firsts
+    while i < len(paml_lines):
+        if firsts[i] != '|':
+            break
+        else:
+            table.rows.append([parse_inline(x.strip())
+                               for x in paml_lines[i].split('|')[1:-1]])
+            i += 1
+    return table, i
 
 
-def add_table(paml_lines: list, i: int) -> int:
-    table_with_headers = True
+def table_has_header(paml_line: str) -> bool:
+    '''Tells if the line after the first one of a table is the divider under
+       a header, only its first cell is checked'''
 
-    for cell in paml_lines[i + 1].split()[1:-1:2]:
+    for cell in paml_line.split()[1:-1:2]:
         # [1:-1:2] - before first and after last not needed
         # every other to skip the dividers
-        for char in cell:
-            if char not in [' ', '-']:
-                table_with_headers = False
-                break
-        break
+        return all(char in ' -' for char in cell)
+    return True
 
-    with tag('table'):
-        if table_with_headers:
-            with tag('tr'):
-                for x in paml_lines[i].split('|')[1:-1]:
-                    # [1:-1] - before first and after last not needed
-                    with tag('th'):
-                        doc.asis(format_txt(x.strip()))
-                i += 2
 
-        while i < len(paml_lines):
-            if not paml_lines[i].lstrip().startswith('|'):
-                break
-            else:
-                with tag('tr'):
-                    for x in paml_lines[i].split('|')[1:-1]:
-                        # [1:-1] - before first and after last not needed
-                        with tag('td'):
-                            doc.asis(format_txt(x.strip()))
-                    i += 1
-    return i
-
-
-def add_raw_html(paml_lines: list, i: int) -> int:
+def parse_raw_html(paml_lines: list, i: int) -> tuple:
+    starts, ends = paml_lines.starts, paml_lines.ends
     i += 1
 
+    raw_html = RawHtml([])
     while i < len(paml_lines):
-        if paml_lines[i].strip() == '>':
-            i += 1
+        paml_line = paml_lines[i][starts[i]:ends[i]]
+        i += 1
+        if paml_line == '>':
             break
+        raw_html.lines.append(paml_line)
+    return raw_html, i
+
+
+# The first character of a line and the parser of the element it starts,
+# together with the whole identifier when it's longer than that character
+ELEMENT_PARSERS = {
+    '#': (None, parse_header),
+    # '>' by itself does not necessarily mean a collapsible box, but all the
+    # other cases nested collapsibles are handled by parse_collapsible
+    '>': (None, parse_collapsible_box),
+    '/': (None, parse_command),
+    # inline code is handled as part of parse_inline
+    '`': ('```', parse_code),
+    '!': ('![', parse_image),
+    '{': (None, parse_paragraph),
+    '-': (None, parse_unordered_list),
+    **{digit: (None, parse_ordered_list) for digit in '0123456789'},
+    '|': (None, parse_table),
+    '<': (None, parse_raw_html),
+}
+
+
+# Rendering
+
+
+def render_document(document: Document, conv=None) -> str:
+    '''Used when the converter is imported, returns a string containing HTML
+       made from a Document returned by parse_from_file or parse_from_text'''
+
+    if conv is None:
+        conv = Converter()
+    with conv.collecting_stats():
+        for node in document.children:
+            render_node(node, conv)
+    return conv.getvalue()
+
+
+def render_node(node: Node, conv: 'Converter'):
+    stats = STATS.get()
+    if stats is None:
+        RENDERERS[type(node)](node, conv)
+        return
+    start = perf_counter()
+    result = conv.doc.result
+    written = len(result)
+    RENDERERS[type(node)](node, conv)
+    stats.rendered(handler_name(node), start,
+                   sum(len(html) for html in result[written:]))
+
+
+def handler_name(node: Node) -> str:
+    '''Returns the name of the add_* function a node is made by, used for
+       ConversionStats'''
+
+    if type(node) is List:
+        return 'add_ordered_list' if node.ordered else 'add_unordered_list'
+    return HANDLER_NAMES[type(node)]
+
+
+def render_header(header: Header, conv: 'Converter'):
+    with conv.tag(f'h{header.level}'):
+        conv.doc.asis(render_inline(header.content))
+
+
+def render_collapsible_box(box: CollapsibleBox, conv: 'Converter'):
+    with conv.tag('div', klass=box.klass):
+        for collapsible in box.collapsibles:
+            render_node(collapsible, conv)
+
+
+def render_collapsible(collapsible: Collapsible, conv: 'Converter'):
+    with conv.tag('details'):
+        render_summary(collapsible, conv)
+        render_children(collapsible.children, conv)
+
+
+def render_summary(collapsible: Collapsible, conv: 'Converter'):
+    with conv.tag('summary', klass='header'):
+        if collapsible.icon is not None:
+            with conv.tag('span', klass='icon'):
+                conv.text(collapsible.icon)
+        conv.text(collapsible.title)
+
+
+def render_children(children: list, conv: 'Converter'):
+    '''Renders the children of a collapsible. Like in parse_collapsible,
+       nested collapsibles are kept on a stack instead of recursing, with
+       their details tags entered and exited by hand.'''
+
+    stats = STATS.get()
+    result = conv.doc.result
+    children = iter(children)
+    # (children of the parent left to render, details tag of the nested
+    # collapsible, when it was started, length of the result before it)
+    unfinished = []
+    while True:
+        for child in children:
+            if type(child) is Collapsible:
+                start = perf_counter() if stats is not None else None
+                details = conv.tag('details')
+                unfinished.append((children, details, start, len(result)))
+                details.__enter__()
+                render_summary(child, conv)
+                children = iter(child.children)
+                break
+            with conv.tag('div', klass='entry'):
+                if child.child is not None:
+                    render_node(child.child, conv)
         else:
-            doc.asis(paml_lines[i].strip())
-            i += 1
-    return i
+            if not unfinished:
+                return
+            children, details, start, written = unfinished.pop()
+            details.__exit__(None, None, None)
+            if stats is not None:
+                stats.rendered('add_collapsible', start,
+                               sum(len(html) for html in result[written:]))
+
+
+def render_command(command: Command, conv: 'Converter'):
+    with conv.tag('div', klass='command-box'):
+        with conv.tag('span', klass='command'):
+            conv.doc.asis(render_inline(command.command).rstrip())
+        if command.comment is not None:
+            with conv.tag('span', klass='same-line-comment'):
+                conv.doc.asis(render_inline(command.comment))
+        if command.small_comment is not None:
+            with conv.tag('div', klass='small-comment'):
+                conv.doc.asis(render_inline(command.small_comment))
+
+
+def render_code_line(code_line: CodeLine, conv: 'Converter'):
+    with conv.tag('div', klass='line-code-box'):
+        if code_line.comment is not None:
+            with conv.tag('div', klass='line-code-comment'):
+                conv.doc.asis(render_inline(code_line.comment))
+        if code_line.small_comment is not None:
+            with conv.tag('div', klass='line-code-small-comment'):
+                conv.doc.asis(render_inline(code_line.small_comment))
+        with conv.tag('code', klass='line-code'):
+            conv.text(code_line.code)
+
+
+CODE_LINES_AT_ONCE = 1024
+
+
+def render_code_block(code_block: CodeBlock, conv: 'Converter'):
+    with conv.tag('div', klass='block-code-box'):
+        if code_block.comment is not None:
+            with conv.tag('div', klass='block-code-comment'):
+                conv.doc.asis(render_inline(code_block.comment))
+        if code_block.small_comment is not None:
+            with conv.tag('div', klass='block-code-small-comment'):
+                conv.doc.asis(render_inline(code_block.small_comment))
+        if code_block.lines is not None:
+            with conv.tag('code', klass='block-code'):
+                with conv.tag('pre'):
+                    # escaped CODE_LINES_AT_ONCE lines at a time, so that the
+                    # whole block is never copied into a string of its own
+                    lines = code_block.lines
+                    for start in range(0, len(lines), CODE_LINES_AT_ONCE):
+                        conv.text(''.join(
+                            lines[start:start + CODE_LINES_AT_ONCE]))
+
+
+def render_image(image: Image, conv: 'Converter'):
+    if image.klass is not None:
+        conv.doc.stag('img', alt=image.alt, src=image.src, klass=image.klass)
+    else:
+        conv.doc.stag('img', alt=image.alt, src=image.src)
+
+
+def render_paragraph(paragraph: Paragraph, conv: 'Converter'):
+    with conv.tag('div', klass='paragraph'):
+        if paragraph.image is not None:
+            render_image(paragraph.image, conv)
+        with conv.tag('p'):
+            conv.doc.asis(render_inline(paragraph.content))
+
+
+def render_list(paml_list: List, conv: 'Converter'):
+    '''Renders a list with every list nested in it, keeping the nested ones
+       on a stack like render_children'''
+
+    items = iter(paml_list.items)
+    tag = conv.tag('ol' if paml_list.ordered else 'ul')
+    tag.__enter__()
+    # (items of the parent left to render, tag of the parent)
+    unfinished = []
+    while True:
+        for item in items:
+            if type(item) is ListItem:
+                with conv.tag('li'):
+                    conv.doc.asis(render_inline(item.content))
+            else:
+                unfinished.append((items, tag))
+                items = iter(item.items)
+                tag = conv.tag('ol' if item.ordered else 'ul')
+                tag.__enter__()
+                break
+        else:
+            tag.__exit__(None, None, None)
+            if not unfinished:
+                return
+            items, tag = unfinished.pop()
+
+
+def render_table(table: Table, conv: 'Converter'):
+    with conv.tag('table'):
+        if table.header is not None:
+            with conv.tag('tr'):
+                for cell in table.header:
+                    with conv.tag('th'):
+                        conv.doc.asis(render_inline(cell))
+        for row in table.rows:
+            with conv.tag('tr'):
+                for cell in row:
+                    with conv.tag('td'):
+                        conv.doc.asis(render_inline(cell))
+
+
+def render_raw_html(raw_html: RawHtml, conv: 'Converter'):
+    for paml_line in raw_html.lines:
+        conv.doc.asis(paml_line)
+
+
+RENDERERS = {Header: render_header, CollapsibleBox: render_collapsible_box,
+             Collapsible: render_collapsible, Command: render_command,
+             CodeLine: render_code_line, CodeBlock: render_code_block,
+             Image: render_image, Paragraph: render_paragraph,
+             List: render_list, Table: render_table,
+             RawHtml: render_raw_html}
+HANDLER_NAMES = {Header: 'add_header', CollapsibleBox: 'add_collapsible_box',
+                 Collapsible: 'add_collapsible', Command: 'add_command',
+                 CodeLine: 'add_code_line', CodeBlock: 'add_code_block',
+                 Image: 'add_image', Paragraph: 'add_paragraph',
+                 Table: 'add_table', RawHtml: 'add_raw_html'}
+
+
+# Inline formatting
+
+
+DECORATIONS = {"**": "b", "__": "i", "~~": "s"}
+# Decorations are never changed once parsed, so every tag is the same node
+OPENING_DECORATIONS = {marker: Decoration(tag, False)
+                       for marker, tag in DECORATIONS.items()}
+CLOSING_DECORATIONS = {marker: Decoration(tag, True)
+                       for marker, tag in DECORATIONS.items()}
+DECORATION_MARKERS = re.compile(r'\*\*|__|~~')
+# text without any of these is never changed by parse_inline apart from strip
+INLINE_MARKUP = re.compile(r'[*_~`\[]')
 
 
 def format_txt(txt: str) -> str:
     '''Using txt in the names to never accidentally mix it with yattag's 'text'
        by accident. All text sent into this function should already be inside
-       yattag's doc.asis() function.'''
-
-    # Add inline code, send non-code parts to decorate, check them for links
+       the Converter's doc.asis() function.'''
+
+    return render_inline(parse_inline(txt))
+
+
+def parse_inline(txt: str) -> list:
+    '''Returns a list of inline nodes: Text, Decoration, InlineCode and Link.
+       While a Converter is converting, the nodes would only be rendered
+       right away, so the HTML is made straight from the text instead and
+       returned as a single Text (see parse_inline_html). Counted as
+       format_txt in ConversionStats. The nodes may come from the
+       InlineCache of the conversion, so they're never changed.'''
+
+    parse = parse_inline_html if CONVERTING.get() else parse_inline_nodes
+    cache = INLINE_CACHE.get()
+    stats = STATS.get()
+    if stats is None:
+        return parse(txt) if cache is None else cache.parse(txt, parse)
+    start = perf_counter()
+    nodes = parse(txt) if cache is None else cache.parse(txt, parse)
+    stats.parsed('format_txt', start, len(txt))
+    return nodes
+
+
+class InlineCache:
+    '''Remembers the inline nodes of text that was already formatted (by
+       format_txt, add_link and every element with text in it), since
+       documents like cheat sheets repeat the same commands, comments and
+       table cells over and over. Given to a Converter (or convert_from_file,
+       convert_from_text, iter_convert and convert_tree), and the same cache
+       can be given to any number of conversions, one at a time.
+
+       The least recently used texts are forgotten once there are more than
+       max_entries of them or they take more than max_bytes (counted as
+       twice the characters of the text, for the text and its nodes). hits
+       and misses count how many texts were and weren't found.'''
+
+    def __init__(self, max_entries=4096, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # text: (nodes, size)
+        self.cache = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def parse(self, txt: str, parse=None) -> list:
+        '''Does the same as parse, parse_inline_nodes by default (or
+           parse_inline_html, which renders the same)'''
+
+        cached = self.cache.get(txt)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(txt)
+            return cached[0]
+
+        self.misses += 1
+        nodes = (parse or parse_inline_nodes)(txt)
+        # the nodes hold about as many characters as the text
+        size = 2 * len(txt)
+        if size <= self.max_bytes:
+            self.cache[txt] = (nodes, size)
+            self.cache_bytes += size
+            self.evict()
+        return nodes
+
+    def evict(self):
+        while (self.cache_bytes > self.max_bytes
+               or len(self.cache) > self.max_entries):
+            _, (_, size) = self.cache.popitem(last=False)
+            self.cache_bytes -= size
+
+    def clear(self):
+        self.cache.clear()
+        self.cache_bytes = 0
+
+
+def parse_inline_nodes(txt: str) -> list:
+    '''Inline code is cut out first, the parts between inline code are
+       decorated and then checked for links. Every part of the text is only
+       looked at a constant amount of times, so long paragraphs and big table
+       cells are parsed in linear time.'''
 
     txt = txt.strip()
-    result = ''
-
-    i = 0
-    buffer = ''
-    while i < len(txt):
-        if txt[i:i+2] == '``':
-            decorated = decorate_txt(buffer)
-            buffer = ''
-            with_links = find_links(decorated)
-            decorated = ''
-            result += with_links
-            with_links = ''
-
-            code = txt[i:i + txt[i+2:].find('``') + 4]
-            result += add_inline_code(code)
-            i += len(code)
+    if not INLINE_MARKUP.search(txt):
+        return [Text(txt)] if txt else []
+
+    result = []
+    start = 0
+    code_start = txt.find('``')
+    while code_start != -1:
+        result.extend(parse_text(txt[start:code_start]))
+
+        code_end = txt.find('``', code_start + 2)
+        if code_end == -1:
+            # an unclosed `` takes the character right after it with it
+            code = txt[code_start:code_start + 3]
         else:
-            buffer += txt[i]
-            i += 1
+            code = txt[code_start:code_end + 2]
+        result.append(InlineCode(code[2:-2]))
+
+        start = code_start + len(code)
+        code_start = txt.find('``', start)
+
+    result.extend(parse_text(txt[start:]))
+    return result
 
-    decorated = decorate_txt(buffer)
-    buffer = ''
-    with_links = find_links(decorated)
-    decorated = ''
-    result += with_links
-    with_links = ''
 
+def parse_text(txt: str) -> list:
+    '''Parses text without inline code. Links are looked for in the already
+       decorated text, so that a link can be inside a decoration and the
+       other way around.'''
+
+    decorated, decorations = decorate(txt)
+    if '[' not in decorated:
+        return text_between(decorated, decorations, 0, len(decorated))[0]
+
+    result = []
+    start = 0
+    d = 0
+    for link_start, link_end in find_link_spans(decorated):
+        nodes, d = text_between(decorated, decorations, start, link_start, d)
+        result.extend(nodes)
+
+        link = decorated[link_start:link_end]
+        href = link[link.find('(') + 1:link.find(')')]
+        content_start, content_end, _ = (slice(link.find('[') + 1,
+                                               link.find(']'))
+                                         .indices(len(link)))
+        content, d = text_between(decorated, decorations,
+                                  link_start + content_start,
+                                  link_start + max(content_start,
+                                                   content_end), d)
+        result.append(Link(href, strip_nodes(content)))
+        start = link_end
+
+    result.extend(text_between(decorated, decorations, start,
+                               len(decorated), d)[0])
     return result
 
 
+def parse_inline_html(txt: str) -> list:
+    '''Returns the HTML of the inline nodes of parse_inline_nodes as a
+       single Text, without making the nodes'''
+
+    html = inline_html(txt)
+    return [Text(html)] if html else []
+
+
+def inline_html(txt: str) -> str:
+    '''Returns the same as format_txt, going through the text like
+       parse_inline_nodes. The HTML of decorated text between inline code
+       and links is the decorated text itself, so it's used as it is.'''
+
+    txt = txt.strip()
+    if not INLINE_MARKUP.search(txt):
+        return txt
+
+    result = []
+    start = 0
+    code_start = txt.find('``')
+    while code_start != -1:
+        result.append(text_html(txt[start:code_start]))
+
+        code_end = txt.find('``', code_start + 2)
+        if code_end == -1:
+            code = txt[code_start:code_start + 3]
+        else:
+            code = txt[code_start:code_end + 2]
+        result.append('<span class="inline-code">' + escape(code[2:-2])
+                      + '</span>')
+
+        start = code_start + len(code)
+        code_start = txt.find('``', start)
+
+    result.append(text_html(txt[start:]))
+    return ''.join(result)
+
+
+def text_html(txt: str) -> str:
+    '''Returns the HTML of the nodes of parse_text'''
+
+    decorated = decorate_txt(txt)
+    if '[' not in decorated:
+        return decorated
+
+    result = []
+    start = 0
+    for link_start, link_end in find_link_spans(decorated):
+        result.append(decorated[start:link_start])
+        link = decorated[link_start:link_end]
+        href = link[link.find('(') + 1:link.find(')')]
+        content_start, content_end, _ = (slice(link.find('[') + 1,
+                                               link.find(']'))
+                                         .indices(len(link)))
+        # strip_nodes strips the text at both ends, decorations never start
+        # or end with whitespace
+        content = link[content_start:max(content_start, content_end)].strip()
+        result.append('<a target="_blank" href="' + href + '">' + content
+                      + '</a>')
+        start = link_end
+    result.append(decorated[start:])
+    return ''.join(result)
+
+
+def text_between(decorated: str, decorations: list, start: int, end: int,
+                 d=0) -> tuple:
+    '''Returns Text and Decoration nodes between start and end of decorated
+       text and the index of the first decoration after them. d is where to
+       start looking in decorations, which are (start, end, Decoration).'''
+
+    result = []
+    while d < len(decorations) and decorations[d][0] < start:
+        d += 1
+    while d < len(decorations) and decorations[d][0] < end:
+        decoration_start, decoration_end, decoration = decorations[d]
+        if decoration_start > start:
+            result.append(Text(decorated[start:decoration_start]))
+        if decoration_end > end:
+            # only a part of the tag is inside, like in a link without a ']'
+            # that ends one character before the '](' of the next one
+            result.append(Text(decorated[decoration_start:end]))
+            return result, d
+        result.append(decoration)
+        start = decoration_end
+        d += 1
+    if end > start:
+        result.append(Text(decorated[start:end]))
+    return result, d
+
+
+def strip_nodes(nodes: list) -> list:
+    '''Does the same as strip() on the rendered nodes'''
+
+    if nodes and type(nodes[0]) is Text:
+        nodes[0] = Text(nodes[0].text.lstrip())
+        if not nodes[0].text:
+            del nodes[0]
+    if nodes and type(nodes[-1]) is Text:
+        nodes[-1] = Text(nodes[-1].text.rstrip())
+        if not nodes[-1].text:
+            del nodes[-1]
+    return nodes
+
+
+def render_inline(nodes: list) -> str:
+    stats = STATS.get()
+    if stats is None:
+        return join_inline(nodes)
+    start = perf_counter()
+    html = join_inline(nodes)
+    stats.rendered('format_txt', start, len(html))
+    return html
+
+
+def join_inline(nodes: list) -> str:
+    result = []
+    for node in nodes:
+        if type(node) is Text:
+            result.append(node.text)
+        elif type(node) is Decoration:
+            result.append(('</' if node.closing else '<') + node.tag + '>')
+        elif type(node) is InlineCode:
+            result.append('<span class="inline-code">' + escape(node.code)
+                          + '</span>')
+        else:
+            result.append('<a target="_blank" href="' + node.href + '">'
+                          + join_inline(node.content) + '</a>')
+    return ''.join(result)
+
+
 def add_inline_code(txt: str) -> str:
     result = ('<span class="inline-code">' + escape(txt[2:-2]) + "</span>")
     return result
 
 
 def find_links(txt: str) -> str:
-    result = ''
-    i = 0
-    while i < len(txt):
-        if txt[i] == '[' and txt[i:].find('](') != -1:
+    result = []
+    start = 0
+    for link_start, link_end in find_link_spans(txt):
+        result.append(txt[start:link_start])
+        result.append(add_link(txt[link_start:link_end]))
+        start = link_end
+    result.append(txt[start:])
+    return ''.join(result)
+
+
+def find_link_spans(txt: str):
+    '''Yields the start and end of every [text](link) in already decorated
+       text. The positions of the next '](' and ')' are remembered between
+       links instead of searching the rest of the text again for every '[' '''
+
+    i = txt.find('[')
+    link_start = -1
+    link_end = -1
+    while i != -1:
+        if link_start < i:
             # link_start and link_end refer to the actual link inside ()
-            link_start = i + txt[i:].find('](')
-            link_end = link_start + txt[link_start:].find(')')
-            result += add_link(txt[i:link_end + 1])
-            i += len(txt[i:link_end + 1])
+            link_start = txt.find('](', i)
+            if link_start == -1:
+                return
+        if link_end < link_start and link_end != len(txt):
+            link_end = txt.find(')', link_start)
+            if link_end == -1:
+                # there won't be any ')' after later links either
+                link_end = len(txt)
+        if link_end == len(txt):
+            # without a ')' the link ends right before the ']('
+            end = link_start - 1
         else:
-            result += txt[i]
-            i += 1
-    return result
+            end = link_end
+
+        yield i, end + 1
+        i = txt.find('[', end + 1)
 
 
 def add_link(txt: str) -> str:
@@ -568,37 +2676,103 @@ def add_link(txt: str) -> str:
 
 
 def decorate_txt(txt: str) -> str:
-    tags = {"**": ("<b>", "</b>"), "__": ("<i>", "</i>"),
-            "~~": ("<s>", "</s>")}
-    result = txt
+    '''Returns only the decorated text of decorate'''
+
+    if '**' not in txt and '__' not in txt and '~~' not in txt:
+        return txt
+    return ''.join(piece if type(piece) is str
+                   else ('</' if piece.closing else '<') + piece.tag + '>'
+                   for piece in decoration_pieces(txt))
+
+
+def decorate(txt: str) -> tuple:
+    '''Returns the decorated text (see decoration_pieces) and a list of
+       (start, end, Decoration) for every tag in it'''
+
+    if '**' not in txt and '__' not in txt and '~~' not in txt:
+        return txt, []
+
+    result = []
+    decorations = []
+    position = 0
+    for piece in decoration_pieces(txt):
+        if type(piece) is Decoration:
+            html = ('</' if piece.closing else '<') + piece.tag + '>'
+            decorations.append((position, position + len(html), piece))
+            piece = html
+        result.append(piece)
+        position += len(piece)
+    return ''.join(result), decorations
+
+
+def decoration_pieces(txt: str) -> list:
+    '''Goes through the text once from left to right. When an opening tag
+       (like **) is found, its end is the first tag of the same type found
+       after it, which gets remembered in closing_tags and replaced once the
+       scan gets there. A tag that's already used as an end can't be a part
+       of another tag, e.g. in __**__ the ** is next to the </i>.
+
+       An opening tag without an end becomes an empty pair of tags and
+       swallows one character after it.
+
+       Returns the strings of text between tags and the Decorations of the
+       tags, in order.'''
+
+    pieces = []  # strings of text and Decorations
+    closing_tags = {}  # position of a tag in txt: Decoration replacing it
+    upcoming_closing = []  # heap with the same positions
+    search_from = dict.fromkeys(DECORATIONS, 0)
+    start = 0  # beginning of text not yet added to pieces
     i = 0
-    while any((x in result for x in tags.keys())) and i < len(result):
-        if result[i:i + 2] == "``":
-            # special case for inline code since then any other styling needs
-            # to be ignored
-            tag_end = result.rfind("``")
-            result = (result[:i] + tags[result[i:i + 2]][0]
-                      + result[i + 2:tag_end] + tags[result[i:i + 2]][1]
-                      + result[tag_end + 2:])
-            i += result.rfind("</span>")
+    while True:
+        found = DECORATION_MARKERS.search(txt, i)
+        if upcoming_closing and (found is None
+                                 or upcoming_closing[0] <= found.start()):
+            i = heappop(upcoming_closing)
+            pieces.append(txt[start:i])
+            pieces.append(closing_tags.pop(i))
+            i += 2
+            start = i
             continue
-        elif result[i:i + 2] in tags.keys():
-            # The end is the first tag of the same type found starting at
-            # after the opening tag
-            tag_end = i + 2 + result[i + 2:].find(result[i:i + 2])
-
-            result = (result[:i] + tags[result[i:i + 2]][0]
-                      # ^ until tag    ^ opening tag from dict
-                      + result[i + 2:tag_end] + tags[result[i:i + 2]][1]
-                      # ^ inside the tag        ^ closing tag from dict
-                      + result[tag_end + 2:])
-            #           ^ rest of text
-
-            # i + 2 since all tags have a length of 2 (like **) and it's easier
-            # than making a solution for all lengths that's useless for now
-            # will need rewriting if longer tags are needed
-        i += 1
-    return result
+        elif found is None:
+            break
+
+        i = found.start()
+        if i + 1 in closing_tags:
+            # the second character is already a part of a closing tag
+            i += 1
+            continue
+
+        tag = found.group()
+        opening = OPENING_DECORATIONS[tag]
+        closing = CLOSING_DECORATIONS[tag]
+        # The end is the first tag of the same type found starting at after
+        # the opening tag that's not a part of a closing tag already
+        tag_end = txt.find(tag, max(search_from[tag], i + 2))
+        while tag_end != -1 and (tag_end in closing_tags
+                                 or tag_end - 1 in closing_tags
+                                 or tag_end + 1 in closing_tags):
+            tag_end = txt.find(tag, tag_end + 1)
+        search_from[tag] = len(txt) if tag_end == -1 else tag_end + 1
+
+        pieces.append(txt[start:i])
+        if tag_end != -1:
+            pieces.append(opening)
+            closing_tags[tag_end] = closing
+            heappush(upcoming_closing, tag_end)
+            i += 2
+        elif i + 2 in closing_tags:
+            # no end, the swallowed character is the '<' of a closing tag
+            heappop(upcoming_closing)
+            swallowed = closing_tags.pop(i + 2)
+            pieces += [opening, closing, f'/{swallowed.tag}>']
+            i += 4
+        else:
+            pieces += [opening, closing]
+            i += 3
+        start = i
+    pieces.append(txt[start:])
+    return pieces
 
 
 if __name__ == '__main__':
@@ -0,0 +1,205 @@
+from bisect import bisect
+from contextlib import redirect_stdout
+from io import StringIO
+from multiprocessing import Pool
+import os
+import re
+import sys
+
+try:
+    from .paml2html import (PARALLEL_MIN_SIZE, ConversionStats, Converter,
+                            HtmlIndenter, SourceLines, StringDoc,
+                            identify_element)
+except ImportError:
+    # paml2html.py started directly as a script
+    from paml2html import (PARALLEL_MIN_SIZE, ConversionStats, Converter,
+                           HtmlIndenter, SourceLines, StringDoc,
+                           identify_element)
+
+
+# How many chunks a document is split into for every process, so that the
+# processes finish at about the same time even if some chunks are slower
+CHUNKS_PER_WORKER = 4
+# A line that isn't blank right after one that is, in ScannedLines.firsts
+AFTER_BLANK_LINE = re.compile(' [^ ]')
+
+# The SourceLines and InlineCache used by convert_chunk, every process has
+# its own copy
+worker_lines = None
+worker_inline_cache = None
+
+
+def convert_parallel(paml_text: str, workers=None,
+                     min_size=PARALLEL_MIN_SIZE, stats=None,
+                     indentation=None, inline_cache=None,
+                     newlines_only=False) -> str:
+    '''Returns the same HTML as convert_from_text, converted by a pool of
+       processes for documents of at least min_size characters (see
+       iter_convert_parallel)'''
+
+    return ''.join(iter_convert_parallel(
+        paml_text, workers=workers, min_size=min_size, stats=stats,
+        indentation=indentation, inline_cache=inline_cache,
+        newlines_only=newlines_only))
+
+
+def iter_convert_parallel(paml_text: str, workers=None,
+                          min_size=PARALLEL_MIN_SIZE, stats=None,
+                          indentation=None, inline_cache=None,
+                          newlines_only=False):
+    '''Converts a single big document in a pool of processes (one per CPU by
+       default) and yields its HTML a chunk at a time, in order. Joined
+       together it's the same HTML as the one returned by convert_from_text,
+       or by convert_from_file with newlines_only=True (for text read from a
+       file, whose lines end only at \\n). Documents of less than min_size
+       characters, or with a single process, are converted right here.
+
+       The document is split into chunks at lines where an element at the
+       top of the document starts nearly always (see chunk_starts), and
+       every process converts whole elements from the start of its chunk
+       until reaching the next one, looking at the whole document like a
+       single conversion would. Whether a chunk really starts with an
+       element is only known once the chunk before it is done: the HTML of
+       a chunk is used when the element before it ended exactly where the
+       chunk starts. Otherwise (like for a chunk starting inside a code
+       block, or a process stopped at a line no element starts on) the rest
+       of the chunk is converted again here, from where the element before
+       it ended.
+
+       With stats (a ConversionStats) the stats of the chunks used are added
+       to it. Every process starts with a copy of inline_cache (an
+       InlineCache), only its hits and misses are added up in inline_cache.
+       With indentation the HTML is indented here as the chunks come in.'''
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if not paml_text:
+        return
+    paml_lines = SourceLines(paml_text, newlines_only)
+    starts = [0]
+    if workers > 1 and len(paml_text) >= min_size:
+        starts = chunk_starts(paml_lines, workers * CHUNKS_PER_WORKER)
+    if len(starts) == 1:
+        html = Converter(stats=stats, indentation=indentation,
+                         inline_cache=inline_cache).convert_scanned(paml_lines)
+        if html:
+            yield html
+        return
+
+    indenter = None
+    if indentation is not None:
+        indenter = HtmlIndenter(indentation)
+    stops = starts[1:] + [len(paml_lines)]
+    with Pool(min(workers, len(starts)), initializer=use_lines,
+              initargs=(paml_lines, inline_cache)) as pool:
+        results = [pool.apply_async(convert_chunk,
+                                    (start, stop, stats is not None))
+                   for start, stop in zip(starts, stops)]
+        i = 0
+        for start, stop, result in zip(starts, stops, results):
+            if i >= stop:
+                # the element before took the whole chunk
+                continue
+            chunk = result.get() if i == start else None
+            if chunk is not None and chunk[1] >= stop:
+                html, i, printed, chunk_stats, inline_counts = chunk
+                # like the unsupported lines skipped by a single conversion
+                sys.stdout.write(printed)
+                add_counts(stats, chunk_stats, inline_cache, inline_counts)
+            else:
+                # the chunk started inside an element, or its process got
+                # stuck at a line no element starts on
+                conv = Converter(stats=stats, inline_cache=inline_cache)
+                i = convert_range(paml_lines, i, stop, conv)
+                if i < stop:
+                    # a single conversion would never get past it
+                    raise ValueError(f'Line {i + 1} can\'t be converted')
+                html = conv.getvalue()
+            if indenter is not None:
+                html = indent_part(indenter, html)
+            if html:
+                yield html
+    if indenter is not None:
+        html = indenter.indent(StringDoc(), final=True)
+        if html:
+            yield html
+
+
+def chunk_starts(paml_lines: SourceLines, chunks: int) -> list:
+    '''Returns the first line of every chunk when splitting the document
+       into about as many chunks of the same size. A chunk starts at the
+       first line after its share of the text that isn't indented and comes
+       right after a blank line, which is where an element at the top of the
+       document starts, apart from lines inside code blocks and the like.'''
+
+    size = len(paml_lines.text)
+    starts = [0]
+    for n in range(1, chunks):
+        line = bisect(paml_lines.offsets, n * size // chunks)
+        for match in AFTER_BLANK_LINE.finditer(paml_lines.firsts,
+                                               max(line, starts[-1])):
+            if not paml_lines.starts[match.end() - 1]:
+                starts.append(match.end() - 1)
+                break
+        else:
+            break
+    return starts
+
+
+def convert_range(paml_lines, i: int, stop: int, conv: Converter) -> int:
+    '''Adds the elements at the top of the document from line i on until
+       reaching stop, returns the line after the last one. Stops early at a
+       line identify_element doesn't get past (like #include in a code block
+       a chunk started in) and returns that line.'''
+
+    while i < stop:
+        end = identify_element(paml_lines, i, conv)
+        if end == i:
+            break
+        i = end
+    return i
+
+
+def indent_part(indenter: HtmlIndenter, html: str) -> str:
+    doc = StringDoc()
+    doc.asis(html)
+    return indenter.indent(doc)
+
+
+def add_counts(stats, chunk_stats, inline_cache, inline_counts):
+    if chunk_stats is not None:
+        stats.merge(chunk_stats)
+    if inline_counts is not None:
+        inline_cache.hits += inline_counts[0]
+        inline_cache.misses += inline_counts[1]
+
+
+def use_lines(paml_lines: SourceLines, inline_cache):
+    '''Sets the document and the InlineCache used by convert_chunk in this
+       process'''
+
+    global worker_lines, worker_inline_cache
+    worker_lines = paml_lines
+    worker_inline_cache = inline_cache
+
+
+def convert_chunk(start: int, stop: int, collect_stats: bool) -> tuple:
+    '''Converts the elements from line start until reaching stop inside a
+       worker process. Returns their HTML, the line after the last one,
+       what was printed while converting them (the lines that were skipped),
+       their stats when they're collected and the hits and misses of the
+       process' InlineCache while converting them.'''
+
+    stats = ConversionStats() if collect_stats else None
+    inline_cache = worker_inline_cache
+    if inline_cache is not None:
+        hits, misses = inline_cache.hits, inline_cache.misses
+    conv = Converter(stats=stats, inline_cache=inline_cache)
+    # only printed if the chunk is used
+    with redirect_stdout(StringIO()) as printed:
+        end = convert_range(worker_lines, start, stop, conv)
+    inline_counts = None
+    if inline_cache is not None:
+        inline_counts = (inline_cache.hits - hits,
+                         inline_cache.misses - misses)
+    return conv.getvalue(), end, printed.getvalue(), stats, inline_counts
@@ -0,0 +1,215 @@
+from contextlib import redirect_stdout
+from io import StringIO
+import argparse
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+
+try:
+    from .client import Client, default_socket_path
+    from .paml2html import (ConversionSession, HtmlIndenter, InlineCache,
+                            StringDoc, write_if_changed)
+except ImportError:
+    # server.py started directly as a script
+    from client import Client, default_socket_path
+    from paml2html import (ConversionSession, HtmlIndenter, InlineCache,
+                           StringDoc, write_if_changed)
+
+
+class ConversionServer:
+    '''Converts documents for any number of requests, so that tools
+       converting one document at a time don't start a new interpreter and
+       import the converter every time. The caches stay warm from one request
+       to the next: a ConversionSession takes elements that were already
+       converted (in any document) from its cache, and with inline_cache (an
+       InlineCache) text that was already formatted is taken from it.
+
+       Requests and responses are dicts, sent as JSON lines by serve_lines
+       (for stdin and stdout) and serve_socket (for a Unix domain socket).
+       Requests are handled one at a time, see handle.'''
+
+    def __init__(self, max_cache_bytes=32 * 1024 * 1024, inline_cache=None):
+        self.session = ConversionSession(max_cache_bytes, inline_cache)
+        self.inline_cache = inline_cache
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.stopping = False
+
+    def handle(self, request: dict) -> dict:
+        '''Returns the response to a request. Documents are converted from
+           their "text" or from the file at "source", with "indentation"
+           (like "  ") if it's given. The HTML is returned as "html", or
+           with a "destination" it's written there (like paml2html.py
+           does) and "written" tells whether the file changed. Lines that
+           were skipped are returned as "printed" instead of being printed.
+
+           {"command": "stats"} returns how often the caches were used and
+           {"command": "stop"} stops the server after answering. Errors are
+           returned as "error", an "id" is returned as it is.'''
+
+        response = {}
+        if 'id' in request:
+            response['id'] = request['id']
+        try:
+            command = request.get('command', 'convert')
+            if command == 'convert':
+                response.update(self.convert(request))
+            elif command == 'stats':
+                response.update(self.stats())
+            elif command == 'stop':
+                self.stopping = True
+            else:
+                raise ValueError(f'Unknown command {command!r}')
+        except Exception as e:
+            response['error'] = f'{type(e).__name__}: {e}'
+        return response
+
+    def convert(self, request: dict) -> dict:
+        if 'text' in request:
+            paml_lines = request['text'].splitlines(True)
+        else:
+            with open(request['source'], 'r', encoding='utf-8') as p:
+                paml_lines = p.readlines()
+        with self.lock, redirect_stdout(StringIO()) as printed:
+            self.requests += 1
+            html = self.session.convert_lines(paml_lines)
+        response = {'printed': printed.getvalue()}
+        if request.get('indentation') is not None:
+            doc = StringDoc()
+            doc.asis(html)
+            html = HtmlIndenter(request['indentation']).indent(doc,
+                                                               final=True)
+        if request.get('destination') is None:
+            response['html'] = html
+        else:
+            response['written'] = write_if_changed(request['destination'],
+                                                   [html])
+        return response
+
+    def stats(self) -> dict:
+        stats = {'requests': self.requests,
+                 'element_hits': self.session.hits,
+                 'element_misses': self.session.misses}
+        if self.inline_cache is not None:
+            stats['inline_hits'] = self.inline_cache.hits
+            stats['inline_misses'] = self.inline_cache.misses
+        return stats
+
+    def serve_lines(self, requests, write):
+        '''Answers every request (a line of JSON) coming from requests (like
+           stdin) with a line of JSON given to write, until requests run out
+           or a stop request comes'''
+
+        for line in requests:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('A request has to be a JSON object')
+            except ValueError as e:
+                response = {'error': f'{type(e).__name__}: {e}'}
+            else:
+                response = self.handle(request)
+            write(json.dumps(response) + '\n')
+            if self.stopping:
+                return
+
+    def serve_socket(self, socket_path=None):
+        '''Listens on a Unix domain socket (default_socket_path() by default)
+           until a stop request comes, answering the requests of every
+           connection in a thread of its own. Only the user running the
+           server can connect, since it reads and writes files for whoever
+           does.'''
+
+        if socket_path is None:
+            socket_path = default_socket_path()
+        remove_stale_socket(socket_path)
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write(response):
+                    self.wfile.write(response.encode('utf-8'))
+                    self.wfile.flush()
+                server.serve_lines(self.rfile, write)
+                if server.stopping:
+                    # can't be called from the thread serving the socket
+                    threading.Thread(target=listener.shutdown).start()
+
+        umask = os.umask(0o177)
+        try:
+            listener = socketserver.ThreadingUnixStreamServer(
+                os.fspath(socket_path), Handler)
+        finally:
+            os.umask(umask)
+        listener.daemon_threads = True
+        try:
+            with listener:
+                listener.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def remove_stale_socket(socket_path):
+    '''Removes the socket left behind by a server that didn't stop cleanly,
+       raises FileExistsError if a server is still listening on it or if
+       the path isn't a socket'''
+
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{socket_path} exists and isn\'t a socket')
+    try:
+        Client(socket_path).close()
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+    else:
+        raise FileExistsError('A server is already listening on'
+                              + f' {socket_path}')
+
+
+def main():
+    '''Starts a server answering requests on a Unix domain socket, or on
+       stdin and stdout with --stdio'''
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket",
+                        help="Provide the path of the Unix domain socket."
+                        + " Defaults to $XDG_RUNTIME_DIR/paml2html.sock or"
+                        + " /tmp/paml2html-<uid>.sock",
+                        default=None)
+    parser.add_argument("--stdio", action="store_true",
+                        help="Answer requests coming from stdin on stdout"
+                        + " instead of listening on a socket")
+    parser.add_argument("--cache-max-size",
+                        help="Provide the size in MB of the converted"
+                        + " elements kept between requests",
+                        type=float, default=32)
+    parser.add_argument("--inline-cache",
+                        help="Provide how many formatted texts are"
+                        + " remembered between requests",
+                        type=int, default=4096)
+    args = parser.parse_args()
+
+    server = ConversionServer(int(args.cache_max_size * 1024 * 1024),
+                              InlineCache(max_entries=args.inline_cache))
+    if args.stdio:
+        def write(response):
+            sys.stdout.write(response)
+            sys.stdout.flush()
+        server.serve_lines(sys.stdin, write)
+        return
+    try:
+        server.serve_socket(args.socket)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+from pathlib import Path
+import os
+import threading
+import time
+
+try:
+    from .batch import convert_task, use_inline_cache
+except ImportError:
+    # paml2html.py started directly as a script
+    from batch import convert_task, use_inline_cache
+
+
+def take_snapshot(source) -> dict:
+    '''Returns the (mtime in ns, size) of the source file or of every .paml
+       file under the source directory. Nothing is read, so a snapshot of a
+       big tree costs one stat per file.'''
+
+    source = Path(source)
+    if not source.is_dir():
+        try:
+            stat = source.stat()
+        except FileNotFoundError:
+            return {}
+        return {source: (stat.st_mtime_ns, stat.st_size)}
+
+    snapshot = {}
+    directories = [source]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except FileNotFoundError:
+            # removed since it was found
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(Path(entry.path))
+                elif entry.name.endswith('.paml') and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[Path(entry.path)] = (stat.st_mtime_ns,
+                                                  stat.st_size)
+    return snapshot
+
+
+def changed_files(old: dict, new: dict) -> list:
+    '''Returns the files that were added or changed between two snapshots'''
+
+    return sorted(path for path, stat in new.items() if old.get(path) != stat)
+
+
+def destination_of(source: Path, source_root: Path,
+                   destination_root: Path) -> Path:
+    if source == source_root:
+        # a single file being watched
+        return destination_root
+    return destination_root / source.relative_to(source_root).with_suffix(
+        '.html')
+
+
+def watch(source, destination, indentation=None, cache=None, interval=0.5,
+          debounce=0.2, stop=None, report=print, inline_cache=None):
+    '''Converts the source file (or every .paml file in the source
+       directory, like convert_tree) and converts again every file that
+       changes afterwards, until stop (a threading.Event) is set.
+
+       Changes are found by comparing the mtime and size of the files every
+       interval seconds. Once something changed, the files are checked again
+       every debounce seconds until they stop changing, so that a burst of
+       saves is converted only once. How long every file took to convert and
+       how long after it was saved its HTML was written is given to report.
+       Destination files are replaced, or left alone (keeping their
+       modification time) if their HTML didn't change. With inline_cache (an
+       InlineCache) formatted text is remembered from one conversion to the
+       next.'''
+
+    source = Path(source)
+    destination = Path(destination)
+    if stop is None:
+        stop = threading.Event()
+    use_inline_cache(inline_cache)
+
+    snapshot = take_snapshot(source)
+    rebuild(changed_files({}, snapshot), source, destination, indentation,
+            cache, report, saved=False)
+    while not stop.wait(interval):
+        latest = take_snapshot(source)
+        if latest == snapshot:
+            continue
+        while not stop.wait(debounce):
+            settled = take_snapshot(source)
+            if settled == latest:
+                break
+            latest = settled
+        else:
+            # stopped while waiting for the files to settle
+            return
+        changed = changed_files(snapshot, latest)
+        snapshot = latest
+        rebuild(changed, source, destination, indentation, cache, report)
+
+
+def rebuild(sources: list, source_root: Path, destination_root: Path,
+            indentation, cache, report, saved=True):
+    '''Converts the given files one by one and reports how long it took,
+       and with saved=True how long after they were saved they're done'''
+
+    for source in sources:
+        start = time.perf_counter()
+        _, error, _, _ = convert_task((source, destination_of(
+            source, source_root, destination_root), indentation, cache,
+            False))
+        took = time.perf_counter() - start
+        if error is not None:
+            report(f'Failed to convert {source}: {error}')
+            continue
+        message = f'Converted {source} in {took * 1000:.0f} ms'
+        if saved:
+            try:
+                since_saved = time.time() - source.stat().st_mtime
+            except FileNotFoundError:
+                # removed right after it was converted
+                since_saved = took
+            message += f', {since_saved * 1000:.0f} ms after it was saved'
+        report(message)
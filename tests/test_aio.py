@@ -0,0 +1,63 @@
+from paml2html import aio, paml2html
+from pathlib import Path
+import asyncio
+import threading
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.paml_text = (FIXTURES / 'cs.paml').read_text(encoding='utf-8')
+        with open(FIXTURES / 'cs.html') as f:
+            self.expected = f.read()
+
+    async def test_aconvert(self):
+        self.assertEqual(await aio.aconvert(self.paml_text), self.expected)
+        self.assertEqual(await aio.aconvert(''), '')
+
+    async def test_aiter_convert(self):
+        chunks = [html async for html in aio.aiter_convert(self.paml_text)]
+        self.assertEqual(''.join(chunks), self.expected)
+        self.assertEqual([html async for html in aio.aiter_convert('')], [])
+
+    async def test_chunk_size(self):
+        async with aio.AsyncConverter(chunk_size=1) as converter:
+            small = [html async for html
+                     in converter.aiter_convert(self.paml_text)]
+        async with aio.AsyncConverter(chunk_size=10 ** 9) as converter:
+            whole = [html async for html
+                     in converter.aiter_convert(self.paml_text)]
+        # every top-level element is a chunk of its own
+        self.assertEqual(small, list(paml2html.iter_convert(
+            self.paml_text.splitlines(True))))
+        self.assertEqual(whole, [self.expected])
+
+    async def test_concurrent_conversions(self):
+        async with aio.AsyncConverter(max_concurrency=2) as converter:
+            results = await asyncio.gather(*(
+                converter.aconvert(self.paml_text) for _ in range(8)))
+        self.assertEqual(results, [self.expected] * 8)
+
+    async def test_stats(self):
+        stats = paml2html.ConversionStats()
+        async with aio.AsyncConverter() as converter:
+            await converter.aconvert(self.paml_text, stats)
+            async for _ in converter.aiter_convert(self.paml_text, stats):
+                pass
+        self.assertEqual(stats['add_command'].calls, 2 * 45)
+
+    async def test_cancel_waiting_conversion(self):
+        release = threading.Event()
+        async with aio.AsyncConverter(max_concurrency=1) as converter:
+            # keeps the only thread busy
+            busy = converter.executor.submit(release.wait)
+            task = asyncio.create_task(converter.aconvert(self.paml_text))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            release.set()
+            busy.result()
+            self.assertEqual(await converter.aconvert('# x'), '<h1>x</h1>')
@@ -0,0 +1,63 @@
+from paml2html import batch, paml2html
+from pathlib import Path
+import shutil
+import tempfile
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.source = self.tmp / 'source'
+        self.destination = self.tmp / 'destination'
+        for subdir in ['', 'a', 'a/b', 'c']:
+            (self.source / subdir).mkdir(parents=True, exist_ok=True)
+            shutil.copy(FIXTURES / 'cs.paml', self.source / subdir / 'cs.paml')
+        shutil.copy(FIXTURES / 'empty.paml', self.source / 'a' / 'empty.paml')
+        # a code line without its last two lines can't be converted
+        (self.source / 'c' / 'broken.paml').write_text('```x\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def check_tree(self, results):
+        with open(FIXTURES / 'cs.html') as f:
+            expected = f.read()
+        self.assertEqual(len(results), 6)
+        for subdir in ['', 'a', 'a/b', 'c']:
+            self.assertIsNone(results[self.source / subdir / 'cs.paml'])
+            with open(self.destination / subdir / 'cs.html') as f:
+                self.assertEqual(f.read(), expected)
+        self.assertEqual((self.destination / 'a' / 'empty.html').read_text(),
+                         '')
+        self.assertIn('IndexError', results[self.source / 'c' / 'broken.paml'])
+        self.assertFalse((self.destination / 'c' / 'broken.html').exists())
+
+    def test_convert_tree_in_processes(self):
+        results = batch.convert_tree(self.source, self.destination,
+                                     workers=2, max_tasks_per_worker=2)
+        self.check_tree(results)
+
+    def test_convert_tree_stats(self):
+        stats = paml2html.ConversionStats()
+        batch.convert_tree(self.source, self.destination, workers=2,
+                           stats=stats)
+        self.assertEqual(stats['add_collapsible_box'].calls, 4 * 3)
+        self.assertEqual(stats['add_command'].calls, 4 * 45)
+
+    def test_convert_tree_inline_cache(self):
+        for workers in [1, 2]:
+            cache = paml2html.InlineCache()
+            results = batch.convert_tree(self.source, self.destination,
+                                         workers=workers, inline_cache=cache)
+            self.check_tree(results)
+            # every copy of cs.paml after the first one in a process is
+            # taken from the cache
+            self.assertGreater(cache.hits, cache.misses)
+            self.assertEqual(len(cache), 0 if workers > 1 else 134)
+
+    def test_convert_tree_in_one_process(self):
+        results = batch.convert_tree(self.source, self.destination, workers=1)
+        self.check_tree(results)
@@ -0,0 +1,96 @@
+from paml2html import batch, cache, paml2html
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.cache = cache.DiskCache(self.tmp / 'cache')
+        self.source = self.tmp / 'cs.paml'
+        shutil.copy(FIXTURES / 'cs.paml', self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_convert_file_from_cache(self):
+        with open(FIXTURES / 'cs.html') as f:
+            expected = f.read()
+        for _ in range(3):
+            result = paml2html.convert_from_file(self.source,
+                                                 cache=self.cache)
+            self.assertEqual(result, expected)
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 2))
+
+    def test_stats_on_cache_miss(self):
+        stats = paml2html.ConversionStats()
+        inline_cache = paml2html.InlineCache()
+        paml2html.convert_from_file(self.source, cache=self.cache, stats=stats,
+                                    inline_cache=inline_cache)
+        self.assertGreater(stats['add_command'].calls, 0)
+        self.assertGreater(inline_cache.misses, 0)
+        calls = stats['add_command'].calls
+        paml2html.convert_from_file(self.source, cache=self.cache, stats=stats)
+        # taken from the cache, not converted
+        self.assertEqual(stats['add_command'].calls, calls)
+
+    def test_changed_file_is_converted_again(self):
+        self.cache.convert_file(self.source)
+        with open(self.source, 'a') as f:
+            f.write('# Added\n')
+        result = self.cache.convert_file(self.source)
+        self.assertEqual(result, paml2html.convert_from_file(self.source))
+        self.assertEqual((self.cache.misses, self.cache.hits), (2, 0))
+
+    def test_options_are_part_of_the_key(self):
+        source = self.tmp / 'list.paml'
+        source.write_text('- one\n- two\n')
+        plain = self.cache.convert_file(source)
+        indented = self.cache.convert_file(source, indentation='  ')
+        self.assertNotEqual(plain, indented)
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_parse_file_from_cache(self):
+        expected = paml2html.parse_from_file(self.source)
+        self.assertEqual(self.cache.parse_file(self.source), expected)
+        self.assertEqual(self.cache.parse_file(self.source), expected)
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 1))
+
+    def test_deeply_nested_tree_isnt_cached(self):
+        source = self.tmp / 'nested.paml'
+        source.write_text(''.join(' ' * level + '- x\n'
+                                  for level in range(sys.getrecursionlimit())))
+        # trees this deep can't be compared either
+        expected = paml2html.convert_from_file(source)
+        document = self.cache.parse_file(source)
+        self.assertEqual(paml2html.render_document(document), expected)
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_prune(self):
+        for n in range(4):
+            source = self.tmp / f'{n}.paml'
+            source.write_text(f'# Header {n}\n')
+            self.cache.convert_file(source)
+        self.assertEqual(self.cache.stats()['entries'], 4)
+        self.assertEqual(self.cache.prune(max_bytes=0), 4)
+        self.assertEqual(self.cache.stats(),
+                         {'directory': str(self.tmp / 'cache'), 'entries': 0,
+                          'bytes': 0, 'max_bytes': self.cache.max_bytes})
+
+    def test_convert_tree_with_cache(self):
+        destination = self.tmp / 'destination'
+        stats = paml2html.ConversionStats()
+        for _ in range(2):
+            results = batch.convert_tree(self.tmp, destination, workers=1,
+                                         cache=self.cache, stats=stats)
+            self.assertEqual(results, {self.source: None})
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 1))
+        # only counted the first time, when it was converted
+        self.assertEqual(stats['add_command'].calls, 45)
+        self.assertEqual((destination / 'cs.html').read_text(),
+                         (FIXTURES / 'cs.html').read_text())
@@ -0,0 +1,91 @@
+from paml2html import paml2html
+from paml2html.generate import PamlGenerator, generate_paml
+from paml2html.paml2html import Collapsible, List, Table
+import contextlib
+import io
+import unittest
+
+'''Stress tests converting generated documents: every way of converting a
+   document has to make the same HTML, and no line of a generated document
+   should be skipped as unsupported.'''
+
+
+def walk(value):
+    if isinstance(value, list):
+        for item in value:
+            yield from walk(item)
+    elif isinstance(value, paml2html.Node):
+        yield value
+        for name in value.__slots__:
+            yield from walk(getattr(value, name))
+
+
+def depth(node, node_type, children) -> int:
+    '''Returns how deeply nodes of node_type are nested in node'''
+
+    nested = [depth(child, node_type, children)
+              for child in getattr(node, children)
+              if isinstance(child, node_type)]
+    return 1 + max(nested, default=0)
+
+
+class TestPaml(unittest.TestCase):
+    def test_same_seed_same_document(self):
+        self.assertEqual(generate_paml(4096, seed=7),
+                         generate_paml(4096, seed=7))
+        self.assertNotEqual(generate_paml(4096, seed=7),
+                            generate_paml(4096, seed=8))
+
+    def test_size(self):
+        for size in [1, 1024, 32 * 1024]:
+            self.assertGreaterEqual(len(generate_paml(size)), size)
+
+    def test_no_unsupported_lines(self):
+        for seed in range(10):
+            paml_text = generate_paml(16 * 1024, seed, collapsible_depth=4,
+                                      list_depth=4, code_block_lines=1,
+                                      markup_density=1, links=3)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                paml2html.convert_from_text(paml_text)
+            self.assertEqual(output.getvalue(), '')
+
+    def test_every_conversion_is_the_same(self):
+        paml_text = generate_paml(64 * 1024, seed=1)
+        expected = paml2html.convert_from_text(paml_text)
+        self.assertEqual(''.join(paml2html.iter_convert(
+            paml_text.splitlines(True))), expected)
+        self.assertEqual(paml2html.ConversionSession()
+                         .convert_text(paml_text), expected)
+        self.assertEqual(paml2html.render_document(
+            paml2html.parse_from_text(paml_text)), expected)
+
+    @unittest.skipIf(paml2html.Doc is None, 'yattag is not installed')
+    def test_yattag_backend_is_the_same(self):
+        paml_text = generate_paml(64 * 1024, seed=1)
+        self.assertEqual(paml2html.Converter('yattag').convert_text(paml_text),
+                         paml2html.convert_from_text(paml_text))
+
+    @unittest.skipIf(paml2html.Doc is None, 'yattag is not installed')
+    def test_indentation_like_yattag(self):
+        import yattag
+        paml_text = generate_paml(32 * 1024, seed=2)
+        expected = yattag.indent(paml2html.convert_from_text(paml_text),
+                                 indentation='  ')
+        self.assertEqual(paml2html.convert_from_text(
+            paml_text, indentation='  '), expected)
+        self.assertEqual(''.join(paml2html.iter_convert(
+            paml_text.splitlines(True), indentation='  ')), expected)
+
+    def test_knobs(self):
+        generator = PamlGenerator(seed=2, collapsible_depth=5, list_depth=5,
+                                  table_columns=6)
+        document = paml2html.parse_from_text(generator.generate(256 * 1024))
+        nodes = list(walk(document))
+        self.assertEqual(max(depth(node, Collapsible, 'children')
+                             for node in nodes
+                             if isinstance(node, Collapsible)), 5)
+        self.assertEqual(max(depth(node, List, 'items')
+                             for node in nodes if isinstance(node, List)), 5)
+        self.assertEqual(max(len(node.rows[0]) for node in nodes
+                             if isinstance(node, Table)), 6)
@@ -1,4 +1,6 @@
+from html import escape
 from paml2html import paml2html
+import sys
 import unittest
 
 '''These tests all test the identify_element function (it doesn't return
@@ -6,18 +8,14 @@ import unittest
    well as creating new PaML elements with different types of content inside
    them.
 
-   While running, paml2html starts with a fresh set of yattag's variables:
-   doc, tag, text, line, as mentioned in yattag's docs: https://www.yattag.org/
+   While running, every conversion writes to its own Converter, which holds
+   yattag's variables: doc, tag, text, line, as mentioned in yattag's docs:
+   https://www.yattag.org/
 
-   These are set every time convert_from_file or convert_from_text is called
-   for normal use cases, as well as at the top of the paml2html.py file for
-   unit testing purposes (so that the variables that a particular function is
-   trying to use are defined).
-
-   Every unit test also redefines these variables at the end (but before
-   assertEqual in case the test fails) to make sure they are empty before the
-   next test populates them. Had that not been the case, one test running after
-   the other would append its result to the one made by the previous test.
+   A new Converter is made by convert_from_file or convert_from_text for
+   normal use cases. Every unit test makes its own Converter and passes it to
+   the function being tested, so that one test running after the other never
+   appends its result to the one made by the previous test.
 
    You might find it strange to see paml in a list such as header1 instead of
    a string, but functions expecting the paml_lines variable expect paml in a
@@ -32,55 +30,49 @@ class TestPaml(unittest.TestCase):
     def test_header1(self):
         header1 = ["# Header 1\n", ""]
         expected = "<h1>Header 1</h1>"
-        paml2html.identify_element(header1, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header1, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header2(self):
         header2 = ["## Header 2\n", ""]
         expected = "<h2>Header 2</h2>"
-        paml2html.identify_element(header2, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header2, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header3(self):
         header3 = ["### Header 3\n", ""]
         expected = "<h3>Header 3</h3>"
-        paml2html.identify_element(header3, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header3, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header4(self):
         header4 = ["#### Header 4\n", ""]
         expected = "<h4>Header 4</h4>"
-        paml2html.identify_element(header4, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header4, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header5(self):
         header5 = ["##### Header 5\n", ""]
         expected = "<h5>Header 5</h5>"
-        paml2html.identify_element(header5, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header5, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header6(self):
         header6 = ["###### Header 6\n", ""]
         expected = "<h6>Header 6</h6>"
-        paml2html.identify_element(header6, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(header6, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Collapsibles
@@ -90,10 +82,9 @@ class TestPaml(unittest.TestCase):
         exp = ('<div class="collapsible-box-half-left"><details>'
                + '<summary class="header"><span class="icon">➤</span> coll'
                + '</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_l_collapsible_with_icon_and_content(self):
@@ -109,20 +100,18 @@ class TestPaml(unittest.TestCase):
                + '"command">Ctrl + E</span><span class="same-line-comment">'
                + 'Comment</span><div class="small-comment">Small comment</div>'
                + '</div></div></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_l_collapsible_without_icon(self):
         coll = ['>l coll\n', '']
         exp = ('<div class="collapsible-box-half-left"><details>'
                + '<summary class="header">coll</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_r_collapsible_with_icon(self):
@@ -130,20 +119,18 @@ class TestPaml(unittest.TestCase):
         exp = ('<div class="collapsible-box-half-right"><details>'
                + '<summary class="header"><span class="icon">➤</span> coll'
                + '</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_r_collapsible_without_icon(self):
         coll = ['>r coll\n', '']
         exp = ('<div class="collapsible-box-half-right"><details>'
                + '<summary class="header">coll</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_full_collapsible_with_icon(self):
@@ -151,20 +138,18 @@ class TestPaml(unittest.TestCase):
         exp = ('<div class="collapsible-box-full"><details>'
                + '<summary class="header"><span class="icon">➤</span> coll'
                + '</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_full_collapsible_without_icon(self):
         coll = ['>f coll\n', '']
         exp = ('<div class="collapsible-box-full"><details>'
                + '<summary class="header">coll</summary></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_nested_collapsible(self):
@@ -177,10 +162,9 @@ class TestPaml(unittest.TestCase):
                + '<details><summary class="header">'
                + '<span class="icon">➤</span> nested collapsible</summary>'
                + '</details></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_nested_collapsible_with_content_in_primary(self):
@@ -198,10 +182,9 @@ class TestPaml(unittest.TestCase):
 
                + '<details><summary class="header"><span class="icon">➤</span>'
                + ' collapsible</summary></details></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_nested_collapsible_with_content_in_nested(self):
@@ -220,10 +203,9 @@ class TestPaml(unittest.TestCase):
                + '<span class="same-line-comment">Comment</span>'
                + '<div class="small-comment">Small comment</div></div></div>'
                + '</details></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     def test_nested_collapsible_with_content_in_both(self):
@@ -248,10 +230,25 @@ class TestPaml(unittest.TestCase):
                + '<span class="same-line-comment">Comment</span>'
                + '<div class="small-comment">Small comment</div>'
                + '</div></div></details></details></div>')
-        paml2html.identify_element(coll, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
+        self.assertEqual(result, exp)
+
+    def test_deeply_nested_collapsible(self):
+        # more levels than the recursion limit, every one a space deeper
+        depth = 2 * sys.getrecursionlimit()
+        coll = ([' ' * level + '>l➤ c\n' for level in range(depth)]
+                + [' ' * depth + '/Ctrl + E\n', ''])
+        exp = ('<div class="collapsible-box-half-left">'
+               + ('<details><summary class="header">'
+                  + '<span class="icon">➤</span> c</summary>') * depth
+               + '<div class="entry"><div class="command-box">'
+               + '<span class="command">Ctrl + E</span></div></div>'
+               + '</details>' * depth + '</div>')
+        conv = paml2html.Converter()
+        paml2html.identify_element(coll, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, exp)
 
     # Command
@@ -260,10 +257,9 @@ class TestPaml(unittest.TestCase):
         comm = ['/Ctrl + E\n', '']
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span></div>')
-        paml2html.identify_element(comm, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(comm, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_with_comment(self):
@@ -271,10 +267,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span><span class="same-line-comment">Comment'
                     + '</span></div>')
-        paml2html.identify_element(comm, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(comm, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_with_small_comment(self):
@@ -282,10 +277,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span><div class="small-comment">Small comment</div>'
                     + '</div>')
-        paml2html.identify_element(comm, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(comm, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_with_both_comments(self):
@@ -293,10 +287,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span><span class="same-line-comment">Comment</span>'
                     + '<div class="small-comment">Small comment</div></div>')
-        paml2html.identify_element(comm, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(comm, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Code line
@@ -307,10 +300,9 @@ class TestPaml(unittest.TestCase):
                 '```\n', '']
         expected = ('<div class="line-code-box"><code class="line-code">'
                     + 'This is a code line</code></div>')
-        paml2html.identify_element(line, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(line, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_with_comment(self):
@@ -320,10 +312,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="line-code-box"><div class="line-code-comment"'
                     + '>Comment</div><code class="line-code">This is a code '
                     + 'line</code></div>')
-        paml2html.identify_element(line, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(line, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_with_small_comment(self):
@@ -333,10 +324,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="line-code-box"><div class="line-code-small-'
                     + 'comment">Small comment</div><code class="line-code">'
                     + 'This is a code line</code></div>')
-        paml2html.identify_element(line, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(line, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_with_both_comments(self):
@@ -347,10 +337,9 @@ class TestPaml(unittest.TestCase):
                     + '>Comment</div><div class="line-code-small-comment">'
                     + 'Small comment</div><code class="line-code">This is a '
                     + 'code line</code></div>')
-        paml2html.identify_element(line, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(line, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Code block
@@ -364,10 +353,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="block-code-box"><code class="block-code">'
                     + '<pre>This is a code block\n'
                     + 'with no comment.</pre></code></div>')
-        paml2html.identify_element(block, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(block, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_with_comment(self):
@@ -380,10 +368,9 @@ class TestPaml(unittest.TestCase):
                     + '<div class="block-code-comment">Comment</div>'
                     + '<code class="block-code"><pre>This is a code block\n'
                     + 'with a comment.</pre></code></div>')
-        paml2html.identify_element(block, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(block, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_with_small_comment(self):
@@ -397,10 +384,9 @@ class TestPaml(unittest.TestCase):
                     + '</div><code class="block-code">'
                     + '<pre>This is a code block\n'
                     + 'with a comment.</pre></code></div>')
-        paml2html.identify_element(block, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(block, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_with_both_comments(self):
@@ -414,11 +400,25 @@ class TestPaml(unittest.TestCase):
                     + 'Small comment</div><code class="block-code">'
                     + '<pre>This is a code block\n'
                     + 'with a comment.</pre></code></div>')
-        paml2html.identify_element(block, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
-        self.assertEqual(result, expected)
+        conv = paml2html.Converter()
+        paml2html.identify_element(block, 0, conv)
+        result = conv.getvalue()
+        self.assertEqual(result, expected)
+
+    def test_big_code_block(self):
+        code = [f'<{i}> & line\n' for i in range(2500)]
+        block = ['```\n', *code, '```\n', '']
+        code_block, end = paml2html.parse_code_block(
+            paml2html.ScannedLines(block), 0)
+        self.assertEqual(end, 2502)
+        self.assertEqual(code_block.code, ''.join(code).rstrip())
+        expected = ('<div class="block-code-box"><code class="block-code">'
+                    + '<pre>' + escape(''.join(code).rstrip(), quote=False)
+                    + '</pre></code></div>')
+        for backend in paml2html.BACKENDS:
+            conv = paml2html.Converter(backend)
+            paml2html.identify_element(block, 0, conv)
+            self.assertEqual(conv.getvalue(), expected)
 
     # Images
 
@@ -426,10 +426,9 @@ class TestPaml(unittest.TestCase):
         image = ['![alt text](image.png)\n',
                  '']
         expected = '<img alt="alt text" src="image.png" />'
-        paml2html.identify_element(image, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(image, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Paragraphs
@@ -437,19 +436,17 @@ class TestPaml(unittest.TestCase):
     def test_empty_paragraph(self):
         para = ['{\n', '}\n', '']
         expected = '<div class="paragraph"><p></p></div>'
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_empty_one_line_paragraph(self):
         para = ['{\n', '\n', '}\n', '']
         expected = '<div class="paragraph"><p></p></div>'
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_single_line_paragraph(self):
@@ -458,10 +455,9 @@ class TestPaml(unittest.TestCase):
                 '}\n',
                 '']
         expected = '<div class="paragraph"><p>Simple paragraph</p></div>'
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_single_line_paragraph_with_indentation(self):
@@ -474,10 +470,9 @@ class TestPaml(unittest.TestCase):
                 '']
         expected = ('<div class="paragraph">'
                     + '<p>Paragraph with 4 spaces</p></div>')
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_multi_line_paragraph(self):
@@ -489,10 +484,9 @@ class TestPaml(unittest.TestCase):
                 '']
         expected = ('<div class="paragraph"><p>Paragraph with no indentation'
                     + '<br><br>Second paragraph</p></div>')
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_multi_line_paragraph_with_indentation(self):
@@ -507,10 +501,9 @@ class TestPaml(unittest.TestCase):
                 '']
         expected = ('<div class="paragraph"><p>Paragraph with 4 spaces'
                     + '<br><br>Second paragraph with 4 spaces</p></div>')
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_single_line_paragraph_with_left_picture(self):
@@ -521,10 +514,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="paragraph"><img alt="alt text" '
                     + 'src="image.png" class="img-half-left" />'
                     + '<p>some text</p></div>')
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_single_line_paragraph_with_right_picture(self):
@@ -535,10 +527,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="paragraph"><img alt="alt text" '
                     + 'src="image.png" class="img-half-right" />'
                     + '<p>some text</p></div>')
-        paml2html.identify_element(para, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(para, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Unordered lists
@@ -546,10 +537,9 @@ class TestPaml(unittest.TestCase):
     def test_unordered_list_with_single_element(self):
         ulist = ['- Element\n', '']
         expected = '<ul><li>Element</li></ul>'
-        paml2html.identify_element(ulist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(ulist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_list_with_multiple_elements(self):
@@ -560,10 +550,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ul><li>Element 1</li>'
                     + '<li>Element 2</li>'
                     + '<li>Element 3</li></ul>')
-        paml2html.identify_element(ulist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(ulist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_list_nested(self):
@@ -573,10 +562,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ul><li>Element 1</li>'
                     + '<ul><li>Subelement</li></ul>'
                     + '<li>Element 2</li></ul>')
-        paml2html.identify_element(ulist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(ulist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_list_nested_two_levels(self):
@@ -590,10 +578,9 @@ class TestPaml(unittest.TestCase):
                     + '<ul><li>Subsubelement</li></ul>'
                     + '<li>Subelement 2</li></ul>'
                     + '<li>Element 2</li></ul>')
-        paml2html.identify_element(ulist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(ulist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Ordered lists
@@ -601,10 +588,9 @@ class TestPaml(unittest.TestCase):
     def test_ordered_list_with_single_element(self):
         olist = ['1. Element\n', '']
         expected = ('<ol><li>Element</li></ol>')
-        paml2html.identify_element(olist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(olist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_list_with_multiple_element(self):
@@ -615,10 +601,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ol><li>Element</li>'
                     + '<li>Element</li>'
                     + '<li>Element</li></ol>')
-        paml2html.identify_element(olist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(olist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_list_nested(self):
@@ -628,10 +613,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ol><li>Element 1</li>'
                     + '<ol><li>Subelement</li></ol>'
                     + '<li>Element 2</li></ol>')
-        paml2html.identify_element(olist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(olist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_list_nested_two_levels(self):
@@ -645,10 +629,9 @@ class TestPaml(unittest.TestCase):
                     + '<ol><li>Subsubelement</li></ol>'
                     + '<li>Subelement 2</li></ol>'
                     + '<li>Element 2</li></ol>')
-        paml2html.identify_element(olist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(olist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Mixed lists
@@ -660,10 +643,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ul><li>Element 1</li>'
                     + '<ol><li>Subelement 1</li></ol>'
                     + '<li>Element 2</li></ul>')
-        paml2html.identify_element(mlist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(mlist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_two_levels_starting_unordered(self):
@@ -677,10 +659,9 @@ class TestPaml(unittest.TestCase):
                     + '<ul><li>Subsubelement</li></ul>'
                     + '<li>Subelement 2</li></ol>'
                     + '<li>Element 2</li></ul>')
-        paml2html.identify_element(mlist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(mlist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_one_level_starting_ordered(self):
@@ -690,10 +671,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ol><li>Element 1</li>'
                     + '<ul><li>Subelement 1</li></ul>'
                     + '<li>Element 2</li></ol>')
-        paml2html.identify_element(mlist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(mlist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_two_levels_starting_ordered(self):
@@ -707,10 +687,24 @@ class TestPaml(unittest.TestCase):
                     + '<ol><li>Subsubelement</li></ol>'
                     + '<li>Subelement 2</li></ul>'
                     + '<li>Element 2</li></ol>')
-        paml2html.identify_element(mlist, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(mlist, 0, conv)
+        result = conv.getvalue()
+        self.assertEqual(result, expected)
+
+    def test_deeply_nested_mixed_list(self):
+        depth = 2 * sys.getrecursionlimit()
+        mlist = ([' ' * level + ('1.' if level % 2 else '-') + ' x\n'
+                  for level in range(depth)]
+                 + ['- Element 2\n', ''])
+        expected = (''.join(('<ol>' if level % 2 else '<ul>') + '<li>x</li>'
+                            for level in range(depth))
+                    + ''.join('</ol>' if level % 2 else '</ul>'
+                              for level in reversed(range(1, depth)))
+                    + '<li>Element 2</li></ul>')
+        conv = paml2html.Converter()
+        paml2html.identify_element(mlist, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     # Tables
@@ -722,10 +716,9 @@ class TestPaml(unittest.TestCase):
                  '']
         expected = ('<table><tr><th>Head2</th><th>2Head</th></tr>'
                     + '<tr><td>text</td><td>text2</td></tr></table>')
-        paml2html.identify_element(table, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(table, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_table_without_headers(self):
@@ -734,30 +727,37 @@ class TestPaml(unittest.TestCase):
                  '']
         expected = ('<table><tr><td>a</td><td>b</td>'
                     + '</tr><tr><td>c</td><td>d</td></tr></table>')
-        paml2html.identify_element(table, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(table, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
+    def test_table_rows_at_once(self):
+        rows = [f'| {i} | **b** |\n' for i in range(5)]
+        table = ['| a |\n', '| --- |\n', *rows, '']
+        conv = paml2html.Converter()
+        parts = paml2html.write_table(paml2html.ScannedLines(table), 0, conv,
+                                      rows_at_once=2)
+        self.assertEqual(list(parts), [4, 6, 7])
+        self.assertEqual(conv.getvalue(), paml2html.render_document(
+            paml2html.parse_from_text(''.join(table))))
+
     # Raw HTML
 
     def test_raw_html_empty(self):
         html = ['<\n', '>\n', '']
         expected = ''
-        paml2html.identify_element(html, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(html, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_raw_html_empty_line(self):
         html = ['<\n', '\n', '>\n', '']
         expected = ''
-        paml2html.identify_element(html, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(html, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_raw_html_content_line(self):
@@ -765,10 +765,9 @@ class TestPaml(unittest.TestCase):
                 '<p>A paragraph</p>\n',
                 '>\n', '']
         expected = '<p>A paragraph</p>'
-        paml2html.identify_element(html, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(html, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_raw_html_content_multiple_lines(self):
@@ -777,10 +776,9 @@ class TestPaml(unittest.TestCase):
                 '<div>A div</div>\n',
                 '>\n', '']
         expected = '<p>A paragraph</p><div>A div</div>'
-        paml2html.identify_element(html, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(html, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_raw_html_content_multiple_lines_with_breaks(self):
@@ -790,10 +788,9 @@ class TestPaml(unittest.TestCase):
                 '<div>A div</div>\n',
                 '>\n', '']
         expected = '<p>A paragraph</p><div>A div</div>'
-        paml2html.identify_element(html, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.identify_element(html, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
 
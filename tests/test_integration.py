@@ -1,5 +1,7 @@
 from paml2html import paml2html
 from pathlib import Path
+import os
+import tempfile
 import unittest
 
 
@@ -23,3 +25,280 @@ class TestPaml(unittest.TestCase):
         with open(html_path) as f:
             expected = f.read()
             self.assertEqual(result, expected)
+
+    def test_cs_file_mapped(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        with open(html_path) as f:
+            expected = f.read()
+        self.assertEqual(paml2html.convert_from_file(paml_path, mapped=True),
+                         expected)
+        self.assertEqual(''.join(paml2html.iter_convert(paml_path,
+                                                        mapped=True)),
+                         expected)
+
+    def test_empty_file_mapped(self):
+        fpath = Path(__file__).resolve().parent / 'fixtures' / 'empty.paml'
+        self.assertEqual(paml2html.convert_from_file(fpath, mapped=True), '')
+
+    def test_mapped_lines_like_text_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / 'newlines.paml'
+            fpath.write_bytes('# ➤ a\r\n- b\r- c\n\r\n| d |'.encode())
+            with open(fpath, encoding='utf-8') as p:
+                expected = p.readlines()
+            self.assertEqual(list(paml2html.read_mapped_lines(fpath)),
+                             expected)
+            self.assertEqual(paml2html.convert_from_file(fpath, mapped=True),
+                             paml2html.convert_from_file(fpath))
+
+    def test_indented_html(self):
+        indenter = paml2html.HtmlIndenter('  ')
+        doc = paml2html.StringDoc()
+        doc.asis('<p>a <b>b</b></p><div><br/><i>x</i>  </div>')
+        self.assertEqual(indenter.indent(doc, final=True),
+                         '<p>a <b>b</b></p>\n<div>\n  <br/>\n  <i>x</i>'
+                         + '\n</div>')
+
+    def test_indented_cs_file_streamed(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        whole = paml2html.convert_from_file(paml_path, indentation='  ')
+        self.assertIn('\n  <details>', whole)
+        self.assertEqual(''.join(paml2html.iter_convert(
+            paml_path, indentation='  ')), whole)
+
+    def test_indented_after_unclosed_tag(self):
+        # everything after the <span> is held back until the end, every part
+        # is matched once
+        indenter = paml2html.HtmlIndenter('  ')
+        parts = ['<div><span>a</div>'] + ['<p>b</p>'] * 100 + ['</span>']
+        html = []
+        for part in parts:
+            doc = paml2html.StringDoc()
+            doc.asis(part)
+            html.append(indenter.indent(doc))
+            self.assertEqual(len(indenter.matched), len(indenter.tokens))
+        html.append(indenter.indent(paml2html.StringDoc(), final=True))
+        whole = paml2html.StringDoc()
+        whole.asis(''.join(parts))
+        self.assertEqual(''.join(html), paml2html.HtmlIndenter('  ').indent(
+            whole, final=True))
+        self.assertEqual(indenter.matched, bytearray())
+
+    def test_indented_paragraph_streamed(self):
+        # the <br> between the lines is never closed, it mustn't hold back
+        # the rest of the document
+        lines_read = []
+
+        def paml_lines():
+            for paml_line in ['{\n', 'a\n', 'b\n', '}\n'] + ['# H\n'] * 100:
+                lines_read.append(paml_line)
+                yield paml_line
+
+        chunks = paml2html.iter_convert(paml_lines(), indentation='  ')
+        self.assertEqual(next(chunks), ('<div class="paragraph">\n'
+                                        + '  <p>a<br>b</p>\n</div>'))
+        self.assertEqual(next(chunks), '\n<h1>H</h1>')
+        self.assertLess(len(lines_read), 10)
+
+    def test_write_if_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / 'out.html'
+            self.assertTrue(paml2html.write_if_changed(fpath, ['<p>', 'a']))
+            self.assertEqual(fpath.read_text(), '<p>a')
+            fpath.chmod(0o640)
+            os.utime(fpath, ns=(0, 0))
+            self.assertFalse(paml2html.write_if_changed(fpath, ['<p>a', '']))
+            self.assertEqual(fpath.stat().st_mtime_ns, 0)
+            for html in (['<p>', 'b'], ['<p>a', '</p>'], ['<p>']):
+                self.assertTrue(paml2html.write_if_changed(fpath, html))
+                self.assertEqual(fpath.read_text(), ''.join(html))
+            self.assertEqual(fpath.stat().st_mode & 0o777, 0o640)
+            self.assertEqual(os.listdir(tmp), ['out.html'])
+
+    def test_write_if_changed_failed(self):
+        def failing():
+            yield '<p>b'
+            raise IndexError
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fpath = Path(tmp) / 'out.html'
+            fpath.write_text('<p>a')
+            with self.assertRaises(IndexError):
+                paml2html.write_if_changed(fpath, failing())
+            self.assertEqual(fpath.read_text(), '<p>a')
+            self.assertEqual(os.listdir(tmp), ['out.html'])
+
+    @unittest.skipIf(paml2html.Doc is None, 'yattag is not installed')
+    def test_cs_file_yattag_backend(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        result = paml2html.Converter('yattag').convert_file(paml_path)
+        with open(html_path) as f:
+            expected = f.read()
+            self.assertEqual(result, expected)
+
+    @unittest.skipIf(paml2html.Doc is None, 'yattag is not installed')
+    def test_backends_escape_the_same(self):
+        text = ('![a "quoted" <alt> & more](img.png?a=1&b="2")\n'
+                + '>l<➤> title & "more"\n'
+                + '    ```/* <comment> */\n'
+                + '    x = "<code>" & y\n'
+                + '    ```\n')
+        result = paml2html.Converter().convert_text(text)
+        expected = paml2html.Converter('yattag').convert_text(text)
+        self.assertEqual(result, expected)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            paml2html.Converter('lxml')
+
+    def test_stats(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        stats = paml2html.ConversionStats()
+        result = paml2html.convert_from_file(paml_path, stats=stats)
+        self.assertEqual(result, paml2html.convert_from_file(paml_path))
+        calls = {name: handler.calls
+                 for name, handler in stats.handlers.items()}
+        self.assertEqual(calls, {'add_collapsible_box': 3,
+                                 'add_collapsible': 17, 'add_command': 45,
+                                 'add_code_line': 38, 'add_code_block': 2,
+                                 'add_raw_html': 4, 'format_txt': 136})
+        # every top-level element is a collapsible box
+        self.assertEqual(stats['add_collapsible_box'].output_chars,
+                         len(result))
+        for handler in stats.handlers.values():
+            self.assertGreater(handler.total_time, 0)
+            self.assertGreaterEqual(handler.total_time,
+                                    handler.max_parse_time)
+
+    def test_stats_add_up(self):
+        stats = paml2html.ConversionStats()
+        streamed = paml2html.ConversionStats()
+        for _ in range(2):
+            paml2html.convert_from_text('# Header\n- a\n- b\n', stats=stats)
+        list(paml2html.iter_convert(['# Header\n', '- a\n', '- b\n'],
+                                    stats=streamed))
+        streamed.merge(streamed)
+        for stats_ in (stats, streamed):
+            self.assertEqual(stats_['add_header'].calls, 2)
+            self.assertEqual(stats_['add_unordered_list'].calls, 2)
+            self.assertEqual(stats_['format_txt'].calls, 6)
+            self.assertEqual(stats_['add_header'].input_chars, 18)
+            self.assertEqual(stats_['add_header'].output_chars,
+                             2 * len('<h1>Header</h1>'))
+        self.assertIn('add_unordered_list', stats.format())
+
+    def test_stats_element_until_the_end(self):
+        # a paragraph without } ends after the last line of the document
+        stats = paml2html.ConversionStats()
+        result = paml2html.convert_from_text('{\ntext', stats=stats)
+        self.assertEqual(result, paml2html.convert_from_text('{\ntext'))
+        self.assertEqual(stats['add_paragraph'].input_chars, 7)
+
+    def test_stats_identify_element(self):
+        stats = paml2html.ConversionStats()
+        inline_cache = paml2html.InlineCache()
+        conv = paml2html.Converter(stats=stats, inline_cache=inline_cache)
+        paml2html.identify_element(['# Header\n', ''], 0, conv)
+        self.assertEqual(conv.getvalue(), '<h1>Header</h1>')
+        self.assertEqual(stats['add_header'].calls, 1)
+        self.assertEqual(inline_cache.misses, 1)
+
+    def test_no_stats_by_default(self):
+        conv = paml2html.Converter()
+        conv.convert_text('# Header\n')
+        self.assertIsNone(conv.stats)
+        self.assertIsNone(paml2html.STATS.get())
+
+    def test_concurrent_conversions(self):
+        '''Every conversion has its own Converter, so conversions running at
+           the same time in threads can't write into each other's output'''
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        with open(html_path) as f:
+            expected = f.read()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(paml2html.convert_from_file,
+                                        [paml_path] * 32))
+        for result in results:
+            self.assertEqual(result, expected)
+
+    def test_iter_convert_cs_file(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        with open(paml_path, encoding='utf-8') as p:
+            result = list(paml2html.iter_convert(p))
+        with open(html_path) as f:
+            expected = f.read()
+        self.assertGreater(len(result), 1)
+        self.assertEqual(''.join(result), expected)
+
+    def test_iter_convert_empty_file(self):
+        fpath = Path(__file__).resolve().parent / 'fixtures' / 'empty.paml'
+        result = list(paml2html.iter_convert(fpath))
+        self.assertEqual(result, [])
+
+    def test_iter_convert_reads_lines_lazily(self):
+        '''The header is done before the table is read. One line more than
+           needed is always read to know whether a line is the last one'''
+
+        lines_read = []
+
+        def paml_lines():
+            for paml_line in ['# Header\n', '| a | b |\n', '| c | d |\n',
+                              '\n', '- item\n']:
+                lines_read.append(paml_line)
+                yield paml_line
+
+        chunks = paml2html.iter_convert(paml_lines())
+        self.assertEqual(next(chunks), '<h1>Header</h1>')
+        self.assertEqual(len(lines_read), 2)
+        self.assertEqual(next(chunks), ('<table><tr><td>a</td><td>b</td>'
+                                        + '</tr><tr><td>c</td><td>d</td>'
+                                        + '</tr></table>'))
+        self.assertEqual(len(lines_read), 5)
+        self.assertEqual(list(chunks), ['<ul><li>item</li></ul>'])
+
+    def test_iter_convert_big_table(self):
+        rows = paml2html.TABLE_ROWS_AT_ONCE * 2 + 1
+        paml = ['| a | b |\n'] * rows
+        chunks = list(paml2html.iter_convert(paml))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].count('<tr>'),
+                         paml2html.TABLE_ROWS_AT_ONCE)
+        self.assertEqual(''.join(chunks), paml2html.render_document(
+            paml2html.parse_lines(paml)))
+
+    def test_session_after_edit(self):
+        paml = ('# Header\n'
+                + '>l➤ coll\n'
+                + '    /Ctrl + E /* Comment */\n'
+                + '| a | b |\n'
+                + '| c | d |\n')
+        edited = paml.replace('Comment', 'Edited comment')
+        session = paml2html.ConversionSession()
+        self.assertEqual(session.convert_text(paml),
+                         paml2html.convert_from_text(paml))
+        # header, collapsible box, table and the empty line at the end
+        self.assertEqual(session.misses, 4)
+        self.assertEqual(session.convert_text(edited),
+                         paml2html.convert_from_text(edited))
+        # only the collapsible box was converted again
+        self.assertEqual(session.hits, 3)
+        self.assertEqual(session.misses, 5)
+
+    def test_session_cache_limit(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        with open(paml_path, encoding='utf-8') as p:
+            paml = p.read()
+        with open(html_path) as f:
+            expected = f.read()
+        session = paml2html.ConversionSession(max_cache_bytes=4096)
+        for _ in range(2):
+            self.assertEqual(session.convert_text(paml), expected)
+            self.assertLessEqual(session.cache_bytes, 4096)
@@ -0,0 +1,85 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from paml2html import paml2html, parallel
+from pathlib import Path
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.TestCase):
+    def setUp(self):
+        cs = (FIXTURES / 'cs.paml').read_text(encoding='utf-8')
+        self.paml_text = '\n\n'.join([cs] * 6)
+
+    def test_convert_parallel(self):
+        for indentation in (None, '  '):
+            with self.subTest(indentation=indentation):
+                expected = paml2html.convert_from_text(
+                    self.paml_text, indentation=indentation)
+                self.assertEqual(parallel.convert_parallel(
+                    self.paml_text, workers=2, min_size=0,
+                    indentation=indentation), expected)
+        self.assertEqual(parallel.convert_parallel('', workers=2,
+                                                   min_size=0), '')
+
+    def test_chunk_starts(self):
+        paml_lines = paml2html.SourceLines(self.paml_text)
+        starts = parallel.chunk_starts(paml_lines, 8)
+        self.assertEqual(len(starts), 8)
+        self.assertEqual(starts, sorted(set(starts)))
+        for start in starts[1:]:
+            self.assertEqual(paml_lines[start - 1].strip(), '')
+            self.assertEqual(paml_lines.starts[start], 0)
+
+    def test_chunks_inside_code_block(self):
+        # most chunks start inside the code block, at lines that look like
+        # the start of an element
+        paml_text = ('# a\n\n```Log\n' + 'x\n\n- y\n' * 500 + '```\n\n'
+                     + self.paml_text + '\n\n`x\n')
+        paml_lines = paml2html.SourceLines(paml_text)
+        self.assertGreater(len(parallel.chunk_starts(paml_lines, 8)), 4)
+        with redirect_stdout(StringIO()) as printed:
+            expected = paml2html.convert_from_text(paml_text)
+        with redirect_stdout(StringIO()) as printed_parallel:
+            html = parallel.convert_parallel(paml_text, workers=2,
+                                             min_size=0)
+        self.assertEqual(html, expected)
+        # only the skipped line at the end, not the lines of the code block
+        self.assertEqual(printed_parallel.getvalue(), printed.getvalue())
+
+    def test_chunks_stuck_inside_code_blocks(self):
+        # most chunks start at #include in a code block, which no element
+        # starts with, and every process gets stuck at one of them
+        cs = (FIXTURES / 'cs.paml').read_text(encoding='utf-8')
+        paml_text = (cs + '\n\n' + '```\nx\n\n#include <stdio.h>\n```\n' * 500
+                     + '\n' + cs)
+        paml_lines = paml2html.SourceLines(paml_text)
+        starts = parallel.chunk_starts(paml_lines, 8)
+        self.assertGreater([paml_lines[start] for start in starts].count(
+            '#include <stdio.h>\n'), 2)
+        with redirect_stdout(StringIO()):
+            expected = paml2html.convert_from_text(paml_text)
+            html = parallel.convert_parallel(paml_text, workers=2,
+                                             min_size=0)
+        self.assertEqual(html, expected)
+
+    def test_stats(self):
+        stats = paml2html.ConversionStats()
+        parallel.convert_parallel(self.paml_text, workers=2, min_size=0,
+                                  stats=stats)
+        self.assertEqual(stats['add_command'].calls, 6 * 45)
+
+    def test_small_document(self):
+        # converted without starting any processes
+        self.assertEqual(parallel.convert_parallel(self.paml_text),
+                         paml2html.convert_from_text(self.paml_text))
+        self.assertEqual(list(parallel.iter_convert_parallel(
+            self.paml_text, workers=1, min_size=0)),
+            [paml2html.convert_from_text(self.paml_text)])
+
+    def test_error_in_chunk(self):
+        # a code line without its last two lines can't be converted
+        with self.assertRaises(IndexError):
+            parallel.convert_parallel(self.paml_text + '\n\n```x\n',
+                                      workers=2, min_size=0)
@@ -0,0 +1,170 @@
+from io import StringIO
+from paml2html import client, paml2html, server
+from pathlib import Path
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.paml_text = (FIXTURES / 'cs.paml').read_text(encoding='utf-8')
+        with open(FIXTURES / 'cs.html') as f:
+            self.expected = f.read()
+        self.server = server.ConversionServer(
+            inline_cache=paml2html.InlineCache())
+        self.socket_path = self.tmp / 'paml2html.sock'
+        self.thread = None
+
+    def tearDown(self):
+        if self.thread is not None:
+            self.stop_server()
+        shutil.rmtree(self.tmp)
+
+    def stop_server(self):
+        with client.Client(self.socket_path) as c:
+            self.assertEqual(c.request(command='stop'), {})
+        self.thread.join()
+        self.thread = None
+
+    def run_client(self, *args):
+        argv = sys.argv
+        sys.argv = ['client.py', *map(str, args), '--socket',
+                    str(self.socket_path)]
+        try:
+            client.main()
+        finally:
+            sys.argv = argv
+
+    def test_convert_text(self):
+        response = self.server.handle({'id': 1, 'text': self.paml_text})
+        self.assertEqual(response, {'id': 1, 'html': self.expected,
+                                    'printed': ''})
+        response = self.server.handle({'text': self.paml_text,
+                                       'indentation': '  '})
+        self.assertEqual(response['html'], paml2html.convert_from_text(
+            self.paml_text, indentation='  '))
+        self.assertEqual(self.server.handle({'text': ''})['html'], '')
+
+    def test_warm_caches(self):
+        self.server.handle({'text': self.paml_text})
+        before = self.server.handle({'command': 'stats'})
+        self.assertEqual(before['element_hits'], 0)
+        paml_text = self.paml_text + '\n# More\n'
+        response = self.server.handle({'text': paml_text})
+        self.assertEqual(response['html'],
+                         paml2html.convert_from_text(paml_text))
+        after = self.server.handle({'command': 'stats'})
+        self.assertEqual(after['requests'], 2)
+        self.assertGreater(after['element_hits'], 0)
+        # only the new header's text had to be formatted
+        self.assertEqual(after['inline_misses'], before['inline_misses'] + 1)
+
+    def test_convert_file(self):
+        source = self.tmp / 'cs.paml'
+        shutil.copy(FIXTURES / 'cs.paml', source)
+        request = {'source': str(source),
+                   'destination': str(self.tmp / 'cs.html')}
+        self.assertEqual(self.server.handle(request),
+                         {'written': True, 'printed': ''})
+        self.assertEqual((self.tmp / 'cs.html').read_text(), self.expected)
+        self.assertEqual(self.server.handle(request),
+                         {'written': False, 'printed': ''})
+
+    def test_errors(self):
+        # a code line without its last two lines can't be converted
+        response = self.server.handle({'id': 'a', 'text': '```x\n'})
+        self.assertEqual(response['id'], 'a')
+        self.assertIn('IndexError', response['error'])
+        response = self.server.handle({'source': str(self.tmp / 'none')})
+        self.assertIn('FileNotFoundError', response['error'])
+        response = self.server.handle({'command': 'restart'})
+        self.assertIn('Unknown command', response['error'])
+        response = self.server.handle({'text': '`x\n# a\n'})
+        self.assertEqual(response['html'], '<h1>a</h1>')
+        self.assertIn('Unsupported line', response['printed'])
+
+    def test_serve_lines(self):
+        requests = StringIO('{"id": 1, "text": "# a"}\n\nnot json\n[]\n'
+                            + '{"command": "stop"}\n{"text": "# b"}\n')
+        responses = StringIO()
+        self.server.serve_lines(requests, responses.write)
+        responses = [json.loads(line) for line
+                     in responses.getvalue().splitlines()]
+        self.assertEqual(responses[0], {'id': 1, 'html': '<h1>a</h1>',
+                                        'printed': ''})
+        self.assertIn('JSONDecodeError', responses[1]['error'])
+        self.assertIn('ValueError', responses[2]['error'])
+        # nothing is answered after stop
+        self.assertEqual(responses[3:], [{}])
+
+    def test_serve_socket(self):
+        socket_path = self.socket_path
+        self.thread = threading.Thread(target=self.server.serve_socket,
+                                       args=(socket_path,))
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(socket_path.stat().st_mode & 0o777, 0o600)
+        with client.Client(socket_path) as c:
+            # many requests over a single connection
+            for _ in range(3):
+                self.assertEqual(c.convert_text(self.paml_text),
+                                 self.expected)
+            with self.assertRaises(RuntimeError):
+                c.convert_text('```x\n')
+        with self.assertRaises(FileExistsError):
+            server.remove_stale_socket(socket_path)
+        self.run_client(FIXTURES / 'cs.paml', self.tmp / 'cs.html')
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual((self.tmp / 'cs.html').read_text(), self.expected)
+        self.stop_server()
+        self.assertFalse(socket_path.exists())
+
+        # converted by the client itself once the server is gone
+        self.run_client(FIXTURES / 'cs.paml', self.tmp / 'indented.html',
+                        '--indent', 2)
+        self.assertEqual((self.tmp / 'indented.html').read_text(),
+                         paml2html.convert_from_file(FIXTURES / 'cs.paml',
+                                                     indentation='  '))
+
+    def test_remove_stale_socket(self):
+        notes = self.tmp / 'notes.txt'
+        notes.write_text('notes')
+        with self.assertRaises(FileExistsError):
+            server.remove_stale_socket(notes)
+        self.assertEqual(notes.read_text(), 'notes')
+        # nothing to remove
+        server.remove_stale_socket(self.socket_path)
+        # left behind by a server that's gone
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(str(self.socket_path))
+        server.remove_stale_socket(self.socket_path)
+        self.assertFalse(self.socket_path.exists())
+
+    def test_client_imports_only_what_it_needs(self):
+        # in a new interpreter, nothing else has imported the converter yet
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [str(Path(client.__file__).parents[1]),
+             os.environ.get('PYTHONPATH', '')]))
+        code = ('import sys, paml2html.client\n'
+                + 'print(sorted({"paml2html.paml2html", "asyncio",'
+                + ' "multiprocessing"} & set(sys.modules)))')
+        result = subprocess.run([sys.executable, '-c', code], env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout, '[]\n')
+
+    def test_no_server(self):
+        with self.assertRaises(FileNotFoundError):
+            client.Client(self.tmp / 'none.sock')
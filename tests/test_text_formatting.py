@@ -22,8 +22,6 @@ class TestPaml(unittest.TestCase):
         code = '``Inline code``'
         expected = ('<span class="inline-code">Inline code</span>')
         result = paml2html.add_inline_code(code)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link(self):
@@ -31,56 +29,42 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com">link'
                     + '</a>')
         result = paml2html.add_link(link)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_bold(self):
         bold = '**Bold**'
         expected = '<b>Bold</b>'
         result = paml2html.decorate_txt(bold)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_italics(self):
         it = '__Italics__'
         expected = '<i>Italics</i>'
         result = paml2html.decorate_txt(it)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_strikethrough(self):
         s = '~~Strikethrough~~'
         expected = '<s>Strikethrough</s>'
         result = paml2html.decorate_txt(s)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_text_bold_twice(self):
         paml = '**Bold end** **Bold end**'
         expected = '<b>Bold end</b> <b>Bold end</b>'
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_text_bold_and_italics(self):
         paml = '**__bold and italics__**'
         expected = '<b><i>bold and italics</i></b>'
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_text_bold_and_italics_reversed_ending(self):
         paml = '**__bold and italics**__'
         expected = '<b><i>bold and italics</b></i>'
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_text_bold_and_italics_partially_overlapping(self):
@@ -90,8 +74,6 @@ class TestPaml(unittest.TestCase):
         paml = '**over__lap**ping__'
         expected = '<b>over<i>lap</b>ping</i>'
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_inside(self):
@@ -99,8 +81,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com">'
                     + '<b>link in bold</b></a>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_outside(self):
@@ -108,8 +88,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<b><a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link in bold</a></b>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_italics_inside(self):
@@ -117,8 +95,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com">'
                     + '<i>link in italics</i></a>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_italics_outside(self):
@@ -126,8 +102,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<i><a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link in italics</a></i>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_and_italics_inside(self):
@@ -135,8 +109,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com"><b>'
                     + '<i>link in bold and italics</i></b></a>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_and_italics_outside(self):
@@ -144,8 +116,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<b><i><a target="_blank" href="https://pokerfacowaty.com"'
                     + '>link in bold and italics</a></i></b>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_and_italics_reversed_ending_inside(self):
@@ -153,8 +123,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com"><b>'
                     + '<i>link in bold and italics</b></i></a>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_and_italics_reversed_ending_outside(self):
@@ -162,8 +130,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<b><i><a target="_blank" href="https://pokerfacowaty.com"'
                     + '>link in bold and italics</a></b></i>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_link_bold_and_italics_partially_overlapping_inside(self):
@@ -174,27 +140,55 @@ class TestPaml(unittest.TestCase):
         expected = ('<a target="_blank" href="https://pokerfacowaty.com">'
                     + '<b>over<i>lap</b>ping</i></a>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
+    def test_text_bold_without_end(self):
+        '''An effect of the way paml2html works - a tag without an end becomes
+        an empty pair of tags and swallows the character after it.'''
+        paml = '**Bold without end'
+        expected = '<b></b>old without end'
+        result = paml2html.format_txt(paml)
+        self.assertEqual(result, expected)
+
+    def test_text_bold_twice_nested_italics(self):
+        '''Every tag ends at the first tag of the same type found after it'''
+        paml = '**a__b__**c**'
+        expected = '<b>a<i>b</i></b>c<b></b>'
+        result = paml2html.format_txt(paml)
+        self.assertEqual(result, expected)
+
+    def test_links_without_closing_parenthesis(self):
+        '''An effect of the way paml2html works - without a ')' the link ends
+        right before the '](' '''
+        paml = '[one](first [two](second'
+        expected = ('<a target="_blank" href="[on">on</a>](first '
+                    + '<a target="_blank" href="[tw">tw</a>](second')
+        result = paml2html.format_txt(paml)
+        self.assertEqual(result, expected)
+
+    def test_long_paragraph_text(self):
+        paml = '**Bold** [link](https://pokerfacowaty.com) ``code`` ' * 20000
+        expected = ('<b>Bold</b> <a target="_blank" href="https://pokerfacow'
+                    + 'aty.com">link</a> <span class="inline-code">code'
+                    + '</span> ') * 20000
+        result = paml2html.format_txt(paml)
+        self.assertEqual(result, expected.strip())
+
     def header_with_link(self):
         paml = ['# [link](https://pokerfacowaty.com)\n', '']
         expected = ('<h1><a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></h1>')
-        paml2html.add_header(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_header(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_header_in_italics(self):
         paml = ['# __Italics__\n', '']
         expected = ('<h1><i>Italics</i></h1>')
-        paml2html.add_header(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_header(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_comment_link(self):
@@ -203,10 +197,9 @@ class TestPaml(unittest.TestCase):
                     + '</span><span class="same-line-comment"><a '
                     + 'target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></span></div>')
-        paml2html.add_command(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_command(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_small_comment_link(self):
@@ -215,10 +208,9 @@ class TestPaml(unittest.TestCase):
                     + '</span><div class="small-comment"><a '
                     + 'target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></div></div>')
-        paml2html.add_command(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_command(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_comment_italics(self):
@@ -226,10 +218,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span><span class="same-line-comment"><i>Italics</i>'
                     + '</span></div>')
-        paml2html.add_command(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_command(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_command_small_comment_italics(self):
@@ -237,10 +228,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="command-box"><span class="command">Ctrl + E'
                     + '</span><div class="small-comment"><i>Italics</i></div>'
                     + '</div>')
-        paml2html.add_command(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_command(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_with_link_inside(self):
@@ -248,8 +238,6 @@ class TestPaml(unittest.TestCase):
         expected = ('<span class="inline-code">inline code with a '
                     + '[link](link.com)</span>')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_code_line_with_link_inside_and_text_around(self):
@@ -257,8 +245,6 @@ class TestPaml(unittest.TestCase):
         expected = ('textaround<span class="inline-code">inline code with a '
                     + '[link](link.com)</span> text')
         result = paml2html.format_txt(paml)
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
         self.assertEqual(result, expected)
 
     def test_code_line_comment_link(self):
@@ -269,10 +255,9 @@ class TestPaml(unittest.TestCase):
                     + '><a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></div><code class="line-code">This is a code '
                     + 'line</code></div>')
-        paml2html.add_code_line(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_line(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_small_comment_link(self):
@@ -283,10 +268,9 @@ class TestPaml(unittest.TestCase):
                     + 'comment"><a target="_blank" href="https://pokerfacowaty'
                     + '.com">link</a></div><code class="line-code">This is a '
                     + 'code line</code></div>')
-        paml2html.add_code_line(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_line(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_comment_italics(self):
@@ -296,10 +280,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="line-code-box"><div class="line-code-comment"'
                     + '><i>Italics</i></div><code class="line-code">This is a '
                     + 'code line</code></div>')
-        paml2html.add_code_line(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_line(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_line_small_comment_italics(self):
@@ -309,10 +292,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="line-code-box"><div class="line-code-small-'
                     + 'comment"><i>Italics</i></div><code class="line-code">'
                     + 'This is a code line</code></div>')
-        paml2html.add_code_line(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_line(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_comment_link(self):
@@ -324,10 +306,9 @@ class TestPaml(unittest.TestCase):
                     + 'comment"><a target="_blank" href="https://pokerfacowaty'
                     + '.com">link</a></div><code class="block-code"><pre>This '
                     + 'is\na code block</pre></code></div>')
-        paml2html.add_code_block(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_block(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_small_comment_link(self):
@@ -339,10 +320,9 @@ class TestPaml(unittest.TestCase):
                     + 'comment"><a target="_blank" href="https://pokerfacowaty'
                     + '.com">link</a></div><code class="block-code"><pre>This'
                     + ' is\na code block</pre></code></div>')
-        paml2html.add_code_block(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_block(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_comment_italics(self):
@@ -353,10 +333,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="block-code-box"><div class="block-code-'
                     + 'comment"><i>Italics</i></div><code class="block-code">'
                     + '<pre>This is\na code block</pre></code></div>')
-        paml2html.add_code_block(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_block(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_code_block_small_comment_italics(self):
@@ -367,10 +346,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<div class="block-code-box"><div class="block-code-small-'
                     + 'comment"><i>Italics</i></div><code class="block-code">'
                     + '<pre>This is\na code block</pre></code></div>')
-        paml2html.add_code_block(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_code_block(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_paragraph_link(self):
@@ -379,10 +357,9 @@ class TestPaml(unittest.TestCase):
                 '}\n', '']
         expected = ('<div class="paragraph"><p><a target="_blank" '
                     + 'href="https://pokerfacowaty.com">link</a></p></div>')
-        paml2html.add_paragraph(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_paragraph(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_paragraph_italics(self):
@@ -390,20 +367,18 @@ class TestPaml(unittest.TestCase):
                 '__Italics__\n',
                 '}\n', '']
         expected = '<div class="paragraph"><p><i>Italics</i></p></div>'
-        paml2html.add_paragraph(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_paragraph(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_list_link(self):
         paml = ['- [link](https://pokerfacowaty.com)\n', '']
         expected = ('<ul><li><a target="_blank" href="https://pokerfacowaty'
                     + '.com">link</a></li></ul>')
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_nested_list_link(self):
@@ -415,19 +390,17 @@ class TestPaml(unittest.TestCase):
                     + '"https://pokerfacowaty.com">link</a></li></ul><li>'
                     + '<a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></li></ul>')
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_list_italics(self):
         paml = ['- __Italics__\n', '']
         expected = '<ul><li><i>Italics</i></li></ul>'
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_unordered_nested_list_italics(self):
@@ -437,20 +410,18 @@ class TestPaml(unittest.TestCase):
         expected = ('<ul><li><i>Italics</i></li>'
                     + '<ul><li><i>Italics</i></li></ul>'
                     + '<li><i>Italics</i></li></ul>')
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_list_link(self):
         paml = ['1. [link](https://pokerfacowaty.com)\n', '']
         expected = ('<ol><li><a target="_blank" href="https://pokerfacowaty'
                     + '.com">link</a></li></ol>')
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_nested_list_link(self):
@@ -462,19 +433,17 @@ class TestPaml(unittest.TestCase):
                     + 'href="https://pokerfacowaty.com">link</a></li></ol><li>'
                     + '<a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></li></ol>')
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_list_italics(self):
         paml = ['1. __Italics__\n', '']
         expected = '<ol><li><i>Italics</i></li></ol>'
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_ordered_nested_list_italics(self):
@@ -484,10 +453,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ol><li><i>Italics</i></li>'
                     + '<ol><li><i>Italics</i></li></ol>'
                     + '<li><i>Italics</i></li></ol>')
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_links_starting_unordered(self):
@@ -499,10 +467,9 @@ class TestPaml(unittest.TestCase):
                     + 'https://pokerfacowaty.com">link</a></li></ol><li>'
                     + '<a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></li></ul>')
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_links_starting_ordered(self):
@@ -514,10 +481,9 @@ class TestPaml(unittest.TestCase):
                     + 'https://pokerfacowaty.com">link</a></li></ul><li>'
                     + '<a target="_blank" href="https://pokerfacowaty.com">'
                     + 'link</a></li></ol>')
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_italics_starting_unordered(self):
@@ -527,10 +493,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ul><li><i>Italics</i></li>'
                     + '<ol><li><i>Italics</i></li></ol>'
                     + '<li><i>Italics</i></li></ul>')
-        paml2html.add_unordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_unordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_mixed_list_italics_starting_ordered(self):
@@ -540,10 +505,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<ol><li><i>Italics</i></li>'
                     + '<ul><li><i>Italics</i></li>'
                     + '</ul><li><i>Italics</i></li></ol>')
-        paml2html.add_ordered_list(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_ordered_list(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_table_with_headers_links(self):
@@ -555,10 +519,9 @@ class TestPaml(unittest.TestCase):
                     + 'link</a></th></tr><tr><td><a target="_blank" href="'
                     + 'example.com">link</a></td><td><a target="_blank" '
                     + 'href="example.com">link</a></td></tr></table>')
-        paml2html.add_table(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_table(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_table_with_headers_italics(self):
@@ -568,10 +531,9 @@ class TestPaml(unittest.TestCase):
         expected = ('<table><tr><th><i>Italics</i></th><th><i>Italics</i>'
                     + '</th></tr><tr><td><i>Italics</i></td><td><i>Italics</i>'
                     + '</td></tr></table>')
-        paml2html.add_table(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_table(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_table_without_headers_links(self):
@@ -582,10 +544,9 @@ class TestPaml(unittest.TestCase):
                     + '</a></td></tr><tr><td><a target="_blank" href="example'
                     + '.com">link</a></td><td><a target="_blank" href="example'
                     + '.com">link</a></td></tr></table>')
-        paml2html.add_table(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
+        conv = paml2html.Converter()
+        paml2html.add_table(paml, 0, conv)
+        result = conv.getvalue()
         self.assertEqual(result, expected)
 
     def test_table_without_headers_italics(self):
@@ -594,8 +555,38 @@ class TestPaml(unittest.TestCase):
         expected = ('<table><tr><td><i>Italics</i></td><td><i>Italics</i></td>'
                     + '</tr><tr><td><i>Italics</i></td><td><i>Italics</i></td>'
                     + '</tr></table>')
-        paml2html.add_table(paml, 0)
-        result = paml2html.doc.getvalue()
-        (paml2html.doc, paml2html.tag,
-         paml2html.text, paml2html.line) = paml2html.Doc().ttl()
-        self.assertEqual(result, expected)
+        conv = paml2html.Converter()
+        paml2html.add_table(paml, 0, conv)
+        result = conv.getvalue()
+        self.assertEqual(result, expected)
+
+    def test_inline_cache(self):
+        cache = paml2html.InlineCache(max_entries=2)
+        conv = paml2html.Converter(inline_cache=cache)
+        paml = ['| **a** | **a** | b |\n', '| **a** | [c](d) | b |\n', '']
+        with conv.collecting_stats():
+            paml2html.add_table(paml, 0, conv)
+            self.assertEqual(paml2html.format_txt('**a**'), '<b>a</b>')
+        self.assertEqual(conv.getvalue(), paml2html.convert_from_text(
+            ''.join(paml)))
+        # '[c](d)' pushes out 'b' and 'b' pushes out '**a**'
+        self.assertEqual((cache.hits, cache.misses), (2, 5))
+        self.assertEqual(list(cache.cache), ['b', '**a**'])
+
+    def test_inline_cache_max_bytes(self):
+        cache = paml2html.InlineCache(max_bytes=10)
+        paml2html.convert_from_text('# abc\n# abcd\n# abcdef\n',
+                                    inline_cache=cache)
+        self.assertEqual(list(cache.cache), ['abcd'])
+        self.assertEqual(cache.cache_bytes, 8)
+
+    def test_inline_html_like_nodes(self):
+        # what a Converter makes straight from the text has to be the same
+        # as rendering the nodes of a parsed document
+        for txt in [' plain ', '**a__b**c__', '**a', '[ **x** ](y) z',
+                    '[a](b) [c](d', '[a **b](c) d**', '``<code>`` & **b**',
+                    '``x', '__[a](b)__ ~~c~~', '[\x0c a \x0c](b)']:
+            with self.subTest(txt=txt):
+                self.assertEqual(paml2html.inline_html(txt),
+                                 paml2html.join_inline(
+                                     paml2html.parse_inline_nodes(txt)))
@@ -0,0 +1,126 @@
+from paml2html import paml2html
+from paml2html.paml2html import (Collapsible, CollapsibleBox, Command,
+                                 Decoration, Document, Entry, Header,
+                                 InlineCode, Link, Table, Text)
+from pathlib import Path
+import unittest
+
+'''These tests check the parsed document tree returned by parse_from_text
+   and parse_from_file. What the tree renders into is already covered by the
+   other tests, since convert_from_text and convert_from_file parse and render
+   every element the same way.'''
+
+
+class TestPaml(unittest.TestCase):
+    def test_header_tree(self):
+        paml = '## Header **bold** ``code``\n'
+        expected = Document([Header(2, [Text('Header '),
+                                        Decoration('b', False), Text('bold'),
+                                        Decoration('b', True), Text(' '),
+                                        InlineCode('code')])])
+        result = paml2html.parse_from_text(paml)
+        self.assertEqual(result, expected)
+
+    def test_header_levels(self):
+        for level in range(1, 7):
+            result = paml2html.parse_header(
+                paml2html.ScannedLines(['#' * level + ' x\n']), 0)
+            self.assertEqual(result, (Header(level, [Text('x')]), 1))
+        self.assertEqual(paml2html.parse_header(
+            paml2html.ScannedLines(['####### x\n']), 0), (None, 0))
+        self.assertEqual(paml2html.parse_header(
+            paml2html.ScannedLines(['# \n']), 0), (None, 0))
+
+    def test_unsupported_lines_tree(self):
+        # a single ` or ! doesn't start inline code or an image
+        result = paml2html.parse_from_text('`x\n!x\n*x\n')
+        self.assertEqual(result, Document([]))
+
+    def test_collapsible_tree(self):
+        paml = ('>l➤ coll\n'
+                + '    /Ctrl + E /* [link](example.com) */\n'
+                + '    >  nested\n')
+        expected = Document([CollapsibleBox('collapsible-box-half-left', [
+            Collapsible('➤', ' coll', [
+                Entry(Command([Text('Ctrl + E')],
+                              [Link('example.com', [Text('link')])], None)),
+                Collapsible(None, 'nested', [])])])])
+        result = paml2html.parse_from_text(paml)
+        self.assertEqual(result, expected)
+
+    def test_overlapping_decorations_tree(self):
+        paml = '| **over__lap**ping__ |\n| x |\n'
+        expected = Document([Table(None, [
+            [[Decoration('b', False), Text('over'), Decoration('i', False),
+              Text('lap'), Decoration('b', True), Text('ping'),
+              Decoration('i', True)]],
+            [[Text('x')]]])])
+        result = paml2html.parse_from_text(paml)
+        self.assertEqual(result, expected)
+
+    def test_render_twice(self):
+        paml_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.paml'
+        html_path = Path(__file__).resolve().parent / 'fixtures' / 'cs.html'
+        with open(html_path) as f:
+            expected = f.read()
+        document = paml2html.parse_from_file(paml_path)
+        self.assertEqual(paml2html.render_document(document), expected)
+        self.assertEqual(paml2html.render_document(document), expected)
+
+    def test_scanned_lines(self):
+        paml_lines = ['  - x \n', '\t>a\n', '   \n', '']
+        scanned = paml2html.ScannedLines(paml_lines)
+        self.assertEqual(scanned, paml_lines)
+        self.assertEqual(list(scanned.indents), [2, 0, 3, 0])
+        self.assertEqual(list(scanned.starts), [2, 1, 4, 0])
+        self.assertEqual(list(scanned.ends), [5, 3, 0, 0])
+        self.assertEqual(scanned.firsts, '->  ')
+        # lines read one at a time (\n and '' are added at the end, like
+        # for files) have the same columns
+        lazy = paml2html.LazyLines(['  - x \n', '\t>a\n', '   '])
+        self.assertEqual([lazy.starts[i] for i in range(4)], [2, 1, 4, 0])
+
+    def test_source_lines(self):
+        paml_text = '  - x \r\n\t>a\x0c   \n\r| b |'
+        paml_lines = paml_text.splitlines(True)
+        paml2html.add_last_line(paml_lines)
+        scanned = paml2html.ScannedLines(list(paml_lines))
+        # split into lines a few characters at a time too
+        for block_size in (1 << 20, 3):
+            with self.subTest(block_size=block_size):
+                old = paml2html.SOURCE_BLOCK_SIZE
+                paml2html.SOURCE_BLOCK_SIZE = block_size
+                try:
+                    source = paml2html.SourceLines(paml_text)
+                finally:
+                    paml2html.SOURCE_BLOCK_SIZE = old
+                self.assertEqual(list(source), paml_lines)
+                self.assertEqual([source[i] for i in range(len(source))],
+                                 paml_lines)
+                self.assertEqual(source[-2], '| b |\n')
+                for column in ('indents', 'starts', 'ends'):
+                    self.assertEqual(list(getattr(source, column)),
+                                     list(getattr(scanned, column)))
+                self.assertEqual(source.firsts, scanned.firsts)
+        with self.assertRaises(IndexError):
+            source[len(source)]
+        # like the lines of a file opened in text mode
+        source = paml2html.SourceLines('- a\x0c- b\n- c', newlines_only=True)
+        self.assertEqual(list(source), ['- a\x0c- b\n', '- c\n', ''])
+        self.assertEqual(source.firsts, '-- ')
+
+    def test_small_documents_as_scanned_lines(self):
+        paml_text = '# a\r\n- b\x0c- c\n\r| d |'
+        for newlines_only in (False, True):
+            with self.subTest(newlines_only=newlines_only):
+                scanned = paml2html.source_lines(paml_text, newlines_only)
+                self.assertIsInstance(scanned, paml2html.ScannedLines)
+                old = paml2html.SOURCE_LINES_MIN_SIZE
+                paml2html.SOURCE_LINES_MIN_SIZE = 0
+                try:
+                    source = paml2html.source_lines(paml_text, newlines_only)
+                finally:
+                    paml2html.SOURCE_LINES_MIN_SIZE = old
+                self.assertIsInstance(source, paml2html.SourceLines)
+                self.assertEqual(list(scanned), list(source))
+                self.assertEqual(scanned.firsts, source.firsts)
@@ -0,0 +1,81 @@
+from paml2html import watch
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class TestPaml(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.source = self.tmp / 'source'
+        self.destination = self.tmp / 'destination'
+        (self.source / 'a').mkdir(parents=True)
+        shutil.copy(FIXTURES / 'cs.paml', self.source / 'cs.paml')
+        (self.source / 'a' / 'header.paml').write_text('# One\n')
+        (self.source / 'a' / 'notes.txt').write_text('not PaML')
+        self.reports = []
+        self.stop = threading.Event()
+        self.thread = None
+
+    def tearDown(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def start(self, source, destination):
+        self.thread = threading.Thread(target=watch.watch, args=(
+            source, destination), kwargs={
+                'interval': 0.01, 'debounce': 0.05, 'stop': self.stop,
+                'report': self.reports.append})
+        self.thread.start()
+
+    def wait_for_reports(self, amount: int):
+        deadline = time.monotonic() + 10
+        while len(self.reports) < amount and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.reports), amount)
+
+    def test_snapshot(self):
+        snapshot = watch.take_snapshot(self.source)
+        self.assertEqual(sorted(snapshot), [self.source / 'a' / 'header.paml',
+                                            self.source / 'cs.paml'])
+        (self.source / 'a' / 'header.paml').write_text('# Two\n\n')
+        self.assertEqual(watch.changed_files(
+            snapshot, watch.take_snapshot(self.source)),
+            [self.source / 'a' / 'header.paml'])
+
+    def test_watch_directory(self):
+        self.start(self.source, self.destination)
+        self.wait_for_reports(2)
+        with open(FIXTURES / 'cs.html') as f:
+            self.assertEqual((self.destination / 'cs.html').read_text(),
+                             f.read())
+        # a burst of saves is converted once
+        header = self.source / 'a' / 'header.paml'
+        for text in ['# T\n', '# Tw\n', '# Two\n']:
+            header.write_text(text)
+        self.wait_for_reports(3)
+        time.sleep(0.2)
+        self.assertEqual(len(self.reports), 3)
+        self.assertIn(f'Converted {header} in ', self.reports[2])
+        self.assertIn(' after it was saved', self.reports[2])
+        self.assertEqual((self.destination / 'a' / 'header.html')
+                         .read_text(), '<h1>Two</h1>')
+
+    def test_watch_file(self):
+        source = self.source / 'a' / 'header.paml'
+        destination = self.tmp / 'header.html'
+        self.start(source, destination)
+        self.wait_for_reports(1)
+        source.write_text('```x\n')
+        self.wait_for_reports(2)
+        self.assertIn('IndexError', self.reports[1])
+        source.write_text('## Three\n')
+        self.wait_for_reports(3)
+        self.assertEqual(destination.read_text(), '<h2>Three</h2>')